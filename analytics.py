@@ -0,0 +1,315 @@
+from collections import deque
+
+import numpy as np
+
+import equity_engine
+
+TRADING_DAYS_PER_YEAR = 252
+DAYS_PER_YEAR = 365.25
+# Annual risk-free rate used for Sharpe, Sortino and alpha
+RISK_FREE_RATE = 0.0
+# Trailing window of each analytics period, in calendar days (None: all stored history)
+PERIOD_DAYS = {'1y': 365, '2y': 730, '3y': 1096, '5y': 1826, 'max': None}
+
+
+def forward_fill(prices: np.ndarray) -> np.ndarray:
+    """Carry each column's last close over days it has no bar (0 in a price matrix). Leading zeros stay 0."""
+    rows = np.arange(len(prices))[:, None]
+    last_bar = np.maximum.accumulate(np.where(prices > 0, rows, 0), axis=0)
+    return np.take_along_axis(prices, last_bar, axis=0)
+
+
+def time_weighted_returns(prices: np.ndarray, holdings: np.ndarray):
+    """
+    Daily time-weighted returns of a [days x symbols] holdings matrix. Day t's return is the P/L
+    of the positions held at the close of day t - 1 over their gross value then, so buys, sells
+    and deposits do not show up as gains or losses, and short positions count as exposure.
+    Returns (returns, valid) for days 1..n-1; valid is False where nothing was held the day before.
+    """
+    prices = forward_fill(prices)
+    held, previous = holdings[:-1], prices[:-1]
+    # A symbol's first bar is not a move from 0
+    change = np.where(previous > 0, prices[1:] - previous, 0.0)
+    pnl = np.einsum('ij,ij->i', held, change)
+    exposure = np.einsum('ij,ij->i', np.abs(held), previous)
+    valid = exposure > 0
+    returns = np.divide(pnl, exposure, out=np.zeros_like(pnl), where=valid)
+    return returns, valid
+
+
+def price_returns(days: np.ndarray, seconds: np.ndarray, closes: np.ndarray) -> np.ndarray:
+    """Daily returns of one close series sampled on days (the last close on or before each day)"""
+    close_days = equity_engine.to_days(seconds)
+    index = np.searchsorted(close_days, days, side='right') - 1
+    sampled = np.where(index >= 0, closes[np.maximum(index, 0)], np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return sampled[1:] / sampled[:-1] - 1
+
+
+def _compound_by(days: np.ndarray, returns: np.ndarray, unit: str):
+    """(periods, compounded returns) per calendar unit ('Y' or 'M'), from the days each return ends on"""
+    periods = days.astype('datetime64[D]').astype(f'datetime64[{unit}]')
+    starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+    return periods[starts], np.expm1(np.add.reduceat(np.log1p(returns), starts))
+
+
+def _annual_returns(days: np.ndarray, returns: np.ndarray) -> list:
+    years, growth = _compound_by(days, returns, 'Y')
+    return [{'year': int(str(year)), 'return': float(value)} for year, value in zip(years, growth)]
+
+
+def _clean(value):
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def risk_metrics(days: np.ndarray, returns: np.ndarray, benchmark: np.ndarray = None,
+                 risk_free_rate: float = RISK_FREE_RATE) -> dict:
+    """
+    Return and risk statistics of a daily return series ending on days:
+        total_return, cagr, annual_returns   compounded; CAGR over the calendar span
+        volatility                          annualized standard deviation
+        sharpe, sortino                     annualized excess return over total / downside deviation
+        max_drawdown, drawdown_peak/trough  worst fall of the compounded curve and the days it spans
+        beta, alpha, correlation            against benchmark returns on the same days (alpha annualized)
+    Undefined figures (too few days, no variance, no benchmark) are None.
+    """
+    n = len(returns)
+    if n == 0:
+        return {}
+    rf = risk_free_rate / TRADING_DAYS_PER_YEAR
+    log_growth = np.log1p(returns)
+    wealth = np.exp(np.cumsum(log_growth))
+    total_return = wealth[-1] - 1
+    # The first return covers the day before days[0] too
+    years = (days[-1] - days[0] + 1) / DAYS_PER_YEAR
+    mean = returns.mean()
+    excess = returns - rf
+    volatility = returns.std(ddof=1) if n > 1 else np.nan
+    downside = np.sqrt(np.mean(np.minimum(excess, 0.0) ** 2))
+    annualize = np.sqrt(TRADING_DAYS_PER_YEAR)
+
+    peaks = np.maximum.accumulate(np.maximum(wealth, 1.0))
+    drawdown = wealth / peaks - 1
+    trough = int(np.argmin(drawdown))
+    # The peak is the last high before the trough; index -1 means the starting value
+    at_peak = np.flatnonzero(wealth[:trough + 1] >= peaks[trough])
+    peak = int(at_peak[-1]) if len(at_peak) else -1
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics = {
+            'start': int(days[0]) * equity_engine.SECONDS_PER_DAY,
+            'end': int(days[-1]) * equity_engine.SECONDS_PER_DAY,
+            'days': n,
+            'total_return': _clean(total_return),
+            'cagr': _clean((1 + total_return) ** (1 / years) - 1) if years > 0 else None,
+            'annual_returns': _annual_returns(days, returns),
+            'volatility': _clean(volatility * annualize),
+            'sharpe': _clean((mean - rf) / volatility * annualize),
+            'sortino': _clean((mean - rf) / downside * annualize),
+            'max_drawdown': _clean(drawdown[trough]),
+            'drawdown_peak': int(days[peak]) * equity_engine.SECONDS_PER_DAY if peak >= 0 else None,
+            'drawdown_trough': int(days[trough]) * equity_engine.SECONDS_PER_DAY,
+            'risk_free_rate': risk_free_rate,
+            'beta': None,
+            'alpha': None,
+            'correlation': None,
+            'benchmark_return': None,
+        }
+
+        if benchmark is not None:
+            both = np.isfinite(benchmark)
+            if both.sum() > 1:
+                r, b = returns[both], benchmark[both]
+                r_dev, b_dev = r - r.mean(), b - b.mean()
+                covariance = (r_dev @ b_dev) / (len(r) - 1)
+                b_var = (b_dev @ b_dev) / (len(b) - 1)
+                r_var = (r_dev @ r_dev) / (len(r) - 1)
+                beta = covariance / b_var
+                metrics.update(
+                    beta=_clean(beta),
+                    # Jensen's alpha: excess return not explained by the benchmark's excess return
+                    alpha=_clean(((r.mean() - rf) - beta * (b.mean() - rf)) * TRADING_DAYS_PER_YEAR),
+                    correlation=_clean(covariance / np.sqrt(b_var * r_var)),
+                    benchmark_return=_clean(np.expm1(np.log1p(b).sum())),
+                )
+    return metrics
+
+
+def portfolio_returns(days: np.ndarray, prices: np.ndarray, holdings: np.ndarray, benchmark_closes=None):
+    """
+    (days, time-weighted returns, benchmark returns or None) of the portfolio, starting from the
+    first day something was held; later days with nothing held are a 0% return.
+    """
+    if len(days) < 2:
+        return days[:0], np.empty(0), None if benchmark_closes is None else np.empty(0)
+    returns, valid = time_weighted_returns(prices, holdings)
+    benchmark = price_returns(days, *benchmark_closes) if benchmark_closes is not None else None
+    held_from = np.argmax(valid) if valid.any() else len(valid)
+    return days[1:][held_from:], returns[held_from:], benchmark[held_from:] if benchmark is not None else None
+
+
+def portfolio_analytics(days: np.ndarray, prices: np.ndarray, holdings: np.ndarray, benchmark_closes=None,
+                        period: str = '5y', risk_free_rate: float = RISK_FREE_RATE) -> dict:
+    """
+    Risk metrics of the portfolio from a weekday price matrix and the holdings on each day
+    (equity_engine.build_price_matrix / holdings_matrix). benchmark_closes is an (epoch_seconds,
+    close) pair. Only the trailing PERIOD_DAYS[period] calendar days are used.
+    """
+    if period not in PERIOD_DAYS:
+        raise ValueError(f"Unknown period {period!r}, expected one of {', '.join(PERIOD_DAYS)}")
+    window = PERIOD_DAYS[period]
+    if window is not None and len(days):
+        first = np.searchsorted(days, days[-1] - window)
+        days, prices, holdings = days[first:], prices[first:], holdings[first:]
+    metrics = risk_metrics(*portfolio_returns(days, prices, holdings, benchmark_closes), risk_free_rate)
+    metrics['period'] = period
+    return metrics
+
+
+# Windows, in trading days, of the rolling series: about a month, a quarter and a year
+ROLLING_WINDOWS = (21, 63, 252)
+
+
+class RollingWindow:
+    """
+    Trailing-window volatility, Sharpe, beta and drawdown of a daily return series, in O(n):
+    means, variances and the covariance with the benchmark are differences of running sums, and
+    the window's wealth high comes from a monotonic deque. extend() appends new days and only
+    computes the new entries; update() takes the whole series again, keeps the prefix that did not
+    change and recomputes only from the first day that did (new bars, a revised last bar, a trade).
+
+        volatility  annualized standard deviation of the last `window` returns
+        sharpe      annualized mean excess return over that standard deviation
+        beta        covariance with the benchmark over its variance, same window
+        drawdown    fall from the highest compounded value of the last `window` days
+    Entries before the first full window are NaN. Missing benchmark returns count as 0.
+    """
+
+    def __init__(self, window: int, risk_free_rate: float = RISK_FREE_RATE):
+        if window < 2:
+            raise ValueError("window must be at least 2 days")
+        self.window = window
+        self.rf = risk_free_rate / TRADING_DAYS_PER_YEAR
+        self.days = np.empty(0, dtype=np.int64)
+        self.returns = np.empty(0)
+        self.benchmark = np.empty(0)
+        # Running sums with a leading 0, so the sum of entries [i, j) is sums[j] - sums[i]
+        self._sums = np.zeros((1, 5))  # r, r^2, b, b^2, r*b
+        self._log_wealth = np.empty(0)
+        self._highs = deque()  # indices into _log_wealth, their values strictly decreasing
+        self.volatility = np.empty(0)
+        self.sharpe = np.empty(0)
+        self.beta = np.empty(0)
+        self.drawdown = np.empty(0)
+
+    def __len__(self):
+        return len(self.days)
+
+    def extend(self, days: np.ndarray, returns: np.ndarray, benchmark: np.ndarray = None):
+        """Append returns ending on days (after the last day already held)"""
+        if not len(days):
+            return self
+        start, w = len(self.days), self.window
+        b = np.zeros_like(returns) if benchmark is None else np.nan_to_num(benchmark)
+        self.returns = np.concatenate((self.returns, returns))
+        self.benchmark = np.concatenate((self.benchmark, b))
+        columns = np.column_stack((returns, returns * returns, b, b * b, returns * b))
+        self._sums = np.concatenate((self._sums, self._sums[-1] + np.cumsum(columns, axis=0)))
+        last_log = self._log_wealth[-1] if start else 0.0
+        self._log_wealth = np.concatenate((self._log_wealth, last_log + np.cumsum(np.log1p(returns))))
+        self.days = np.concatenate((self.days, days))
+
+        # Window sums ending at each new entry; the ones without a full window stay NaN
+        end = np.arange(start, len(self.days)) + 1
+        full = end >= w
+        window_sums = np.full((len(end), 5), np.nan)
+        window_sums[full] = self._sums[end[full]] - self._sums[end[full] - w]
+        s_r, s_rr, s_b, s_bb, s_rb = window_sums.T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = np.maximum(s_rr - s_r * s_r / w, 0.0) / (w - 1)
+            std = np.sqrt(variance)
+            benchmark_variance = s_bb - s_b * s_b / w
+            volatility = std * np.sqrt(TRADING_DAYS_PER_YEAR)
+            sharpe = (s_r / w - self.rf) / std * np.sqrt(TRADING_DAYS_PER_YEAR)
+            beta = (s_rb - s_r * s_b / w) / benchmark_variance
+        self.volatility = np.concatenate((self.volatility, volatility))
+        self.sharpe = np.concatenate((self.sharpe, np.where(std > 0, sharpe, np.nan)))
+        self.beta = np.concatenate((self.beta, np.where(benchmark_variance > 0, beta, np.nan)))
+        self.drawdown = np.concatenate((self.drawdown, self._window_drawdown(start)))
+        return self
+
+    def _window_drawdown(self, start: int) -> np.ndarray:
+        # Sliding-window maximum: each index enters and leaves the deque once
+        log_wealth, highs, w = self._log_wealth, self._highs, self.window
+        drawdown = np.full(len(log_wealth) - start, np.nan)
+        for i in range(start, len(log_wealth)):
+            value = log_wealth[i]
+            while highs and log_wealth[highs[-1]] <= value:
+                highs.pop()
+            highs.append(i)
+            if highs[0] <= i - w:
+                highs.popleft()
+            if i >= w - 1:
+                drawdown[i - start] = value - log_wealth[highs[0]]
+        return np.expm1(drawdown)
+
+    def truncate(self, length: int):
+        """Drop every entry from index length on"""
+        if length >= len(self.days):
+            return self
+        self.days, self.returns, self.benchmark = self.days[:length], self.returns[:length], self.benchmark[:length]
+        self._sums = self._sums[:length + 1]
+        self._log_wealth = self._log_wealth[:length]
+        self.volatility, self.sharpe = self.volatility[:length], self.sharpe[:length]
+        self.beta, self.drawdown = self.beta[:length], self.drawdown[:length]
+        # Rebuild the deque from the window ending at the new last entry
+        self._highs.clear()
+        for i in range(max(0, length - self.window + 1), length):
+            while self._highs and self._log_wealth[self._highs[-1]] <= self._log_wealth[i]:
+                self._highs.pop()
+            self._highs.append(i)
+        return self
+
+    def update(self, days: np.ndarray, returns: np.ndarray, benchmark: np.ndarray = None):
+        """Bring the window in line with the full series, recomputing only from where it changed"""
+        b = np.zeros_like(returns) if benchmark is None else np.nan_to_num(benchmark)
+        n = min(len(days), len(self.days))
+        changed = (days[:n] != self.days[:n]) | (returns[:n] != self.returns[:n]) | (b[:n] != self.benchmark[:n])
+        keep = int(np.argmax(changed)) if changed.any() else n
+        self.truncate(keep)
+        return self.extend(days[keep:], returns[keep:], b[keep:])
+
+    def series(self) -> dict:
+        """Columns for a chart: epoch seconds and each metric, None where undefined"""
+        def column(values):
+            return [None if not np.isfinite(value) else value for value in values.tolist()]
+        return {
+            'time': (self.days * equity_engine.SECONDS_PER_DAY).tolist(),
+            'volatility': column(self.volatility),
+            'sharpe': column(self.sharpe),
+            'beta': column(self.beta),
+            'drawdown': column(self.drawdown),
+        }
+
+
+def monthly_returns(days: np.ndarray, returns: np.ndarray) -> list:
+    """Compounded return per calendar month ('YYYY-MM'), from the days each return ends on"""
+    if not len(days):
+        return []
+    months, growth = _compound_by(days, returns, 'M')
+    return [{'month': str(month), 'return': float(value)} for month, value in zip(months, growth)]
+
+
+def holding_returns(prices: np.ndarray):
+    """
+    Daily price returns of every column of a weekday price matrix, holidays carried forward.
+    Returns (returns, first) where returns[:, j] is NaN before symbol j's first two bars and
+    first[j] is the row of its first return (len(returns) if it never has one).
+    """
+    prices = forward_fill(prices)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.where(prices[:-1] > 0, prices[1:] / prices[:-1] - 1, np.nan)
+    valid = ~np.isnan(returns)
+    first = np.where(valid.any(axis=0), valid.argmax(axis=0), len(returns))
+    return returns, first
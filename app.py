@@ -1,16 +1,22 @@
 from urllib import response
 from flask import Flask, render_template, jsonify, request
-import yfinance as yf
-from datetime import datetime, timedelta
 import finnhub
 import os
-import pandas as pd
-from portfolio_manager import PortfolioManager
+from portfolio_manager import get_manager
+import covariance
+import montecarlo
+import optimizer
 import threading
 from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
-manager = PortfolioManager()
+manager = get_manager()
+# Fork the simulation and optimizer workers now, before the server starts its request threads.
+# Under a WSGI server this module is imported by the serving process; run as a script with the
+# reloader, only the child (WERKZEUG_RUN_MAIN) serves, the watching parent never needs a pool
+pool_workers = max(montecarlo.SIMULATION_WORKERS, optimizer.OPTIMIZER_WORKERS)
+if pool_workers > 1 and (__name__ != '__main__' or os.environ.get("WERKZEUG_RUN_MAIN") == "true"):
+    montecarlo.worker_pool(pool_workers)
 finnhub_key = os.getenv("FINNHUB_API_KEY")
 finnhub_client = finnhub.Client(api_key=finnhub_key)
 thread_local = threading.local()
@@ -28,6 +34,57 @@ def equity():
     equity_history = manager.compute_equity_history()
     return jsonify(equity_history)
 
+@app.route('/api/analytics')
+def portfolio_analytics():
+    period = request.args.get('period', '5y')
+    benchmark = request.args.get('benchmark')
+    try:
+        return jsonify(manager.compute_analytics(period, benchmark))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/analytics/rolling')
+def rolling_analytics():
+    try:
+        window = int(request.args.get('window', 63))
+        return jsonify(manager.compute_rolling(window, request.args.get('benchmark')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/analytics/correlation')
+def correlation_analytics():
+    try:
+        return jsonify(manager.covariance_report(int(request.args.get('window', 252))))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route('/api/analytics/var')
+def value_at_risk():
+    try:
+        paths = int(request.args.get('paths', montecarlo.DEFAULT_REQUEST_PATHS))
+        if not 0 < paths <= montecarlo.MAX_REQUEST_PATHS:
+            raise ValueError(f"paths must be between 1 and {montecarlo.MAX_REQUEST_PATHS}")
+        horizons = [int(days) for days in request.args.get('horizons', '').split(',') if days] or montecarlo.HORIZONS
+        seed = request.args.get('seed')
+        return jsonify(manager.simulate_risk(paths, horizons, request.args.get('method', 'bootstrap'),
+                                             int(seed) if seed is not None else None))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/analytics/optimize')
+def optimize_holdings():
+    try:
+        window = int(request.args.get('window', optimizer.DEFAULT_WINDOW))
+        if window not in covariance.COVARIANCE_WINDOWS:
+            raise ValueError(f"window must be one of {', '.join(map(str, covariance.COVARIANCE_WINDOWS))}")
+        points = int(request.args.get('points', optimizer.FRONTIER_POINTS))
+        if not 2 <= points <= optimizer.MAX_REQUEST_POINTS:
+            raise ValueError(f"points must be between 2 and {optimizer.MAX_REQUEST_POINTS}")
+        return jsonify(manager.optimize_holdings(window, points, float(request.args.get('cash_floor', 0.0)),
+                                                 float(request.args.get('max_weight', 1.0))))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 def get_finnhub_suggestions(query):
     try:
@@ -62,45 +119,10 @@ def fetchSymbolSuggestions():
 def intraday_equity():
     days = int(request.args.get('days', 1))  # 1 or 5
     interval = request.args.get('interval', '1m')  # '1m', '5m', '30m' etc.
-    end = datetime.utcnow()
-    start = end - timedelta(days=days)
-
-    holdings = manager.get_positions()
-
-    # Only keep columns for current holdings
-    price_data = yf.download(tickers=set(holdings.keys()), interval=interval, start=start, end=end, auto_adjust=False, prepost=False)
-    # Optional: Ensure data is within regular trading hours (in case prepost=True or mixed)
-    price_data = price_data.tz_localize(None)  # Sometimes needed before timezone conversion
-    price_data.index = price_data.index.tz_localize('UTC').tz_convert('America/New_York')
-
-    # Keep only data within regular market hours (9:30 AM to 4:00 PM)
-    price_data = price_data.between_time("09:30", "16:00")
-
-    # Multiply each column by the quantity held
-    for symbol, qty in holdings.items():
-        price_data[('Close', symbol)] = price_data[('Close', symbol)] * qty
-
-    # Sum across columns (each row is total equity on that date)
-    price_data = price_data.fillna(0)
-    price_data['equity'] = price_data[('Close')].sum(axis=1)
-            
-    price_data['equity'].dropna(inplace=True)
-            
-    price_data['equity_pct_change'] = price_data['equity'].pct_change()
-
-    # Identify rows where the equity dropped by more than 10%
-    # This gets rid of trading holidays. We dont have data from weekends or holidays
-    rows_to_drop = price_data[price_data['equity_pct_change'] < -0.10].index
-    price_data.drop(rows_to_drop, inplace=True)
-    price_data_cleaned = price_data.drop(columns=['equity_pct_change'])
-    equity = price_data_cleaned['equity'].dropna()
-    
-    # Return as list of dicts with timestamp
-    equity_history = [
-        {"time": int(pd.Timestamp(ts).timestamp()), "equity": round(equity, 2)}
-        for ts, equity in zip(equity.index, equity)
-    ]
-
+    try:
+        equity_history = manager.compute_intraday_equity(days, interval)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(equity_history)
 
 
@@ -0,0 +1,77 @@
+"""
+Shrunk covariance of hundreds of symbols: estimating a window from scratch against moving the
+running sums of an existing window by one new trading day, with the fixed per-call costs
+(sampling every symbol on the calendar, the O(k^2) estimate from the sums) shown apart.
+
+    python benchmarks/bench_covariance.py [symbols] [window]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from covariance import CovarianceService, COVARIANCE_WINDOWS, _WindowSums, sample_returns
+import equity_engine
+
+
+def make_columns(n_symbols, n_days, rng):
+    """Weekday closes for one-factor equities, plus a few seven-day crypto series"""
+    all_days = np.arange(16000, 16000 + n_days * 7 // 5 + 7)
+    weekdays = all_days[equity_engine.is_weekday(all_days)][:n_days]
+    market = rng.normal(0.0003, 0.01, len(all_days))
+    columns = []
+    for j in range(n_symbols):
+        crypto = j % 50 == 0
+        days = all_days if crypto else weekdays
+        beta = rng.uniform(0.2, 1.5)
+        noise = rng.normal(0, 0.04 if crypto else 0.015, len(all_days))
+        closes = 100 * np.exp(np.cumsum(beta * market + noise))[days - all_days[0]]
+        columns.append((days * equity_engine.SECONDS_PER_DAY, closes))
+    return weekdays, columns
+
+
+def main(n_symbols, window):
+    rng = np.random.default_rng(0)
+    calendar, columns = make_columns(n_symbols, window + 400, rng)
+    symbols = [f"S{j:04d}" for j in range(n_symbols)]
+
+    start = time.perf_counter()
+    full = CovarianceService().estimate(window, symbols, calendar[:-1], columns)
+    full_time = time.perf_counter() - start
+
+    service = CovarianceService()
+    service.estimate(window, symbols, calendar[:-1], columns)
+    start = time.perf_counter()
+    incremental = service.estimate(window, symbols, calendar, columns)
+    append_time = time.perf_counter() - start
+    rebuilt = CovarianceService().estimate(window, symbols, calendar, columns)
+    assert np.allclose(incremental['covariance'], rebuilt['covariance'], rtol=1e-8, atol=1e-14)
+
+    start = time.perf_counter()
+    days, returns = sample_returns(calendar, columns, window)
+    sample_time = time.perf_counter() - start
+    previous_days, previous_returns = sample_returns(calendar[:-1], columns, window)
+    start = time.perf_counter()
+    sums = _WindowSums(tuple(symbols), days, returns)
+    build_time = time.perf_counter() - start
+    sums = _WindowSums(tuple(symbols), previous_days, previous_returns)
+    start = time.perf_counter()
+    sums.update(days, returns)
+    update_time = time.perf_counter() - start
+    start = time.perf_counter()
+    sums.estimate()
+    estimate_time = time.perf_counter() - start
+
+    print(f"{n_symbols} symbols, {window}-day window, shrinkage {full['shrinkage']:.3f}")
+    print(f"  full estimate         {full_time * 1000:10.1f} ms")
+    print(f"  one new day           {append_time * 1000:10.1f} ms  ({full_time / append_time:.1f}x)")
+    print(f"    sample the calendar {sample_time * 1000:10.1f} ms  (every call)")
+    print(f"    sums from scratch   {build_time * 1000:10.1f} ms")
+    print(f"    sums moved by a day {update_time * 1000:10.1f} ms  ({build_time / update_time:.0f}x)")
+    print(f"    shrunk estimate     {estimate_time * 1000:10.1f} ms  (every change)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500, int(sys.argv[2]) if len(sys.argv) > 2 else COVARIANCE_WINDOWS[-1])
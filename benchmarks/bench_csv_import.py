@@ -0,0 +1,118 @@
+"""
+Bulk CSV import of a Schwab-style trade history: parse, apply through the Portfolio FIFO logic
+and write one snapshot, against add_transaction-style saving (a journal append per trade).
+
+    python benchmarks/bench_csv_import.py [rows] [symbols]
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from csv_import import CSVImporter, SCHWAB
+from ledger_journal import LedgerJournal
+from portfolio import Portfolio
+
+
+def make_schwab_csv(n_rows, n_symbols):
+    """Newest-first export with buys, sells, shorts, covers, dividends and a few bad rows"""
+    rng = random.Random(0)
+    held = {}
+    shorted = {}
+    day = date(2005, 1, 3)
+    lines = []
+    for i in range(n_rows):
+        if i % 40 == 0:
+            day += timedelta(days=1)
+        symbol = f"S{rng.randrange(n_symbols):04d}"
+        price = f"${rng.uniform(5, 500):,.2f}"
+        roll = rng.random()
+        if roll < 0.03:
+            lines.append(f'"{day:%m/%d/%Y}","Qualified Dividend","{symbol}","{symbol} INC","","","","$12.34"')
+            continue
+        if roll < 0.035:
+            lines.append(f'"{day:%m/%d/%Y}","Buy","{symbol}","{symbol} INC","abc","{price}","",""')
+            continue
+        if roll < 0.5 or (held.get(symbol, 0) == 0 and roll < 0.75):
+            action, quantity = "Buy", rng.randint(1, 200)
+            held[symbol] = held.get(symbol, 0) + quantity
+        elif roll < 0.75:
+            action, quantity = "Sell", rng.randint(1, held[symbol])
+            held[symbol] -= quantity
+        elif shorted.get(symbol, 0) == 0 or roll < 0.85:
+            action, quantity = "Sell Short", rng.randint(1, 100)
+            shorted[symbol] = shorted.get(symbol, 0) + quantity
+        else:
+            action, quantity = "Buy to Cover", rng.randint(1, shorted[symbol])
+            shorted[symbol] -= quantity
+        lines.append(f'"{day:%m/%d/%Y}","{action}","{symbol}","{symbol} INC","{quantity:,}","{price}","$0.65",""')
+    lines.reverse()
+    return ('"Transactions for account XXXX-1234 as of 10/17/2026"\n'
+            '"Date","Action","Symbol","Description","Quantity","Price","Fees & Comm","Amount"\n'
+            + "\n".join(lines) + '\n"Transactions Total","","","","","","","$0.00"\n')
+
+
+def apply_transaction(portfolio):
+    methods = {'buy': portfolio.buy, 'sell': portfolio.sell, 'short': portfolio.short_sell, 'cover': portfolio.buy_to_cover}
+
+    def apply(symbol, quantity, price, date, company_name, security_type, action):
+        if action in ('buy', 'short'):
+            methods[action](symbol, quantity, price, date, company_name, security_type)
+        else:
+            methods[action](symbol, quantity, price, date)
+    return apply
+
+
+def import_csv(text, data_dir, per_trade_save=False):
+    journal = LedgerJournal(os.path.join(data_dir, "transactions.journal"), os.path.join(data_dir, "transactions.json"),
+                            os.path.join(data_dir, "closed_lots.json"))
+    portfolio = Portfolio(positions={}, current_prices={}, previous_closing_prices={})
+    portfolio.enable_change_log()
+    importer = CSVImporter(SCHWAB).parse(io.StringIO(text, newline=''))
+    if per_trade_save:
+        def apply(*trade, _apply=apply_transaction(portfolio)):
+            _apply(*trade)
+            journal.append(portfolio.drain_changes())
+        imported = importer.apply(portfolio, apply)
+    else:
+        imported = importer.apply(portfolio, apply_transaction(portfolio))
+        portfolio.drain_changes()
+        journal.compact(portfolio.get_positions().to_dict(), portfolio.get_closed_lots())
+    journal.close()
+    return importer.summary(imported), portfolio
+
+
+def main(n_rows, n_symbols):
+    text = make_schwab_csv(n_rows, n_symbols)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        start = time.perf_counter()
+        importer = CSVImporter(SCHWAB).parse(io.StringIO(text, newline=''))
+        parse_time = time.perf_counter() - start
+        start = time.perf_counter()
+        summary, portfolio = import_csv(text, data_dir)
+        bulk_time = time.perf_counter() - start
+        reloaded, _ = LedgerJournal(os.path.join(data_dir, "transactions.journal"), os.path.join(data_dir, "transactions.json"),
+                                    os.path.join(data_dir, "closed_lots.json")).load()
+        assert reloaded.to_dict() == portfolio.get_positions().to_dict()
+
+    sample = min(n_rows, 5_000)
+    with tempfile.TemporaryDirectory() as data_dir, contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        import_csv(make_schwab_csv(sample, n_symbols), data_dir, per_trade_save=True)
+        per_trade_time = (time.perf_counter() - start) / sample
+
+    print(f"{n_rows} rows, {n_symbols} symbols: {summary['imported']} trades, "
+          f"{sum(summary['skipped'].values())} skipped, {summary['error_count']} errors, {len(importer.trades)} parsed")
+    print(f"parse only                       {parse_time:8.2f} s")
+    print(f"parse + apply + one snapshot     {bulk_time:8.2f} s")
+    print(f"journal append per trade (est.)  {per_trade_time * n_rows:8.2f} s  (from {sample} rows)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000, int(sys.argv[2]) if len(sys.argv) > 2 else 500)
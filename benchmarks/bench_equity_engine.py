@@ -0,0 +1,75 @@
+"""
+Time the vectorized equity engine on synthetic daily closes for 10, 100 and 1000 symbols,
+against the per-symbol pandas loop it replaced.
+
+    python benchmarks/bench_equity_engine.py [years]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import equity_engine
+
+START = int(pd.Timestamp("2000-01-03").timestamp())
+
+
+def synthetic_closes(n_symbols, years, rng):
+    columns = []
+    for j in range(n_symbols):
+        crypto = j % 10 == 0  # every tenth symbol trades 7 days a week at midnight UTC
+        n_days = int(years * 365)
+        seconds = START + np.arange(n_days, dtype=np.int64) * equity_engine.SECONDS_PER_DAY
+        if not crypto:
+            seconds = seconds[equity_engine.is_weekday(equity_engine.to_days(seconds))] + 4 * 3600
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(seconds))))
+        columns.append((seconds.astype(np.float64), close))
+    return columns
+
+
+def pandas_loop(columns, holdings):
+    frames = [pd.Series(close, index=seconds.astype('datetime64[s]'), name=j) for j, (seconds, close) in enumerate(columns)]
+    data = pd.concat(frames, axis=1, sort=True).fillna(0)
+    for j, qty in enumerate(holdings):
+        data[j] = data[j] * qty
+    data['date'] = data.index.date
+    daily = data.groupby('date').sum()
+    equity = daily.sum(axis=1)
+    equity.index = pd.DatetimeIndex(equity.index)
+    equity = equity[equity.index.day_of_week < 5]
+    return [{"time": int(pd.Timestamp(ts).timestamp()), "equity": round(v, 2)} for ts, v in zip(equity.index, equity)]
+
+
+def engine(columns, holdings):
+    days, prices = equity_engine.build_price_matrix(columns)
+    return equity_engine.equity_points(days, equity_engine.daily_equity(prices, holdings),
+                                       equity_engine.holiday_mask(prices, holdings))
+
+
+def best_of(fn, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(years):
+    rng = np.random.default_rng(0)
+    print(f"{years} years of daily bars")
+    print(f"{'symbols':>8} {'engine':>12} {'pandas loop':>12}")
+    for n_symbols in (10, 100, 1000):
+        columns = synthetic_closes(n_symbols, years, rng)
+        holdings = rng.uniform(1, 100, n_symbols)
+        engine_time = best_of(lambda: engine(columns, holdings))
+        # The pandas loop takes minutes at 1000 symbols, so only time it where it is practical
+        pandas_time = best_of(lambda: pandas_loop(columns, holdings), repeat=1) if n_symbols <= 100 else float('nan')
+        print(f"{n_symbols:>8} {engine_time * 1000:>10.1f}ms {pandas_time * 1000:>10.1f}ms")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,62 @@
+"""
+Per-write cost of persisting the ledger: rewriting the whole transactions.json (the old
+save_positions) against appending to the LedgerJournal, plus startup (snapshot + replay).
+
+    python benchmarks/bench_ledger_journal.py [lots ...]
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_lot_store import make_positions
+from ledger_journal import LedgerJournal
+from portfolio import Portfolio
+
+WRITES = 200
+# Whole-file rewrites get slow on big ledgers, a few are enough to time them
+REWRITES = 5
+
+
+def main(sizes):
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    print(f"{'lots':>8} {'rewrite/write':>14} {'journal/write':>14} {'startup':>10}")
+    for n_lots in sizes:
+        positions = make_positions(n_lots, n_symbols=max(1, n_lots // 100))
+        with tempfile.TemporaryDirectory() as root:
+            snapshot = os.path.join(root, "transactions.json")
+            journal = LedgerJournal(os.path.join(root, "transactions.journal"), snapshot,
+                                    os.path.join(root, "closed_lots.json"))
+            journal.compact(positions, [])
+
+            portfolio = Portfolio(positions=positions)
+            portfolio.enable_change_log()
+            with quiet:
+                start = time.perf_counter()
+                for i in range(REWRITES):
+                    portfolio.buy('S0000', 1, 100.0, '2024-01-02')
+                    with open(snapshot, 'w') as f:
+                        json.dump(portfolio.get_positions().to_dict(), f)
+                rewrite_time = (time.perf_counter() - start) / REWRITES
+                portfolio.drain_changes()
+
+                start = time.perf_counter()
+                for i in range(WRITES):
+                    portfolio.sell('S0000', 1, 101.0, '2024-01-03')
+                    journal.append(portfolio.drain_changes())
+                journal_time = (time.perf_counter() - start) / WRITES
+            journal.close()
+
+            start = time.perf_counter()
+            LedgerJournal(journal.journal_path, snapshot, journal.closed_lots_path).load()
+            startup_time = time.perf_counter() - start
+
+        print(f"{n_lots:>8} {rewrite_time * 1000:>11.3f} ms {journal_time * 1000:>11.3f} ms {startup_time * 1000:>7.0f} ms")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 300_000])
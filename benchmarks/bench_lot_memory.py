@@ -0,0 +1,49 @@
+"""
+Memory per open lot, measured with tracemalloc: lots as the dicts json.load gives (what the
+ledger used to hold) against compact Lot objects with interned strings, and the whole Portfolio.
+
+    python benchmarks/bench_lot_memory.py [lots] [symbols]
+"""
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_lot_store import make_positions
+from lot_store import Lot
+from portfolio import Portfolio
+
+
+def traced_bytes(build):
+    """Bytes still allocated by build()'s result once it returns"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+
+def main(n_lots, n_symbols):
+    positions = make_positions(n_lots, n_symbols)
+    for i, lot in enumerate(lot for lots in positions.values() for lot in lots):
+        lot['date'] = f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}"
+    text = json.dumps(positions)
+
+    dict_bytes, loaded = traced_bytes(lambda: json.loads(text))
+    lot_bytes, lots = traced_bytes(lambda: [Lot.from_dict(lot) for symbol_lots in json.loads(text).values() for lot in symbol_lots])
+    del lots
+    portfolio_bytes, portfolio = traced_bytes(lambda: Portfolio(positions=json.loads(text)))
+    assert portfolio.get_positions().to_dict() == loaded
+
+    print(f"{n_lots} lots, {n_symbols} symbols")
+    print(f"lot dicts from json.load       {dict_bytes / n_lots:8.0f} bytes/lot")
+    print(f"Lot objects, interned strings  {lot_bytes / n_lots:8.0f} bytes/lot  ({dict_bytes / lot_bytes:.1f}x smaller)")
+    print(f"Portfolio incl. lot indexes    {portfolio_bytes / n_lots:8.0f} bytes/lot")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000, int(sys.argv[2]) if len(sys.argv) > 2 else 500)
@@ -0,0 +1,109 @@
+"""
+Compare the LotStore-backed Portfolio against the old {symbol: [lots]} lists on large ledgers:
+removing lots by transactionId and FIFO sells that deplete many lots of one symbol.
+
+    python benchmarks/bench_lot_store.py [lots]
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from portfolio import Portfolio
+
+
+def make_positions(n_lots, n_symbols):
+    rng = random.Random(0)
+    positions = {}
+    for i in range(n_lots):
+        symbol = f"S{i % n_symbols:04d}"
+        quantity = rng.randint(1, 100)
+        price = rng.uniform(1, 500)
+        positions.setdefault(symbol, []).append({
+            'transactionId': str(uuid.UUID(int=rng.getrandbits(128))),
+            'quantity': quantity, 'original_quantity': quantity,
+            'cost_basis': price, 'total_lot_cost_basis': quantity * price,
+            'date': None, 'position_type': 'long', 'action': 'Buy',
+            'company_name': symbol, 'security_type': 'Equity',
+        })
+    return positions
+
+
+def copy_positions(positions):
+    return {symbol: [dict(lot) for lot in lots] for symbol, lots in positions.items()}
+
+
+def list_remove_transaction(positions, transaction_id):
+    """The old PortfolioManager.remove_transaction walk, minus the file I/O"""
+    new_positions = {}
+    for symbol in positions.keys():
+        transactions = [txn for txn in positions[symbol] if txn['transactionId'] != transaction_id]
+        if transactions:
+            new_positions[symbol] = transactions
+    return new_positions
+
+
+def list_sell(positions, symbol, quantity):
+    """The old Portfolio.sell depletion: filter by type, then drop depleted lots with `not in`"""
+    long_lots = [lot for lot in positions[symbol] if lot['position_type'] == 'long']
+    remaining = quantity
+    lots_to_remove = []
+    for lot in long_lots:
+        if remaining <= 0:
+            break
+        shares = min(remaining, lot['quantity'])
+        lot['quantity'] -= shares
+        remaining -= shares
+        if lot['quantity'] <= 1e-9:
+            lots_to_remove.append(lot)
+    positions[symbol] = [lot for lot in positions[symbol] if lot not in lots_to_remove]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(n_lots):
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    positions = make_positions(n_lots, n_symbols=max(1, n_lots // 100))
+    ids = [lot['transactionId'] for lots in positions.values() for lot in lots]
+    victims = random.Random(1).sample(ids, 100)
+
+    source = copy_positions(positions)
+    build_time = timed(lambda: Portfolio(positions=source))
+
+    old = copy_positions(positions)
+    def old_removes():
+        nonlocal old
+        for transaction_id in victims:
+            old = list_remove_transaction(old, transaction_id)
+    old_remove_time = timed(old_removes)
+
+    portfolio = Portfolio(positions=copy_positions(positions))
+    new_remove_time = timed(lambda: [portfolio.remove_lot(transaction_id) for transaction_id in victims])
+
+    # One symbol holding a tenth of the ledger, sold down by half
+    deep = make_positions(n_lots // 10, n_symbols=1)
+    half = sum(lot['quantity'] for lot in deep['S0000']) // 2
+    old_deep = copy_positions(deep)
+    old_sell_time = timed(lambda: list_sell(old_deep, 'S0000', half))
+    portfolio = Portfolio(positions=copy_positions(deep))
+    with quiet:
+        new_sell_time = timed(lambda: portfolio.sell('S0000', half, 100.0, '2024-01-02'))
+
+    print(f"{n_lots} lots, {len(positions)} symbols")
+    print(f"build LotStore from dict        {build_time * 1000:9.2f} ms")
+    print(f"100 removes  lists              {old_remove_time * 1000:9.2f} ms")
+    print(f"100 removes  LotStore           {new_remove_time * 1000:9.2f} ms  ({old_remove_time / new_remove_time:.0f}x)")
+    print(f"sell half of {len(deep['S0000'])} lots  lists  {old_sell_time * 1000:9.2f} ms")
+    print(f"sell half of {len(deep['S0000'])} lots  LotStore {new_sell_time * 1000:7.2f} ms  ({old_sell_time / new_sell_time:.0f}x)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
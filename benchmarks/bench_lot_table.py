@@ -0,0 +1,89 @@
+"""
+Portfolio summaries from the columnar LotTable against the lot-by-lot loops they replace:
+per-position details for every symbol, and the per-lot P/L table.
+
+    python benchmarks/bench_lot_table.py [lots ...]
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_lot_store import make_positions
+from portfolio import Portfolio
+
+
+def loop_position_details(portfolio, symbol):
+    """The old Portfolio.get_position_details sums, one generator pass per figure"""
+    lots = portfolio.positions[symbol]
+    total_quantity = sum(lot['quantity'] if lot['position_type'] == 'long' else -lot['quantity'] for lot in lots)
+    total_cost_basis = sum(lot['quantity'] * lot['cost_basis'] for lot in lots if lot['position_type'] == 'long')
+    total_proceeds_basis = sum(lot['quantity'] * lot['cost_basis'] for lot in lots if lot['position_type'] == 'short')
+    current_price = portfolio.current_prices.get(symbol)
+    unrealized_pnl = 0.0
+    for lot in lots:
+        if lot['position_type'] == 'long':
+            unrealized_pnl += (current_price - lot['cost_basis']) * lot['quantity']
+        else:
+            unrealized_pnl += (lot['cost_basis'] - current_price) * lot['quantity']
+    return total_quantity, total_cost_basis, total_proceeds_basis, unrealized_pnl
+
+
+def loop_lot_summary(portfolio):
+    """The old Portfolio.get_pnl_per_lot_summary: one dict per lot, then a DataFrame"""
+    rows = []
+    for symbol, lots in portfolio.positions.items():
+        current_price = portfolio.current_prices.get(symbol)
+        previous_closing_price = portfolio.previous_closing_prices.get(symbol)
+        for lot in lots:
+            if lot['position_type'] == 'long':
+                unrealized_pnl = (current_price - lot['cost_basis']) * lot['quantity']
+                day_gain = (current_price - previous_closing_price) * lot['quantity']
+            else:
+                unrealized_pnl = (lot['cost_basis'] - current_price) * lot['quantity']
+                day_gain = (previous_closing_price - current_price) * lot['quantity']
+            cost_or_proceeds = lot['quantity'] * lot['cost_basis']
+            rows.append({
+                'Symbol': symbol, 'Company Name': lot['company_name'], 'Lot ID': lot['transactionId'],
+                'Position Type': lot['position_type'].capitalize(), 'Transaction Action': lot['action'],
+                'Security Type': lot['security_type'], 'Quantity': lot['quantity'],
+                'Original Quantity': lot['original_quantity'], 'Purchase/Short Price': lot['cost_basis'],
+                'Total Lot Cost Basis': lot['total_lot_cost_basis'], 'Date': lot['date'],
+                'Current Price': current_price, 'Unrealized P/L': unrealized_pnl,
+                'Unrealized Gain %': unrealized_pnl / cost_or_proceeds * 100, 'Day Gain': day_gain,
+                'Day Gain %': day_gain / (lot['quantity'] * previous_closing_price) * 100,
+            })
+    return pd.DataFrame(rows).sort_values(by=['Symbol', 'Date']).reset_index(drop=True)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(n_lots):
+    positions = make_positions(n_lots, n_symbols=max(1, min(500, n_lots // 100)))
+    symbols = list(positions)
+    portfolio = Portfolio(positions=positions, current_prices={s: 250.0 for s in symbols},
+                          previous_closing_prices={s: 245.0 for s in symbols})
+
+    loop_details_time = timed(lambda: [loop_position_details(portfolio, symbol) for symbol in symbols])
+    table_build_time = timed(portfolio.get_lot_table)
+    table_details_time = timed(lambda: portfolio.get_lot_table().symbol_metrics(portfolio.current_prices, portfolio.previous_closing_prices))
+    loop_lots_time = timed(lambda: loop_lot_summary(portfolio))
+    table_lots_time = timed(portfolio.get_pnl_per_lot_summary)
+
+    print(f"{n_lots} lots, {len(symbols)} symbols")
+    print(f"  build LotTable                      {table_build_time * 1000:10.2f} ms  (once per ledger change)")
+    print(f"  position figures  loops             {loop_details_time * 1000:10.2f} ms")
+    print(f"  position figures  bincount          {table_details_time * 1000:10.2f} ms  ({loop_details_time / table_details_time:.0f}x)")
+    print(f"  per-lot P/L table loops             {loop_lots_time * 1000:10.2f} ms")
+    print(f"  per-lot P/L table vectorized        {table_lots_time * 1000:10.2f} ms  ({loop_lots_time / table_lots_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    for n in (map(int, sys.argv[1:]) if len(sys.argv) > 1 else (1_000, 100_000, 1_000_000)):
+        main(n)
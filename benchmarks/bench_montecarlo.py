@@ -0,0 +1,53 @@
+"""
+Monte Carlo VaR/CVaR of a portfolio of fat-tailed, correlated symbols: paths per second per core
+for the bootstrap and normal models on one worker and on the whole pool, checking that a seed
+gives the same result on any number of workers.
+
+    python benchmarks/bench_montecarlo.py [paths] [symbols] [workers]
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import montecarlo
+
+
+def make_returns(n_days, n_symbols, rng):
+    """Daily returns with a common market factor and Student-t tails"""
+    market = rng.standard_t(4, n_days) * 0.008
+    betas = rng.uniform(0.3, 1.5, n_symbols)
+    return np.clip(market[:, None] * betas + rng.standard_t(4, (n_days, n_symbols)) * 0.012, -0.9, None)
+
+
+def run(model, paths, workers):
+    start = time.perf_counter()
+    result = montecarlo.simulate(model, paths, seed=42, workers=workers)
+    return result, time.perf_counter() - start
+
+
+def main(paths, n_symbols, workers):
+    rng = np.random.default_rng(0)
+    returns = make_returns(montecarlo.LOOKBACK_DAYS, n_symbols, rng)
+    # Mostly long, a few shorts
+    values = rng.uniform(1_000, 50_000, n_symbols) * np.where(rng.random(n_symbols) < 0.1, -1, 1)
+
+    print(f"{paths:,} paths, {n_symbols} symbols, horizons {montecarlo.HORIZONS} days, {workers} workers")
+    for method in montecarlo.METHODS:
+        model = montecarlo.build_model(returns, values, method)
+        single, single_time = run(model, paths, 1)
+        pooled, pooled_time = run(model, paths, workers)
+        year = pooled['horizons'][-1]
+        print(f"  {method:9s} 1 worker  {single_time:7.2f} s  {paths / single_time:12,.0f} paths/s/core")
+        print(f"  {method:9s} {workers} workers {pooled_time:7.2f} s  {paths / pooled_time / workers:12,.0f} paths/s/core"
+              f"  ({single_time / pooled_time:.1f}x)")
+        print(f"            same result: {json.dumps(single) == json.dumps(pooled)}, "
+              f"1y VaR99 {year['var']['0.99']:,.0f}, CVaR99 {year['cvar']['0.99']:,.0f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000, int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+         int(sys.argv[3]) if len(sys.argv) > 3 else montecarlo.SIMULATION_WORKERS)
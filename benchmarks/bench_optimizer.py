@@ -0,0 +1,70 @@
+"""
+Efficient frontier, max-Sharpe and risk-parity solves over hundreds of assets with a cash floor
+and a weight cap: a cold sweep, the same sweep warm-started from the last one (as after a new
+day's bar), and the cold sweep spread over the process pool.
+
+    python benchmarks/bench_optimizer.py [assets] [points] [workers]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import optimizer
+from covariance import shrunk_covariance
+from analytics import TRADING_DAYS_PER_YEAR
+
+
+def make_returns(n_days, n_assets, rng):
+    """Daily returns driven by five common factors plus idiosyncratic noise"""
+    factors = rng.normal(0.0004, 0.01, (n_days, 5))
+    loadings = rng.normal(0.4, 0.4, (n_assets, 5))
+    return factors @ loadings.T + rng.normal(0.0002, 0.015, (n_days, n_assets))
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main(n_assets, points, workers):
+    rng = np.random.default_rng(0)
+    returns = make_returns(756, n_assets, rng)
+    estimate = shrunk_covariance(returns)
+    newer = shrunk_covariance(np.vstack((returns[1:], make_returns(1, n_assets, rng))))
+    symbols = [f"S{i:03d}" for i in range(n_assets)] + ['USDT-USD']
+
+    def build(estimate):
+        mean = np.append(estimate['mean'], 0.0) * TRADING_DAYS_PER_YEAR
+        covariance = np.zeros((n_assets + 1, n_assets + 1))
+        covariance[:n_assets, :n_assets] = estimate['covariance'] * TRADING_DAYS_PER_YEAR
+        return optimizer.PortfolioOptimizer(symbols, mean, covariance, cash=['USDT-USD'], cash_floor=0.05,
+                                            cash_ceiling=0.2, max_weight=0.05)
+
+    model = build(estimate)
+    cold, cold_time = timed(model.frontier, points, workers=1)
+    again, again_time = timed(model.frontier, points, [w for _, w, _ in cold], workers=1)
+    model_next = build(newer)
+    warm, warm_time = timed(model_next.frontier, points, [w for _, w, _ in cold], workers=1)
+    pooled, pooled_time = timed(model.frontier, points, workers=workers)
+    (sharpe_w, sharpe_iterations), sharpe_time = timed(model.max_sharpe, cold)
+    parity, parity_time = timed(model.risk_parity)
+    _, parity_warm_time = timed(model_next.risk_parity, parity)
+    same = max(np.abs(a[1] - b[1]).max() for a, b in zip(cold, pooled))
+
+    print(f"{n_assets} assets, {points}-point frontier, cash 5-20%, 5% cap, {workers} workers")
+    print(f"  cold frontier           {cold_time * 1000:8.1f} ms  {sum(p[2] for p in cold):6d} iterations")
+    print(f"  warm frontier, same day {again_time * 1000:8.1f} ms  {sum(p[2] for p in again):6d} iterations")
+    print(f"  warm frontier, next day {warm_time * 1000:8.1f} ms  {sum(p[2] for p in warm):6d} iterations")
+    print(f"  cold frontier, pooled   {pooled_time * 1000:8.1f} ms  (largest weight difference {same:.1e})")
+    print(f"  max Sharpe refinement   {sharpe_time * 1000:8.1f} ms  {sharpe_iterations:6d} iterations, "
+          f"Sharpe {model.describe(sharpe_w)['sharpe']:.3f}")
+    print(f"  risk parity cold / warm {parity_time * 1000:8.1f} ms / {parity_warm_time * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200, int(sys.argv[2]) if len(sys.argv) > 2 else optimizer.FRONTIER_POINTS,
+         int(sys.argv[3]) if len(sys.argv) > 3 else optimizer.OPTIMIZER_WORKERS)
@@ -0,0 +1,49 @@
+"""
+Compare loading the current holdings' price history from the legacy data/{symbol}.json
+files against the memory-mapped PriceStore.
+
+    python benchmarks/bench_price_store.py [data_dir]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from price_store import PriceStore
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(data_dir):
+    with open(os.path.join(data_dir, "transactions.json")) as f:
+        symbols = [s for s in json.load(f) if os.path.exists(os.path.join(data_dir, f"{s}.json"))]
+
+    with tempfile.TemporaryDirectory() as root:
+        store = PriceStore(root)
+        for symbol in symbols:
+            store.migrate_json(symbol, os.path.join(data_dir, f"{symbol}.json"))
+
+        json_time = best_of(lambda: [pd.read_json(os.path.join(data_dir, f"{s}.json"))['Close'] for s in symbols])
+        # Fresh store each run so the timing includes opening the memory maps
+        close_time = best_of(lambda: [PriceStore(root).closes(s)[1].sum() for s in symbols])
+        frame_time = best_of(lambda: [PriceStore(root).read_frame(s) for s in symbols])
+
+    print(f"{len(symbols)} symbols")
+    print(f"pd.read_json          {json_time * 1000:8.2f} ms")
+    print(f"PriceStore.read_frame {frame_time * 1000:8.2f} ms  ({json_time / frame_time:.0f}x)")
+    print(f"PriceStore.closes     {close_time * 1000:8.2f} ms  ({json_time / close_time:.0f}x)")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else "data")
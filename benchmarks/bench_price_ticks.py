@@ -0,0 +1,60 @@
+"""
+Cost of one streamed price tick on a large ledger: a cold report (a pass over every lot, which is
+what every tick used to cost) against the running per-symbol sums.
+
+    python benchmarks/bench_price_ticks.py [lots] [symbols]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_lot_store import make_positions
+from portfolio import Portfolio
+
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - start) / calls
+
+
+def main(n_lots, n_symbols):
+    positions = make_positions(n_lots, n_symbols)
+    symbols = list(positions)
+    portfolio = Portfolio(positions=positions, current_prices={}, previous_closing_prices={})
+    portfolio.set_realtime_prices({s: 100.0 for s in symbols}, {s: 99.0 for s in symbols})
+    rng = random.Random(0)
+    ticks = [(rng.choice(symbols), rng.uniform(90, 110)) for _ in range(1000)]
+
+    def cold_report(i):
+        # Drop every cache so the report is built from the lots, as before
+        portfolio._symbol_metrics.clear()
+        portfolio._lot_details.clear()
+        portfolio._totals = None
+        portfolio.update_quote(*ticks[i])
+        portfolio.get_detailed_portfolio_report()
+
+    def tick_totals(i):
+        portfolio.update_quote(*ticks[i])
+        portfolio.get_portfolio_totals()
+
+    def tick_report(i):
+        portfolio.update_quote(*ticks[i])
+        portfolio.get_detailed_portfolio_report()
+
+    cold_time = per_call(cold_report, 5)
+    portfolio.get_detailed_portfolio_report()
+    totals_time = per_call(tick_totals, len(ticks))
+    report_time = per_call(tick_report, 50)
+
+    print(f"{n_lots} lots, {n_symbols} symbols")
+    print(f"tick + full pass over lots      {cold_time * 1000:10.3f} ms")
+    print(f"tick + totals (running sums)    {totals_time * 1000:10.3f} ms  ({cold_time / totals_time:.0f}x)")
+    print(f"tick + report (cached lot rows) {report_time * 1000:10.3f} ms  ({cold_time / report_time:.0f}x)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000, int(sys.argv[2]) if len(sys.argv) > 2 else 200)
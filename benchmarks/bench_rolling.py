@@ -0,0 +1,57 @@
+"""
+Rolling volatility, Sharpe, beta and drawdown: the O(n) RollingWindow (running sums and a
+monotonic deque) against pandas rolling().apply, which re-reads every window, and the cost of
+appending one day to an existing series.
+
+    python benchmarks/bench_rolling.py [days] [window]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analytics import RollingWindow, TRADING_DAYS_PER_YEAR
+
+
+def naive_rolling(returns, benchmark, window):
+    r, b = pd.Series(returns), pd.Series(benchmark)
+    annualize = np.sqrt(TRADING_DAYS_PER_YEAR)
+    volatility = r.rolling(window).apply(lambda x: x.std(ddof=1), raw=True) * annualize
+    sharpe = r.rolling(window).apply(lambda x: x.mean() / x.std(ddof=1), raw=True) * annualize
+    beta = r.rolling(window).apply(lambda x: np.cov(x, b.values[x.index[0]:x.index[-1] + 1])[0, 1] / b.values[x.index[0]:x.index[-1] + 1].var(ddof=1), raw=False)
+    wealth = pd.Series(np.exp(np.cumsum(np.log1p(returns))))
+    drawdown = wealth.rolling(window).apply(lambda x: x[-1] / x.max() - 1, raw=True)
+    return volatility.values, sharpe.values, beta.values, drawdown.values
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main(n_days, window):
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0.0004, 0.01, n_days)
+    benchmark = 0.7 * returns + rng.normal(0.0003, 0.006, n_days)
+    days = np.arange(n_days)
+
+    fast_time, rolling = timed(lambda: RollingWindow(window).extend(days, returns, benchmark))
+    naive_time, (volatility, sharpe, beta, drawdown) = timed(lambda: naive_rolling(returns, benchmark, window))
+    for name, expected in (('volatility', volatility), ('sharpe', sharpe), ('beta', beta), ('drawdown', drawdown)):
+        assert np.allclose(getattr(rolling, name), expected, equal_nan=True, rtol=1e-6, atol=1e-9), name
+
+    head = RollingWindow(window).extend(days[:-1], returns[:-1], benchmark[:-1])
+    append_time, _ = timed(lambda: head.update(days, returns, benchmark))
+
+    print(f"{n_days} days, {window}-day window")
+    print(f"  rolling().apply           {naive_time * 1000:10.1f} ms")
+    print(f"  running sums + deque      {fast_time * 1000:10.1f} ms  ({naive_time / fast_time:.0f}x)")
+    print(f"  append one day            {append_time * 1000:10.3f} ms")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1260, int(sys.argv[2]) if len(sys.argv) > 2 else 63)
@@ -0,0 +1,49 @@
+"""
+Read throughput of the SQLite backend against the JSON files it replaces:
+"closes for all holdings since a date" and loading the ledger.
+
+    python benchmarks/bench_sqlite_store.py [data_dir] [since]
+"""
+import json
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_price_store import best_of
+from sqlite_store import SQLiteStore, import_data_dir
+
+
+def main(data_dir, since):
+    since_seconds = int(pd.Timestamp(since).timestamp())
+    with tempfile.TemporaryDirectory() as root:
+        store = SQLiteStore(os.path.join(root, "portfolio.db"))
+        symbols = import_data_dir(data_dir, store)['symbols']
+        legacy = [s for s in symbols if os.path.exists(os.path.join(data_dir, f"{s}.json"))]
+
+        def json_closes():
+            for symbol in legacy:
+                close = pd.read_json(os.path.join(data_dir, f"{symbol}.json"))['Close']
+                close[close.index >= since]
+
+        def json_ledger():
+            with open(os.path.join(data_dir, "transactions.json")) as f:
+                json.load(f)
+
+        json_time = best_of(json_closes)
+        sqlite_time = best_of(lambda: store.closes(legacy, since=since_seconds))
+        ledger_json_time = best_of(json_ledger)
+        ledger_sqlite_time = best_of(store.load)
+        bars = sum(len(seconds) for seconds, _ in store.closes(legacy, since=since_seconds).values())
+
+    print(f"{len(legacy)} symbols, {bars} bars since {since}")
+    print(f"closes  pd.read_json + filter  {json_time * 1000:8.2f} ms")
+    print(f"closes  SQLite range scan      {sqlite_time * 1000:8.2f} ms  ({json_time / sqlite_time:.0f}x)")
+    print(f"ledger  json.load              {ledger_json_time * 1000:8.2f} ms")
+    print(f"ledger  SQLite                 {ledger_sqlite_time * 1000:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else "data", sys.argv[2] if len(sys.argv) > 2 else "2024-01-01")
@@ -0,0 +1,198 @@
+import threading
+
+import numpy as np
+
+import equity_engine
+from analytics import TRADING_DAYS_PER_YEAR
+
+# Trailing windows, in trading days, a covariance is kept for: a quarter, a year, three years
+COVARIANCE_WINDOWS = (63, 252, 756)
+# Rows added or removed through the running sums before they are rebuilt from the window, to
+# keep floating-point drift from the subtractions in check
+REBUILD_AFTER_ROWS = 5000
+
+
+def sample_returns(calendar_days: np.ndarray, columns, rows: int):
+    """
+    Daily returns of each (epoch_seconds, close) column sampled on the trading calendar: the last
+    close on or before each calendar day. Crypto trades seven days a week, so its weekend moves
+    land in Monday's return, on the same rows as every equity's Friday-to-Monday move.
+    Returns (days, returns) for the last `rows` calendar days where every column has a return.
+    """
+    calendar_days = calendar_days[-(rows + 1):]
+    returns = np.empty((max(len(calendar_days) - 1, 0), len(columns)))
+    for j, (seconds, closes) in enumerate(columns):
+        index = np.searchsorted(equity_engine.to_days(seconds), calendar_days, side='right') - 1
+        sampled = np.full(len(calendar_days), np.nan)
+        has_bar = index >= 0
+        sampled[has_bar] = np.asarray(closes, dtype=np.float64)[index[has_bar]]
+        sampled[~(sampled > 0)] = np.nan
+        returns[:, j] = sampled[1:] / sampled[:-1] - 1
+    # The common history: rows after the last one where any symbol had no data yet
+    incomplete = np.flatnonzero(np.isnan(returns).any(axis=1))
+    start = incomplete[-1] + 1 if len(incomplete) else 0
+    return calendar_days[1:][start:], returns[start:]
+
+
+class _WindowSums:
+    """
+    Running sums of the return rows in one window, enough for the sample covariance and the
+    Ledoit-Wolf shrinkage intensity without revisiting the rows (x^2 is elementwise):
+        s1 = sum x,  s2 = sum x x^T,  sq = sum x^2,  p3 = sum x^2 x^T,  p4 = sum x^2 (x^2)^T
+    """
+
+    def __init__(self, symbols: tuple, days: np.ndarray, returns: np.ndarray):
+        self.symbols = symbols
+        k = len(symbols)
+        self.s1 = np.zeros(k)
+        self.s2 = np.zeros((k, k))
+        self.sq = np.zeros(k)
+        self.p3 = np.zeros((k, k))
+        self.p4 = np.zeros((k, k))
+        self.changes = 0
+        self.version = 0
+        self._add(returns)
+        self.days, self.returns = days, returns
+
+    def _add(self, rows: np.ndarray, sign: float = 1.0):
+        if not len(rows):
+            return
+        squares = rows * rows
+        self.s1 += sign * rows.sum(axis=0)
+        self.s2 += sign * (rows.T @ rows)
+        self.sq += sign * squares.sum(axis=0)
+        self.p3 += sign * (squares.T @ rows)
+        self.p4 += sign * (squares.T @ squares)
+        self.changes += len(rows)
+
+    def update(self, days: np.ndarray, returns: np.ndarray) -> bool:
+        """Move the sums to a new window: subtract the rows that left or changed, add the new ones"""
+        _, old_index, new_index = np.intersect1d(self.days, days, assume_unique=True, return_indices=True)
+        same = (self.returns[old_index] == returns[new_index]).all(axis=1)
+        keep_old = np.zeros(len(self.days), dtype=bool)
+        keep_old[old_index[same]] = True
+        keep_new = np.zeros(len(days), dtype=bool)
+        keep_new[new_index[same]] = True
+        if keep_old.all() and keep_new.all():
+            return False
+        self._add(self.returns[~keep_old], -1.0)
+        self._add(returns[~keep_new])
+        self.days, self.returns = days, returns
+        self.version += 1
+        return True
+
+    def estimate(self) -> dict:
+        """
+        Sample covariance S (divisor T) shrunk towards its own diagonal, which keeps every
+        symbol's variance and pulls the correlations towards 0. A scaled-identity target would
+        pull every variance towards the average one, and crypto's variances would swamp the
+        equities'. The intensity is Ledoit-Wolf's, over the off-diagonal entries:
+            w_tij = (x_ti - m_i)(x_tj - m_j),   pi_ij = sum_t (w_tij - s_ij)^2 / T
+            shrinkage = clip(sum pi_ij / (T sum s_ij^2), 0, 1)
+        sum_t w_tij^2 expands into p4, p3, s2, sq and s1, so the rows are never revisited.
+        """
+        t = len(self.days)
+        m = self.s1 / t
+        sample = self.s2 / t - np.outer(m, m)
+        sample = (sample + sample.T) / 2
+        # sum over i != j of sum_t (x_i - m_i)^2 (x_j - m_j)^2, expanded: all of it minus the diagonal
+        m2 = m * m
+        total = (self.p4.sum() - 4 * (self.p3 @ m).sum() + 4 * m @ self.s2 @ m + 2 * self.sq.sum() * m2.sum()
+                 - 4 * m2.sum() * (m @ self.s1) + t * m2.sum() ** 2)
+        diagonal = (np.diag(self.p4) - 4 * np.diag(self.p3) * m + 4 * m2 * np.diag(self.s2) + 2 * self.sq * m2
+                    - 4 * m2 * m * self.s1 + t * m2 * m2)
+        variances = np.diag(sample)
+        gamma = np.sum(sample * sample) - variances @ variances
+        pi = max((total - diagonal.sum()) / t - gamma, 0.0)
+        shrinkage = float(np.clip(pi / (t * gamma), 0.0, 1.0)) if gamma > 0 else 1.0
+        covariance = (1 - shrinkage) * sample
+        np.fill_diagonal(covariance, variances)
+        return {'covariance': covariance, 'sample': sample, 'mean': m, 'shrinkage': shrinkage}
+
+
+def shrunk_covariance(returns: np.ndarray) -> dict:
+    """One-off daily estimate ('covariance', 'sample', 'mean', 'shrinkage') of a [days x symbols] return matrix"""
+    return _WindowSums(tuple(range(returns.shape[1])), np.arange(len(returns)), returns).estimate()
+
+
+class CovarianceService:
+    """
+    Shrunk covariance and correlation of the daily returns of a set of symbols, one cached
+    estimate per trailing window. Each call resamples only the last `window` rows and moves the
+    window's running sums by the rows that changed, so a new bar costs O(k^2) per row rather
+    than a pass over the whole window. A different symbol set starts the window over.
+    """
+
+    def __init__(self, windows=COVARIANCE_WINDOWS, rebuild_after: int = REBUILD_AFTER_ROWS):
+        self.windows = windows
+        self.rebuild_after = rebuild_after
+        self._sums = {}  # {window: _WindowSums}
+        self._estimates = {}  # {window: (symbols, sums version, estimate)}
+        self._lock = threading.Lock()
+
+    def estimate(self, window: int, symbols, calendar_days: np.ndarray, columns) -> dict:
+        """
+        Estimate for symbols (in order) from their (epoch_seconds, close) columns sampled on
+        calendar_days. Returns arrays, annualized: 'covariance', 'correlation', 'volatility',
+        'mean', plus 'symbols', 'window', 'observations' (rows actually used, less than window
+        while some symbol has a shorter history), 'start'/'end' days and 'shrinkage'.
+        """
+        if window not in self.windows:
+            raise ValueError(f"window must be one of {', '.join(map(str, self.windows))}")
+        symbols = tuple(symbols)
+        days, returns = sample_returns(calendar_days, columns, window)
+        with self._lock:
+            sums = self._sums.get(window)
+            if sums is None or sums.symbols != symbols or sums.changes > self.rebuild_after:
+                sums = self._sums[window] = _WindowSums(symbols, days, returns)
+            else:
+                sums.update(days, returns)
+            cached = self._estimates.get(window)
+            if cached and cached[0] == symbols and cached[1] == (id(sums), sums.version):
+                return cached[2]
+            result = self._annualize(sums, window)
+            self._estimates[window] = (symbols, (id(sums), sums.version), result)
+            return result
+
+    @staticmethod
+    def _annualize(sums: _WindowSums, window: int) -> dict:
+        result = {'symbols': list(sums.symbols), 'window': window, 'observations': len(sums.days)}
+        if len(sums.days) < 2 or not sums.symbols:
+            return result
+        estimate = sums.estimate()
+        covariance = estimate['covariance'] * TRADING_DAYS_PER_YEAR
+        volatility = np.sqrt(np.diag(covariance))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = covariance / np.outer(volatility, volatility)
+        np.fill_diagonal(correlation, 1.0)
+        result.update(
+            start=int(sums.days[0]), end=int(sums.days[-1]),
+            shrinkage=estimate['shrinkage'],
+            mean=estimate['mean'] * TRADING_DAYS_PER_YEAR,
+            covariance=covariance,
+            volatility=volatility,
+            correlation=np.nan_to_num(correlation),
+        )
+        return result
+
+
+def diversification(estimate: dict, weights: np.ndarray) -> dict:
+    """
+    How much the holdings' risks offset each other at the given portfolio weights:
+        volatility             annualized portfolio volatility sqrt(w^T C w)
+        diversification_ratio  weighted average volatility over portfolio volatility (1 = none)
+        average_correlation    mean pairwise correlation, weighted by w_i w_j
+    """
+    covariance = estimate.get('covariance')
+    if covariance is None or not weights.any():
+        return {}
+    weights = weights / np.abs(weights).sum()
+    portfolio_volatility = float(np.sqrt(max(weights @ covariance @ weights, 0.0)))
+    pair_weights = np.outer(np.abs(weights), np.abs(weights))
+    np.fill_diagonal(pair_weights, 0.0)
+    pairs = pair_weights.sum()
+    return {
+        'volatility': portfolio_volatility,
+        'diversification_ratio': float(np.abs(weights) @ estimate['volatility'] / portfolio_volatility) if portfolio_volatility > 0 else None,
+        'average_correlation': float((pair_weights * estimate['correlation']).sum() / pairs) if pairs > 0 else None,
+    }
@@ -0,0 +1,257 @@
+import csv
+import math
+import sys
+from collections import namedtuple, Counter
+from datetime import datetime
+from itertools import islice
+from operator import attrgetter, itemgetter
+
+# Rows parsed per pass over the reader; the file itself is never read into memory whole
+CHUNK_ROWS = 10_000
+# The report lists this many problem rows, and counts the rest
+MAX_REPORTED_ROWS = 200
+# Lines searched for the header (Schwab exports start with a title line)
+HEADER_SEARCH_LINES = 10
+
+ImportedTrade = namedtuple('ImportedTrade', 'date line symbol action quantity price company_name security_type')
+
+
+class CSVFormat:
+    """
+    How a brokerage export lays out trades.
+        columns        {field: header} for date, action, symbol, quantity, price (required) and
+                       fees, company_name, security_type (optional). Headers match case-insensitively.
+        actions        {action text, lowercase: 'buy' | 'sell' | 'short' | 'cover'}
+        date_formats   strptime formats tried in order. "MM/DD/YYYY as of MM/DD/YYYY" uses the as-of date.
+        strict         Rows with an action outside `actions` are errors. Otherwise they are skipped
+                       as non-trades (dividends, transfers, interest, ...) and counted by action.
+    """
+
+    REQUIRED = ('date', 'action', 'symbol', 'quantity', 'price')
+
+    def __init__(self, name: str, columns: dict, actions: dict, date_formats=('%Y-%m-%d',), strict=True):
+        self.name = name
+        self.columns = columns
+        self.actions = actions
+        self.date_formats = date_formats
+        self.strict = strict
+
+
+SCHWAB = CSVFormat(
+    'schwab',
+    columns={'date': 'Date', 'action': 'Action', 'symbol': 'Symbol', 'company_name': 'Description',
+             'quantity': 'Quantity', 'price': 'Price', 'fees': 'Fees & Comm'},
+    actions={'buy': 'buy', 'reinvest shares': 'buy', 'sell': 'sell', 'sell short': 'short', 'buy to cover': 'cover'},
+    date_formats=('%m/%d/%Y',),
+    strict=False,
+)
+
+GENERIC = CSVFormat(
+    'generic',
+    columns={'date': 'date', 'action': 'action', 'symbol': 'symbol', 'quantity': 'quantity', 'price': 'price',
+             'fees': 'fees', 'company_name': 'company_name', 'security_type': 'type'},
+    actions={'buy': 'buy', 'sell': 'sell', 'short': 'short', 'sell short': 'short', 'cover': 'cover',
+             'buy to cover': 'cover'},
+    date_formats=('%Y-%m-%d', '%m/%d/%Y'),
+)
+
+FORMATS = {fmt.name: fmt for fmt in (SCHWAB, GENERIC)}
+
+
+def get_format(name: str = None, columns: dict = None) -> CSVFormat:
+    """A named format, optionally with some of its column headers renamed"""
+    base = FORMATS.get((name or 'schwab').lower())
+    if base is None:
+        raise ValueError(f"Unknown CSV format {name!r}, expected one of {', '.join(FORMATS)}")
+    if not columns:
+        return base
+    unknown = set(columns) - set(base.columns)
+    if unknown:
+        raise ValueError(f"Unknown column fields: {', '.join(sorted(unknown))}")
+    return CSVFormat(base.name, {**base.columns, **columns}, base.actions, base.date_formats, base.strict)
+
+
+def _parse_number(text: str):
+    """'$1,234.50' -> 1234.5, '(12)' -> -12, '' -> None. Whole numbers stay ints, as the UI sends them."""
+    text = text.strip().replace('$', '').replace(',', '')
+    if not text:
+        return None
+    negative = text.startswith('(') and text.endswith(')')
+    if negative:
+        text = text[1:-1]
+    try:
+        value = int(text) if text.lstrip('+-').isdigit() else float(text)
+    except ValueError:
+        raise ValueError(f"not a number: {text!r}") from None
+    return -value if negative else value
+
+
+class CSVImporter:
+    """
+    Parses a brokerage CSV into trades sorted by date, then applies them. Parsing happens outside
+    any lock; apply() is meant to run under the ledger's write lock, with one persist after it.
+    Rows that cannot be parsed or applied are reported, never fatal.
+    """
+
+    def __init__(self, fmt: CSVFormat = SCHWAB, chunk_rows: int = CHUNK_ROWS):
+        self.fmt = fmt
+        self.chunk_rows = chunk_rows
+        self.trades = []
+        self.rows = 0
+        self.skipped = Counter()  # non-trade rows by action
+        self.errors = []
+        self.error_count = 0
+        self.warnings = []
+        self.warning_count = 0
+        self._dates = {}  # date text -> ISO date; exports repeat the same few thousand dates
+
+    def _report(self, kind, line, message):
+        if kind == 'error':
+            self.error_count += 1
+            reported = self.errors
+        else:
+            self.warning_count += 1
+            reported = self.warnings
+        if len(reported) < MAX_REPORTED_ROWS:
+            reported.append({'line': line, 'message': message})
+
+    def _find_header(self, reader):
+        wanted = {field: header.strip().lower() for field, header in self.fmt.columns.items()}
+        for row in islice(reader, HEADER_SEARCH_LINES):
+            cells = [cell.strip().lower() for cell in row]
+            if all(wanted[field] in cells for field in CSVFormat.REQUIRED):
+                return {field: cells.index(header) for field, header in wanted.items() if header in cells}
+        raise ValueError(f"No header row with the {self.fmt.name} columns "
+                         f"{', '.join(self.fmt.columns[field] for field in CSVFormat.REQUIRED)} "
+                         f"in the first {HEADER_SEARCH_LINES} lines")
+
+    def _parse_date(self, text: str) -> str:
+        iso = self._dates.get(text)
+        if iso is None:
+            value = text.split(' as of ')[-1].strip()
+            for date_format in self.fmt.date_formats:
+                try:
+                    iso = datetime.strptime(value, date_format).strftime('%Y-%m-%d')
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise ValueError(f"unrecognized date {text!r}")
+            self._dates[text] = iso
+        return iso
+
+    def _parse_chunk(self, rows, columns, first_line):
+        actions = self.fmt.actions
+        date_col, action_col, symbol_col = columns['date'], columns['action'], columns['symbol']
+        quantity_col, price_col = columns['quantity'], columns['price']
+        fees_col, name_col, type_col = columns.get('fees'), columns.get('company_name'), columns.get('security_type')
+        width = max(columns.values()) + 1
+        for line, row in enumerate(rows, first_line):
+            if not any(cell.strip() for cell in row):
+                continue
+            if len(row) < width:
+                row = row + [''] * (width - len(row))
+            action_text = row[action_col].strip()
+            action = actions.get(action_text.lower())
+            if action is None:
+                if self.fmt.strict:
+                    self._report('error', line, f"unknown action {action_text!r}")
+                else:
+                    self.skipped[action_text or '(blank)'] += 1
+                continue
+            try:
+                symbol = row[symbol_col].strip().upper()
+                if not symbol:
+                    raise ValueError("missing symbol")
+                date = self._parse_date(row[date_col].strip())
+                quantity = _parse_number(row[quantity_col])
+                price = _parse_number(row[price_col])
+                if quantity is None or price is None:
+                    raise ValueError("missing quantity or price")
+                # Sells are often exported as negative quantities
+                quantity = abs(quantity)
+                if not (quantity > 0 and price > 0 and math.isfinite(quantity) and math.isfinite(price)):
+                    raise ValueError("quantity and price must be positive")
+                fees = _parse_number(row[fees_col]) if fees_col is not None else None
+                if fees:
+                    # Commissions go into the lot's basis on the way in and come off the proceeds on the way out
+                    per_share = abs(fees) / quantity
+                    price = price + per_share if action in ('buy', 'cover') else price - per_share
+                company_name = row[name_col].strip() if name_col is not None else ''
+                security_type = row[type_col].strip() if type_col is not None else ''
+            except ValueError as e:
+                self._report('error', line, str(e))
+                continue
+            self.trades.append(ImportedTrade(date, line, symbol, action, quantity, price,
+                                             company_name or 'N/A', security_type or 'Common Stock'))
+
+    def parse(self, stream):
+        """Read trades from a text stream, chunk by chunk, and put them in date order"""
+        reader = csv.reader(stream)
+        columns = self._find_header(reader)
+        line = reader.line_num + 1
+        while True:
+            rows = list(islice(reader, self.chunk_rows))
+            if not rows:
+                break
+            self.rows += len(rows)
+            self._parse_chunk(rows, columns, line)
+            line += len(rows)
+        if self.trades and self.trades[0].date > self.trades[-1].date:
+            # Newest-first export: reversing keeps same-day trades in the order they happened
+            self.trades.reverse()
+        # Stable, so trades on the same date keep their file order
+        self.trades.sort(key=attrgetter('date'))
+        return self
+
+    def apply(self, portfolio, apply_transaction) -> int:
+        """
+        Apply the parsed trades in order with apply_transaction(symbol, quantity, price, date,
+        company_name, security_type, action). Trades the portfolio refuses (selling a symbol
+        never bought, ...) become errors, partial sells and covers become warnings.
+        Returns the number of trades applied.
+        """
+        applied = 0
+        verbose, portfolio.verbose = portfolio.verbose, False
+        try:
+            for trade in self.trades:
+                version = portfolio.version
+                portfolio.last_message = None
+                apply_transaction(trade.symbol, trade.quantity, trade.price, trade.date,
+                                  trade.company_name, trade.security_type, trade.action)
+                if portfolio.version == version:
+                    self._report('error', trade.line, portfolio.last_message or "not applied")
+                    continue
+                applied += 1
+                if trade.action in ('sell', 'cover'):
+                    executed = portfolio.transaction_history[-1]['quantity']
+                    if executed < trade.quantity:
+                        self._report('warning', trade.line,
+                                     f"{trade.action} of {trade.quantity} {trade.symbol} only closed {executed}")
+        finally:
+            portfolio.verbose = verbose
+        return applied
+
+    def summary(self, imported: int) -> dict:
+        return {
+            'format': self.fmt.name,
+            'rows': self.rows,
+            'imported': imported,
+            'skipped': dict(self.skipped),
+            'error_count': self.error_count,
+            'errors': sorted(self.errors, key=itemgetter('line')),
+            'warning_count': self.warning_count,
+            'warnings': sorted(self.warnings, key=itemgetter('line')),
+        }
+
+
+if __name__ == '__main__':
+    from portfolio_manager import get_manager
+    if len(sys.argv) < 2:
+        sys.exit("usage: python csv_import.py <file.csv> [schwab|generic]")
+    with open(sys.argv[1], newline='', encoding='utf-8-sig') as f:
+        result = get_manager().import_csv(f, sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"Imported {result['imported']} of {result['rows']} rows, skipped {sum(result['skipped'].values())}, "
+          f"{result['error_count']} errors, {result['warning_count']} warnings")
+    for problem in result['errors'] + result['warnings']:
+        print(f"  line {problem['line']}: {problem['message']}")
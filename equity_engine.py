@@ -0,0 +1,163 @@
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+# 1970-01-01 was a Thursday, so (day + 3) % 7 gives Monday=0 ... Sunday=6
+EPOCH_WEEKDAY_OFFSET = 3
+# Marks a lot date that is missing, meaning "held since before any price history"
+UNKNOWN_DAY = np.iinfo(np.int64).min
+
+
+def to_days(seconds: np.ndarray) -> np.ndarray:
+    """Epoch seconds -> days since epoch (UTC calendar day)"""
+    return np.floor_divide(np.asarray(seconds, dtype=np.int64), SECONDS_PER_DAY)
+
+
+def is_weekday(days: np.ndarray) -> np.ndarray:
+    return (days + EPOCH_WEEKDAY_OFFSET) % 7 < 5
+
+
+def build_price_matrix(columns, since_day: int = None):
+    """
+    Align per-symbol close series on a common weekday calendar.
+    columns: sequence of (epoch_seconds, close) arrays, one per symbol.
+    Returns (days, prices) where prices[i, j] is symbol j's close on days[i], 0 where it has no bar.
+    Several bars on the same calendar day are summed, matching the old groupby-by-date.
+    """
+    symbol_days = []
+    symbol_closes = []
+    for seconds, close in columns:
+        days = to_days(seconds)
+        if since_day is not None:
+            first = np.searchsorted(days, since_day)
+            days, close = days[first:], close[first:]
+        symbol_days.append(days)
+        symbol_closes.append(close)
+
+    if not any(len(days) for days in symbol_days):
+        return np.empty(0, dtype=np.int64), np.zeros((0, len(symbol_days)))
+    # Days are small integers, so scatter straight into a dense calendar instead of sorting a union
+    first_day = min(days[0] for days in symbol_days if len(days))
+    last_day = max(days[-1] for days in symbol_days if len(days))
+    span = last_day - first_day + 1
+    present = np.zeros(span, dtype=bool)
+    calendar = np.zeros((span, len(symbol_days)), dtype=np.float64, order='F')
+    for j, (days, closes) in enumerate(zip(symbol_days, symbol_closes)):
+        offsets = days - first_day
+        present[offsets] = True
+        calendar[:, j] = np.bincount(offsets, weights=closes, minlength=span)
+
+    all_days = np.arange(first_day, last_day + 1)
+    keep = present & is_weekday(all_days)
+    return all_days[keep], np.nan_to_num(calendar[keep])
+
+
+def build_bar_matrix(columns):
+    """
+    Align intraday close series on the union of their bar times.
+    Returns (times, prices) where prices[i, j] is symbol j's close at times[i], 0 where it has no bar.
+    """
+    columns = [(np.asarray(seconds, dtype=np.int64), close) for seconds, close in columns]
+    if not any(len(seconds) for seconds, _ in columns):
+        return np.empty(0, dtype=np.int64), np.zeros((0, len(columns)))
+    times = np.unique(np.concatenate([seconds for seconds, _ in columns]))
+    prices = np.zeros((len(times), len(columns)), dtype=np.float64, order='F')
+    for j, (seconds, close) in enumerate(columns):
+        prices[np.searchsorted(times, seconds), j] = close
+    return times, np.nan_to_num(prices)
+
+
+def parse_days(dates) -> np.ndarray:
+    """'YYYY-MM-DD...' strings -> days since epoch. None or unparseable dates become UNKNOWN_DAY."""
+    try:
+        # One vectorized conversion; missing dates come back as NaT
+        parsed = np.array([str(value)[:10] if value else 'NaT' for value in dates], dtype='datetime64[D]')
+        days = parsed.astype(np.int64)
+        days[np.isnat(parsed)] = UNKNOWN_DAY
+        return days
+    except ValueError:
+        pass
+    days = np.full(len(dates), UNKNOWN_DAY, dtype=np.int64)
+    for i, value in enumerate(dates):
+        if value:
+            try:
+                days[i] = np.datetime64(str(value)[:10], 'D').astype(np.int64)
+            except ValueError:
+                pass
+    return days
+
+
+def holdings_matrix(days: np.ndarray, events) -> np.ndarray:
+    """
+    Quantity held of each symbol on each of days, as a [days x symbols] matrix.
+    events: sequence of (event_days, quantity_changes) arrays, one per symbol. Holdings are the
+    cumulative sum of the changes, sampled on every day with one searchsorted over all symbols.
+    Events on UNKNOWN_DAY apply from the start of the calendar.
+    """
+    n_days, n_symbols = len(days), len(events)
+    if n_days == 0 or n_symbols == 0:
+        return np.zeros((n_days, n_symbols))
+
+    # Offset 0 is "before the first day", last + 1 is "after the last day"
+    origin = days[0] - 1
+    last = days[-1] - origin
+    stride = last + 2
+    counts = np.array([len(event_days) for event_days, _ in events])
+    symbol_of_event = np.repeat(np.arange(n_symbols), counts)
+    if counts.sum():
+        event_days = np.concatenate([np.asarray(d, dtype=np.int64) for d, _ in events])
+        changes = np.concatenate([np.asarray(c, dtype=np.float64) for _, c in events])
+    else:
+        event_days, changes = np.empty(0, dtype=np.int64), np.empty(0)
+    event_days = np.where(event_days == UNKNOWN_DAY, origin, event_days)
+    offsets = np.clip(event_days - origin, 0, last + 1)
+
+    # One sorted key space: symbol j's events live in [j * stride, (j + 1) * stride)
+    keys = symbol_of_event * stride + offsets
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    running = np.cumsum(changes[order])
+    block_start = np.searchsorted(keys, np.arange(n_symbols) * stride)
+    base = np.where(block_start > 0, running[block_start - 1], 0.0)
+
+    queries = np.arange(n_symbols)[:, None] * stride + (days - origin)[None, :]
+    last_event = np.searchsorted(keys, queries, side='right') - 1
+    held = last_event >= block_start[:, None]
+    quantities = np.where(held, running[np.maximum(last_event, 0)] - base[:, None], 0.0) if len(keys) else np.zeros(queries.shape)
+    return quantities.T
+
+
+def daily_equity(prices: np.ndarray, holdings: np.ndarray) -> np.ndarray:
+    """
+    Portfolio value per day. holdings is either one quantity per symbol (a single matmul) or a
+    [days x symbols] matrix of quantities over time (a row-wise dot product).
+    """
+    if holdings.ndim == 1:
+        return prices @ holdings
+    return np.einsum('ij,ij->i', prices, holdings)
+
+
+def holiday_mask(prices: np.ndarray, holdings: np.ndarray, started: np.ndarray = None) -> np.ndarray:
+    """
+    True for days to keep. A day is dropped when a symbol held that day has no bar although its
+    price history has already begun: its market was closed (a holiday), its value did not fall
+    to 0. Days before a symbol's first bar are kept, as its value is simply not known yet.
+    started: per symbol, True when its history begins before the first row, as for a tail of the
+    calendar. holdings is one quantity per symbol or a [days x symbols] matrix.
+    """
+    has_bar = prices > 0
+    listed = np.logical_or.accumulate(has_bar, axis=0) if len(prices) else has_bar
+    if started is not None:
+        listed = listed | np.asarray(started, dtype=bool)
+    return ~((holdings != 0) & listed & ~has_bar).any(axis=1)
+
+
+def to_points(days: np.ndarray, equity: np.ndarray, unit: int = SECONDS_PER_DAY) -> list[dict]:
+    """Serialize to the [{"time": epoch_seconds, "equity": value}] shape the chart expects"""
+    times = (days * unit).tolist()
+    values = np.round(equity, 2).tolist()
+    return [{"time": t, "equity": v} for t, v in zip(times, values)]
+
+
+def equity_points(days: np.ndarray, equity: np.ndarray, keep: np.ndarray, unit: int = SECONDS_PER_DAY) -> list[dict]:
+    """to_points for the days holiday_mask keeps"""
+    return to_points(days[keep], equity[keep], unit)
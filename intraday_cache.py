@@ -0,0 +1,196 @@
+import re
+import threading
+import time
+from datetime import date, datetime, time as clock_time
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+import equity_engine
+
+MARKET_TZ = ZoneInfo("America/New_York")
+SESSION_OPEN = clock_time(9, 30)
+SESSION_CLOSE = clock_time(16, 0)
+SECONDS_PER_DAY = equity_engine.SECONDS_PER_DAY
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Every interval is derived from 1 minute bars, so only those are downloaded
+BASE_INTERVAL = '1m'
+BASE_INTERVAL_SECONDS = 60
+# yfinance keeps revising the last bars for a while after the close
+SESSION_SETTLE_SECONDS = 15 * 60
+
+
+def interval_seconds(interval: str) -> int:
+    """'1m', '30m', '1h' ... -> seconds. Only whole multiples of the 1 minute base interval are supported."""
+    match = re.fullmatch(r'(\d+)([mh])', interval or '')
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Unsupported intraday interval: {interval}")
+    return int(match.group(1)) * (60 if match.group(2) == 'm' else 3600)
+
+
+def session_day(epoch_seconds: float) -> int:
+    """Days since epoch of the New York calendar date at epoch_seconds"""
+    return datetime.fromtimestamp(epoch_seconds, MARKET_TZ).date().toordinal() - EPOCH_ORDINAL
+
+
+def session_bounds(day: int):
+    """(open, close) of a regular session as epoch seconds"""
+    local = date.fromordinal(EPOCH_ORDINAL + day)
+    open_at = datetime.combine(local, SESSION_OPEN, tzinfo=MARKET_TZ).timestamp()
+    close_at = datetime.combine(local, SESSION_CLOSE, tzinfo=MARKET_TZ).timestamp()
+    return int(open_at), int(close_at)
+
+
+def resample_last(seconds: np.ndarray, closes: np.ndarray, bucket_seconds: int):
+    """Downsample to bucket_seconds bars labelled by their start, keeping the last close, like yfinance does"""
+    if bucket_seconds == BASE_INTERVAL_SECONDS or len(seconds) == 0:
+        return seconds, closes
+    buckets = seconds // bucket_seconds * bucket_seconds
+    last = np.flatnonzero(np.append(buckets[1:] != buckets[:-1], True))
+    return buckets[last], closes[last]
+
+
+class IntradayBarCache:
+    """
+    In-memory cache of regular-hours intraday closes keyed by (symbol, interval, session day).
+    - Only 1 minute bars are downloaded; coarser intervals are resampled from them.
+    - Sessions that have settled are never fetched again.
+    - The open session is topped up from its last cached bar at most once per refresh_interval.
+    loader(symbols, start_epoch) must return {symbol: (epoch_seconds, closes)} of 1 minute bars
+    inside regular trading hours, from start_epoch up to now.
+    If a store (SQLiteStore) is given, settled sessions are saved to it and read back from it
+    before anything is downloaded.
+    """
+
+    def __init__(self, loader, refresh_interval: float = 60.0, clock=time.time, store=None):
+        self.loader = loader
+        self.store = store
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self._bars = {}  # {(symbol, interval, day): (epoch_seconds, closes)}
+        self._settled = set()  # (symbol, day) whose 1 minute bars are final
+        self._checked_at = {}  # {symbol: clock() of the last top-up}
+        self._lock = threading.Lock()
+        # Bumped whenever new bars land, so callers can memoize anything derived from the cache
+        self.generation = 0
+
+    def session_days(self, days: int) -> list:
+        """Weekdays of the last `days` calendar days, oldest first"""
+        now = self.clock()
+        first, last = session_day(now - days * SECONDS_PER_DAY), session_day(now)
+        return [day for day in range(first, last + 1) if equity_engine.is_weekday(day)]
+
+    def window_start(self, days: int) -> float:
+        return self.clock() - days * SECONDS_PER_DAY
+
+    def _is_settled(self, day: int, now: float) -> bool:
+        return now >= session_bounds(day)[1] + SESSION_SETTLE_SECONDS
+
+    def refresh(self, symbols, days: int):
+        """Download whatever the last `days` of sessions are missing for symbols"""
+        now = self.clock()
+        sessions = self.session_days(days)
+        with self._lock:
+            starts = {}
+            for symbol in symbols:
+                for day in sessions:
+                    if (symbol, day) in self._settled:
+                        continue
+                    bars = self._bars.get((symbol, BASE_INTERVAL, day))
+                    if bars is None and self._load_stored(symbol, day):
+                        continue
+                    if bars is None:
+                        starts[symbol] = session_bounds(day)[0]
+                    elif now - self._checked_at.get(symbol, 0) >= self.refresh_interval:
+                        # Restart at the last cached bar, it may still have been forming
+                        starts[symbol] = int(bars[0][-1]) if len(bars[0]) else session_bounds(day)[0]
+                    break
+            if starts:
+                self._download(starts, sessions, now)
+
+    def _download(self, starts: dict, sessions: list, now: float):
+        # One call per starting session: cold symbols share a start, top-ups of the open session share another
+        groups = {}
+        for symbol, start in starts.items():
+            groups.setdefault(start // SECONDS_PER_DAY, []).append(symbol)
+        for group in groups.values():
+            start = min(starts[symbol] for symbol in group)
+            try:
+                loaded = self.loader(group, start)
+            except Exception as e:
+                print(f"Could not download intraday bars for {', '.join(group)}: {e}")
+                continue
+            for symbol in group:
+                seconds, closes = loaded.get(symbol, (np.empty(0, dtype=np.int64), np.empty(0)))
+                self._merge(symbol, np.asarray(seconds, dtype=np.int64), np.asarray(closes, dtype=np.float64),
+                            [day for day in sessions if session_bounds(day)[1] > start], now)
+                self._checked_at[symbol] = now
+            self.generation += 1
+
+    def _merge(self, symbol, seconds, closes, sessions, now):
+        # Regular hours never cross midnight UTC, so the UTC day of a bar is its session day
+        bar_days = seconds // SECONDS_PER_DAY
+        for day in sessions:
+            if (symbol, day) in self._settled:
+                continue
+            lo, hi = np.searchsorted(bar_days, [day, day + 1])
+            new_seconds, new_closes = seconds[lo:hi], closes[lo:hi]
+            old = self._bars.get((symbol, BASE_INTERVAL, day))
+            if old is not None and len(new_seconds):
+                keep = np.searchsorted(old[0], new_seconds[0], side='left')
+                new_seconds = np.concatenate([old[0][:keep], new_seconds])
+                new_closes = np.concatenate([old[1][:keep], new_closes])
+            elif old is not None:
+                new_seconds, new_closes = old
+            self._bars[(symbol, BASE_INTERVAL, day)] = (new_seconds, new_closes)
+            if self._is_settled(day, now):
+                self._settled.add((symbol, day))
+                if self.store is not None and len(new_seconds):
+                    self.store.write_intraday(symbol, BASE_INTERVAL, new_seconds, new_closes)
+
+    def _load_stored(self, symbol, day) -> bool:
+        """Fill a settled session from the store. Returns False if the store does not have it."""
+        if self.store is None or not self._is_settled(day, self.clock()):
+            return False
+        open_at, close_at = session_bounds(day)
+        if not self.store.has_intraday(symbol, BASE_INTERVAL, open_at, close_at + 1):
+            return False
+        self._bars[(symbol, BASE_INTERVAL, day)] = self.store.intraday(symbol, BASE_INTERVAL, open_at, close_at + 1)
+        self._settled.add((symbol, day))
+        return True
+
+    def _session_bars(self, symbol, interval: str, day: int):
+        key = (symbol, interval, day)
+        bars = self._bars.get(key)
+        if bars is not None:
+            return bars
+        base = self._bars.get((symbol, BASE_INTERVAL, day))
+        if base is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        bars = resample_last(base[0], base[1], interval_seconds(interval))
+        # Only settled sessions are final, the open one is resampled again after every top-up
+        if (symbol, day) in self._settled:
+            self._bars[key] = bars
+        return bars
+
+    def bars(self, symbols, interval: str, days: int) -> dict:
+        """{symbol: (epoch_seconds, closes)} at interval over the last `days` calendar days"""
+        interval_seconds(interval)
+        start = self.window_start(days)
+        sessions = self.session_days(days)
+        result = {}
+        with self._lock:
+            for symbol in symbols:
+                parts = [self._session_bars(symbol, interval, day) for day in sessions]
+                seconds = np.concatenate([part[0] for part in parts]) if parts else np.empty(0, dtype=np.int64)
+                closes = np.concatenate([part[1] for part in parts]) if parts else np.empty(0)
+                first = np.searchsorted(seconds, start)
+                result[symbol] = (seconds[first:], closes[first:])
+        return result
+
+    def invalidate(self, symbol: str = None):
+        with self._lock:
+            for key in [key for key in self._bars if symbol is None or key[0] == symbol]:
+                del self._bars[key]
+            self._settled = {key for key in self._settled if symbol is not None and key[0] != symbol}
+            self.generation += 1
@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import time
+
+from lot_store import LotStore
+
+
+class LedgerJournal:
+    """
+    Append-only journal of lot changes on top of the transactions.json / closed_lots.json snapshot.
+
+    Each line is one JSON record:
+        {"op": "put", "symbol": ..., "lot": {...}}   add a lot or replace it by transactionId
+        {"op": "del", "id": ...}                     drop an open lot
+        {"op": "close", "lot": {...}}                append a closed lot (skipped if its closeId is known)
+    'txn' records (the trade history) are only kept by the SQLite backend and are not written here.
+    Every record is idempotent, so replaying a journal over a snapshot that already contains some
+    of it is harmless. That lets compact() write the snapshot first and truncate the journal after,
+    without a window where a crash loses or duplicates anything.
+
+    Appends are flushed straight away; fsync is batched to at most once per fsync_interval seconds.
+    """
+
+    def __init__(self, journal_path: str, snapshot_path: str, closed_lots_path: str,
+                 fsync_interval: float = 0.2, compact_after: int = 5000):
+        self.journal_path = journal_path
+        self.snapshot_path = snapshot_path
+        self.closed_lots_path = closed_lots_path
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+        self.records = 0  # records in the journal since the last snapshot
+        self._file = None
+        self._last_fsync = 0.0
+        self._sync_timer = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read the snapshot and replay the journal over it. Returns (LotStore, closed_lots)."""
+        positions = LotStore.from_dict(self._read_json(self.snapshot_path, {}))
+        closed_lots = self._read_json(self.closed_lots_path, [])
+        close_ids = {closed['closeId'] for closed in closed_lots if 'closeId' in closed}
+        records = 0
+        valid_bytes = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash: everything after it is unusable
+                        print(f"Ignoring a partial record at byte {valid_bytes} of {self.journal_path}")
+                        break
+                    self._apply(record, positions, closed_lots, close_ids)
+                    valid_bytes += len(line)
+                    records += 1
+            if valid_bytes != os.path.getsize(self.journal_path):
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(valid_bytes)
+        with self._lock:
+            self.records = records
+        return positions, closed_lots
+
+    @staticmethod
+    def _read_json(path, default):
+        if not os.path.exists(path):
+            return default
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _apply(record, positions: LotStore, closed_lots: list, close_ids: set):
+        op = record['op']
+        if op == 'put':
+            positions.add(record['symbol'], record['lot'])
+        elif op == 'del':
+            positions.remove(record['id'])
+        elif op == 'close':
+            close_id = record['lot'].get('closeId')
+            if close_id not in close_ids:
+                closed_lots.append(record['lot'])
+                if close_id is not None:
+                    close_ids.add(close_id)
+
+    def append(self, records):
+        """Write records as one batch. They are durable within fsync_interval seconds."""
+        records = [record for record in records if record['op'] != 'txn']
+        if not records:
+            return
+        data = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records).encode()
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.journal_path, 'ab')
+            self._file.write(data)
+            self._file.flush()
+            self.records += len(records)
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._fsync()
+            elif self._sync_timer is None:
+                self._sync_timer = threading.Timer(self.fsync_interval, self.sync)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+
+    def _fsync(self):
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+
+    def sync(self):
+        with self._lock:
+            self._sync_timer = None
+            if self._file is not None:
+                self._fsync()
+
+    def needs_compaction(self) -> bool:
+        return self.records >= self.compact_after
+
+    def compact(self, positions: dict, closed_lots: list):
+        """Write a full snapshot atomically, then start an empty journal"""
+        with self._lock:
+            self._write_atomic(self.closed_lots_path, closed_lots)
+            self._write_atomic(self.snapshot_path, positions)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            with open(self.journal_path, 'wb') as f:
+                os.fsync(f.fileno())
+            self.records = 0
+
+    @staticmethod
+    def _write_atomic(path, obj):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            # dumps() runs the C encoder; dump() streams through the pure-Python one, several times slower
+            f.write(json.dumps(obj))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def version(self):
+        """Changes whenever the snapshot or the journal on disk changes, including from another process"""
+        stats = []
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                stat = os.stat(path)
+                stats.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stats.append(None)
+        return tuple(stats)
+
+    def close(self):
+        with self._lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+            if self._file is not None:
+                self._fsync()
+                self._file.close()
+                self._file = None
@@ -0,0 +1,278 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import websocket
+
+logger = logging.getLogger(__name__)
+
+FINNHUB_WS_URL = os.getenv("FINNHUB_WS_URL", "wss://ws.finnhub.io")
+# Trades arriving within this window after the first one are folded into the same recompute
+LIVE_BATCH_SECONDS = 0.5
+# Recompute even without trades, so crypto (not on the trade feed) and quiet symbols still move
+LIVE_IDLE_REFRESH_SECONDS = 30.0
+# SSE comment sent to idle clients so proxies do not close the connection
+LIVE_HEARTBEAT_SECONDS = 15.0
+RECONNECT_INITIAL_BACKOFF_SECONDS = 1.0
+RECONNECT_MAX_BACKOFF_SECONDS = 60.0
+
+
+class TradeStream:
+    """
+    One upstream Finnhub trade WebSocket for the whole process.
+    Every trade message is handed to on_trades({symbol: (price, epoch_ms)}) with the latest trade
+    per symbol. Subscriptions follow set_symbols(), and the socket reconnects with backoff.
+    """
+
+    def __init__(self, token: str, on_trades, url: str = None):
+        self.token = token
+        self.on_trades = on_trades
+        self.url = url or FINNHUB_WS_URL
+        self._symbols = set()
+        self._subscribed = set()
+        self._ws = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="finnhub-trades", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._ws is not None:
+            self._ws.close()
+
+    def set_symbols(self, symbols):
+        with self._lock:
+            self._symbols = set(symbols)
+        self._sync_subscriptions()
+
+    def _sync_subscriptions(self):
+        with self._lock:
+            ws = self._ws
+            if ws is None or not ws.sock or not ws.sock.connected:
+                return
+            wanted = set(self._symbols)
+            messages = [{'type': 'subscribe', 'symbol': s} for s in sorted(wanted - self._subscribed)]
+            messages += [{'type': 'unsubscribe', 'symbol': s} for s in sorted(self._subscribed - wanted)]
+            self._subscribed = wanted
+        for message in messages:
+            ws.send(json.dumps(message))
+
+    def _run(self):
+        backoff = RECONNECT_INITIAL_BACKOFF_SECONDS
+        while not self._stopped.is_set():
+            separator = '&' if '?' in self.url else '?'
+            ws = websocket.WebSocketApp(f"{self.url}{separator}token={self.token}",
+                                        on_open=self._on_open, on_message=self._on_message, on_error=self._on_error)
+            with self._lock:
+                self._ws = ws
+                self._subscribed = set()
+            started = time.monotonic()
+            ws.run_forever(ping_interval=30, ping_timeout=10)
+            if self._stopped.is_set():
+                break
+            # A connection that stayed up for a while resets the backoff
+            if time.monotonic() - started > RECONNECT_MAX_BACKOFF_SECONDS:
+                backoff = RECONNECT_INITIAL_BACKOFF_SECONDS
+            else:
+                backoff = min(backoff * 2, RECONNECT_MAX_BACKOFF_SECONDS)
+            logger.warning("Trade stream disconnected, reconnecting in %.0fs", backoff)
+            self._stopped.wait(backoff)
+
+    def _on_open(self, ws):
+        if self._stopped.is_set():
+            # stop() came while this connection was being made
+            ws.close()
+            return
+        logger.info("Trade stream connected")
+        self._sync_subscriptions()
+
+    def _on_message(self, ws, message):
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            return
+        if payload.get('type') != 'trade':
+            return
+        latest = {}
+        for trade in payload.get('data') or []:
+            symbol, price, at = trade.get('s'), trade.get('p'), trade.get('t', 0)
+            if symbol is None or price is None:
+                continue
+            if symbol not in latest or at >= latest[symbol][1]:
+                latest[symbol] = (float(price), at)
+        if latest:
+            self.on_trades(latest)
+
+    def _on_error(self, ws, error):
+        logger.warning("Trade stream error: %s", error)
+
+
+class PortfolioBroadcaster:
+    """
+    Pushes the portfolio report to every connected client.
+    Trades update the shared quote cache through the manager; a single worker then recomputes the
+    report once per batch of trades and fans the same payload out to all subscribers, so the number
+    of clients never changes the number of upstream calls. With no subscribers the worker sleeps
+    and the trade stream is closed, until the next client subscribes.
+    """
+
+    def __init__(self, manager, token: str = None, url: str = None):
+        self.manager = manager
+        self.token = token
+        self.url = url
+        self.stream = None  # the TradeStream while there are subscribers and a token
+        self._subscribers = set()
+        self._subscribers_lock = threading.Lock()
+        self._has_subscribers = threading.Event()
+        self._dirty = threading.Event()
+        self._stopped = threading.Event()
+        self._latest = None  # (version, full report JSON)
+        self._delta_payloads = {}
+        self._worker = None
+
+    def start(self):
+        self._worker = threading.Thread(target=self._run, name="portfolio-broadcast", daemon=True)
+        self._worker.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._has_subscribers.set()
+        self._dirty.set()
+
+    def _start_stream(self):
+        if self.token:
+            self.stream = TradeStream(self.token, self.on_trades, self.url)
+            self.stream.set_symbols(self.manager.get_streamable_symbols())
+            self.stream.start()
+
+    def _stop_stream(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream = None
+
+    def on_trades(self, trades: dict):
+        for symbol, (price, at) in trades.items():
+            self.manager.apply_trade(symbol, price, at)
+        self._dirty.set()
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                if not self._has_subscribers.is_set():
+                    # Nobody listening: no recomputes and no upstream traffic until someone is
+                    self._stop_stream()
+                    self._has_subscribers.wait()
+                    if self._stopped.is_set():
+                        break
+                    self._start_stream()
+                    # First report right away rather than after the idle refresh
+                    self._dirty.set()
+                self._refresh()
+        finally:
+            self._stop_stream()
+
+    def _refresh(self):
+        """Wait for trades (or the idle refresh), then recompute and push the report once"""
+        if self._dirty.wait(LIVE_IDLE_REFRESH_SECONDS):
+            # Let the rest of this burst of trades land before recomputing
+            self._stopped.wait(LIVE_BATCH_SECONDS)
+        self._dirty.clear()
+        if self._stopped.is_set():
+            return
+        try:
+            report = self.manager.get_portfolio_info()
+        except Exception:
+            logger.exception("Could not recompute the live portfolio")
+            return
+        self._publish(report.get('version'), json.dumps(report))
+        if self.stream is not None:
+            # Follow buys and sells made since the last push
+            self.stream.set_symbols(self.manager.get_streamable_symbols())
+
+    def _publish(self, version, payload: str):
+        with self._subscribers_lock:
+            if self._latest is None or self._latest[0] != version:
+                self._delta_payloads = {}
+            self._latest = (version, payload)
+            subscribers = list(self._subscribers)
+        for mailbox in subscribers:
+            # Slow clients only ever get the newest report
+            try:
+                mailbox.get_nowait()
+            except queue.Empty:
+                pass
+            mailbox.put_nowait(self._latest)
+
+    def _delta_payload(self, since):
+        """The encoded delta from since to the current report, shared by clients on the same version"""
+        with self._subscribers_lock:
+            payload = self._delta_payloads.get(since)
+        if payload is None:
+            delta = self.manager.report_history.delta_since(since)
+            payload = (delta['version'], json.dumps(delta))
+            with self._subscribers_lock:
+                if self._latest is not None and self._latest[0] == payload[0]:
+                    self._delta_payloads[since] = payload
+        return payload
+
+    def subscribe(self) -> queue.Queue:
+        mailbox = queue.Queue(maxsize=1)
+        with self._subscribers_lock:
+            if self._latest is not None:
+                mailbox.put_nowait(self._latest)
+            self._subscribers.add(mailbox)
+            self._has_subscribers.set()
+        return mailbox
+
+    def unsubscribe(self, mailbox):
+        with self._subscribers_lock:
+            self._subscribers.discard(mailbox)
+            if not self._subscribers:
+                self._has_subscribers.clear()
+
+    def subscriber_count(self) -> int:
+        with self._subscribers_lock:
+            return len(self._subscribers)
+
+    def events(self, deltas: bool = False, since=None):
+        """
+        Server-sent events for one client: the full report on every push, or with deltas=True only
+        what changed since the version the client last saw (the full report first if since is unknown).
+        Each event id is the report version, so a reconnecting EventSource resumes from Last-Event-ID.
+        """
+        mailbox = self.subscribe()
+        try:
+            while not self._stopped.is_set():
+                try:
+                    version, payload = mailbox.get(timeout=LIVE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                if deltas:
+                    version, payload = self._delta_payload(since)
+                    since = version
+                yield f"id: {version}\ndata: {payload}\n\n"
+        finally:
+            self.unsubscribe(mailbox)
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster(manager) -> PortfolioBroadcaster:
+    """The process-wide broadcaster, started with the first client"""
+    global _broadcaster
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                _broadcaster = PortfolioBroadcaster(manager, token=os.getenv("FINNHUB_API_KEY")).start()
+    return _broadcaster
@@ -0,0 +1,264 @@
+import sys
+from collections.abc import Mapping
+from itertools import islice
+
+
+def intern_str(value):
+    """Share one copy of strings that repeat across lots (names, types, dates)"""
+    return sys.intern(value) if type(value) is str else value
+
+
+class Lot:
+    """
+    One open lot: the fields of a transactions.json lot dict in __slots__, with the strings that
+    repeat from lot to lot interned. It reads and writes like the dict it replaces (lot['quantity'],
+    lot.get(...), dict(lot), == against a dict), and to_dict() gives back the on-disk layout.
+    Hot loops can use attributes (lot.quantity) directly. Keys outside FIELDS are kept in _extra,
+    and fields a stored lot never had stay unset, so a round trip does not change the JSON.
+    """
+    FIELDS = ('transactionId', 'quantity', 'original_quantity', 'cost_basis', 'total_lot_cost_basis',
+              'date', 'position_type', 'action', 'company_name', 'security_type')
+    INTERNED = ('date', 'position_type', 'action', 'company_name', 'security_type')
+    __slots__ = FIELDS + ('_extra',)
+    _FIELD_SET = frozenset(FIELDS)
+
+    def __init__(self, **fields):
+        self._extra = None
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, lot):
+        return lot if isinstance(lot, cls) else cls(**lot)
+
+    def to_dict(self) -> dict:
+        lot = {}
+        for key in self.FIELDS:
+            try:
+                lot[key] = getattr(self, key)
+            except AttributeError:
+                pass
+        if self._extra:
+            lot.update(self._extra)
+        return lot
+
+    def __getitem__(self, key):
+        if key in self._FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._FIELD_SET:
+            setattr(self, key, intern_str(value) if key in self.INTERNED else value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def copy(self):
+        return Lot(**self.to_dict())
+
+    def __eq__(self, other):
+        if isinstance(other, Lot):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Lot({self.to_dict()!r})"
+
+
+class SymbolLots:
+    """
+    The open lots of one symbol in FIFO (insertion) order, indexed by transactionId.
+    Behaves like the plain list of lots it replaces for reading: iteration, len(), lots[0].
+    Long and short lots are also kept in their own FIFO queues so Sell / Buy to Cover
+    only visit the lots they deplete.
+    Running quantity and quantity * cost_basis sums per position type are kept up to date on every
+    change, so symbol-level P/L never has to walk the lots. Lot quantities must therefore only be
+    changed through reduce(); revision moves on every change.
+    """
+    __slots__ = ('_lots', '_by_type', '_sums', 'revision')
+
+    def __init__(self, lots=()):
+        self._lots = {}  # {transactionId: lot}, dicts keep insertion order
+        self._by_type = {'long': {}, 'short': {}}
+        self._sums = {'long': [0.0, 0.0], 'short': [0.0, 0.0]}  # {position_type: [quantity, quantity * cost_basis]}
+        self.revision = 0
+        for lot in lots:
+            self.append(lot)
+
+    def _count(self, lot: Lot, sign: int):
+        # Depleted lots are not part of the position
+        quantity = lot.quantity
+        if quantity > 0:
+            sums = self._sums.setdefault(lot.position_type, [0.0, 0.0])
+            sums[0] += sign * quantity
+            sums[1] += sign * quantity * lot.cost_basis
+
+    def _settle(self, position_type: str):
+        # Start from exact zeros once a side is empty so rounding residue cannot build up
+        if not self._by_type.get(position_type):
+            self._sums[position_type] = [0.0, 0.0]
+        self.revision += 1
+
+    def append(self, lot):
+        """
+        Add a lot (a Lot or a lot dict, which is converted), or replace the lot with the same
+        transactionId in place (keeping its FIFO position). Returns the stored Lot.
+        """
+        lot = Lot.from_dict(lot)
+        transaction_id = lot.transactionId
+        previous = self._lots.get(transaction_id)
+        if previous is not None:
+            self._count(previous, -1)
+            del self._by_type[previous.position_type][transaction_id]
+            self._settle(previous.position_type)
+        self._lots[transaction_id] = lot
+        self._by_type.setdefault(lot.position_type, {})[transaction_id] = lot
+        self._count(lot, 1)
+        self.revision += 1
+        return lot
+
+    def remove(self, transaction_id: str) -> Lot:
+        lot = self._lots.pop(transaction_id)
+        del self._by_type[lot.position_type][transaction_id]
+        self._count(lot, -1)
+        self._settle(lot.position_type)
+        return lot
+
+    def reduce(self, transaction_id: str, quantity: float) -> Lot:
+        """Take quantity off a lot, e.g. the part of it a Sell closed"""
+        lot = self._lots[transaction_id]
+        self._count(lot, -1)
+        lot.quantity -= quantity
+        self._count(lot, 1)
+        self.revision += 1
+        return lot
+
+    def totals(self, position_type: str):
+        """(quantity, quantity * cost_basis) summed over the open lots of one position type"""
+        quantity, cost = self._sums.get(position_type, (0.0, 0.0))
+        return quantity, cost
+
+    def get(self, transaction_id: str):
+        return self._lots.get(transaction_id)
+
+    def of_type(self, position_type: str):
+        """Lots of one position type ('long' or 'short'), oldest first"""
+        return self._by_type.get(position_type, {}).values()
+
+    def __contains__(self, transaction_id):
+        return transaction_id in self._lots
+
+    def __iter__(self):
+        return iter(self._lots.values())
+
+    def __len__(self):
+        return len(self._lots)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._lots.values())[index]
+        if index < 0:
+            index += len(self._lots)
+        if not 0 <= index < len(self._lots):
+            raise IndexError("lot index out of range")
+        return next(islice(self._lots.values(), index, None))
+
+    def __repr__(self):
+        return f"SymbolLots({list(self._lots.values())!r})"
+
+
+class LotStore(Mapping):
+    """
+    Open lots of the whole portfolio: {symbol: SymbolLots}, plus a transactionId -> symbol
+    index so any lot can be found or removed in O(1) without walking every position.
+    Read it like the old {symbol: [lots]} dict; change it only through add/remove so the
+    index stays consistent. Lots are stored as Lot objects; to_dict() gives back the
+    transactions.json layout with plain dicts.
+    """
+
+    def __init__(self):
+        self._symbols = {}  # {symbol: SymbolLots}
+        self._index = {}  # {transactionId: symbol}
+
+    @classmethod
+    def from_dict(cls, positions: dict):
+        store = cls()
+        for symbol, lots in (positions or {}).items():
+            for lot in lots:
+                store.add(symbol, lot)
+        return store
+
+    def to_dict(self) -> dict:
+        return {symbol: [lot.to_dict() for lot in lots] for symbol, lots in self._symbols.items()}
+
+    def add(self, symbol: str, lot) -> Lot:
+        """Add a Lot or lot dict (upserting by transactionId) and return the stored Lot"""
+        symbol = intern_str(symbol)
+        lot = self._symbols.setdefault(symbol, SymbolLots()).append(lot)
+        self._index[lot.transactionId] = symbol
+        return lot
+
+    def remove(self, transaction_id: str):
+        """Remove a lot by transactionId. Returns (symbol, lot), or None if there is no such lot."""
+        symbol = self._index.pop(transaction_id, None)
+        if symbol is None:
+            return None
+        lots = self._symbols[symbol]
+        lot = lots.remove(transaction_id)
+        if not lots:
+            del self._symbols[symbol]
+        return symbol, lot
+
+    def find(self, transaction_id: str):
+        """(symbol, lot) for a transactionId, or None"""
+        symbol = self._index.get(transaction_id)
+        if symbol is None:
+            return None
+        return symbol, self._symbols[symbol].get(transaction_id)
+
+    def lot_count(self) -> int:
+        return len(self._index)
+
+    def __getitem__(self, symbol):
+        return self._symbols[symbol]
+
+    def __iter__(self):
+        return iter(self._symbols)
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def __repr__(self):
+        return f"LotStore({self.to_dict()!r})"
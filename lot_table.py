@@ -0,0 +1,125 @@
+from itertools import repeat
+from operator import attrgetter
+
+import numpy as np
+
+from equity_engine import parse_days
+
+
+class LotTable:
+    """
+    Columnar snapshot of the open lots, for analytics: one entry per lot in parallel arrays,
+    grouped by symbol in LotStore order (symbol i owns rows offsets[i]:offsets[i + 1]).
+
+        symbol_code         index into symbols
+        quantity            remaining quantity (float)
+        cost_basis          price per share paid, or received for a short
+        is_long             position_type == 'long'
+        date                days since epoch, UNKNOWN_DAY when the lot has no date
+        integral_quantity   quantity was stored as an int (kept so symbol totals keep their type)
+
+    Per-lot figures are one vectorized pass; per-symbol figures are np.bincount reductions, which
+    add in row order and so give exactly the sums a loop over each symbol's lots gives.
+    Text fields stay on the Lot objects in self.lots. Build a new table whenever the ledger changes.
+    """
+
+    def __init__(self, positions):
+        self.symbols = list(positions)
+        self.lots = [lot for symbol in self.symbols for lot in positions[symbol]]
+        counts = np.array([len(positions[symbol]) for symbol in self.symbols], dtype=np.int64)
+        n = len(self.lots)
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.symbol_code = np.repeat(np.arange(len(self.symbols), dtype=np.int32), counts)
+        # Column by column with C-level map/attrgetter: much cheaper than a Python loop over the lots
+        quantity = list(map(attrgetter('quantity'), self.lots))
+        self.quantity = np.array(quantity, dtype=np.float64)
+        self.cost_basis = np.fromiter(map(attrgetter('cost_basis'), self.lots), dtype=np.float64, count=n)
+        self.is_long = np.array(list(map(attrgetter('position_type'), self.lots)), dtype=object) == 'long'
+        self.date = parse_days(list(map(attrgetter('date'), self.lots)))
+        self.integral_quantity = np.fromiter(map(isinstance, quantity, repeat(int)), dtype=bool, count=n)
+        self.sign = np.where(self.is_long, 1.0, -1.0)
+        self._symbol_memo = None  # (current price vector, previous close vector, metrics)
+
+    def __len__(self):
+        return len(self.lots)
+
+    def symbol_index(self, symbol):
+        return self.symbols.index(symbol)
+
+    def price_vector(self, prices: dict) -> np.ndarray:
+        """Per-symbol prices, NaN where a symbol has none"""
+        return np.array([np.nan if prices.get(symbol) is None else prices[symbol] for symbol in self.symbols], dtype=np.float64)
+
+    def _sum_by_symbol(self, weights) -> np.ndarray:
+        return np.bincount(self.symbol_code, weights=weights, minlength=len(self.symbols))
+
+    def lot_metrics(self, current_prices: dict, previous_closing_prices: dict) -> dict:
+        """
+        Per-lot 'price', 'unrealized_pnl', 'unrealized_gain_percent', 'day_gain' and
+        'day_gain_percent' arrays. price is NaN for a symbol without a current price, and the
+        gains are 0 wherever the prices they need are missing, as in the per-lot summary.
+        """
+        price = self.price_vector(current_prices)[self.symbol_code]
+        previous_close = self.price_vector(previous_closing_prices)[self.symbol_code]
+        quantity = self.quantity
+        has_price = ~np.isnan(price)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # (cost - price) * q is exactly -((price - cost) * q), so one expression covers both sides
+            unrealized = np.where(has_price, self.sign * (price - self.cost_basis) * quantity, 0.0)
+            cost_or_proceeds = quantity * self.cost_basis
+            unrealized_percent = np.where(has_price & (cost_or_proceeds != 0), unrealized / cost_or_proceeds * 100, 0.0)
+            has_day = has_price & ~np.isnan(previous_close) & (quantity != 0)
+            day_gain = np.where(has_day, self.sign * (price - previous_close) * quantity, 0.0)
+            previous_value = quantity * previous_close
+            day_percent = np.where(has_day & (previous_close != 0), day_gain / previous_value * 100, 0.0)
+        return {
+            'price': price,
+            'unrealized_pnl': unrealized,
+            'unrealized_gain_percent': unrealized_percent,
+            'day_gain': day_gain,
+            'day_gain_percent': day_percent,
+        }
+
+    def symbol_metrics(self, current_prices: dict, previous_closing_prices: dict) -> dict:
+        """
+        Per-symbol arrays: 'quantity' (short lots negative), 'integral' (every lot quantity was
+        an int), 'cost_basis', 'proceeds_basis', 'average_price', 'unrealized_pnl',
+        'unrealized_gain_percent', 'day_gain' and 'day_gain_percent'. Reused while prices are unchanged.
+        """
+        price = self.price_vector(current_prices)
+        previous_close = self.price_vector(previous_closing_prices)
+        if self._symbol_memo is not None:
+            memo_price, memo_previous, metrics = self._symbol_memo
+            if np.array_equal(memo_price, price, equal_nan=True) and np.array_equal(memo_previous, previous_close, equal_nan=True):
+                return metrics
+
+        lot_cost = self.quantity * self.cost_basis
+        quantity = self._sum_by_symbol(self.sign * self.quantity)
+        cost_basis = self._sum_by_symbol(np.where(self.is_long, lot_cost, 0.0))
+        proceeds_basis = self._sum_by_symbol(np.where(self.is_long, 0.0, lot_cost))
+        integral = self._sum_by_symbol(~self.integral_quantity) == 0
+        has_price = ~np.isnan(price)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            lot_price = price[self.symbol_code]
+            unrealized = np.where(has_price, self._sum_by_symbol(self.sign * (lot_price - self.cost_basis) * self.quantity), 0.0)
+            is_long, is_short = quantity > 0, quantity < 0
+            basis = np.where(is_long, cost_basis, proceeds_basis)
+            average_price = np.where(is_long | is_short, basis / np.abs(quantity), 0.0)
+            unrealized_percent = np.where(has_price & (is_long | is_short) & (basis != 0), unrealized / basis * 100, 0.0)
+            has_day = has_price & ~np.isnan(previous_close) & (quantity != 0)
+            day_gain = np.where(has_day, np.where(is_long, (price - previous_close) * quantity,
+                                                  (previous_close - price) * np.abs(quantity)), 0.0)
+            day_percent = np.where(has_day & (previous_close != 0), day_gain / (previous_close * np.abs(quantity)) * 100, 0.0)
+        metrics = {
+            'quantity': quantity,
+            'integral': integral,
+            'cost_basis': cost_basis,
+            'proceeds_basis': proceeds_basis,
+            'average_price': average_price,
+            'unrealized_pnl': unrealized,
+            'unrealized_gain_percent': unrealized_percent,
+            'day_gain': day_gain,
+            'day_gain_percent': day_percent,
+        }
+        self._symbol_memo = (price, previous_close, metrics)
+        return metrics
@@ -0,0 +1,37 @@
+import threading
+import bisect
+
+
+class LatencyHistogram:
+    """
+    Thread-safe fixed-bucket latency histogram (seconds).
+    Buckets are upper bounds; anything slower than the last bound lands in the overflow bucket.
+    """
+
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"<={b}s" for b in self.buckets] + [f">{self.buckets[-1]}s"]
+            return {
+                "count": self.count,
+                "avg": round(self.total / self.count, 4) if self.count else 0.0,
+                "max": round(self.max, 4),
+                "buckets": dict(zip(labels, self.counts)),
+            }
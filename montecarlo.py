@@ -0,0 +1,271 @@
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from covariance import shrunk_covariance
+
+logger = logging.getLogger(__name__)
+
+# Horizons simulated, in trading days: a day, a week, a month, a quarter, a year
+HORIZONS = (1, 5, 21, 63, 252)
+MAX_HORIZON_DAYS = 252
+CONFIDENCE_LEVELS = (0.95, 0.99)
+METHODS = ('bootstrap', 'normal')
+# Trading days of history the returns are drawn from
+LOOKBACK_DAYS = 756
+MAX_PATHS = 10_000_000
+# What /api/analytics/var runs by default and the most a request may ask for
+DEFAULT_REQUEST_PATHS = 20_000
+MAX_REQUEST_PATHS = 250_000
+# Paths generated at once; with the day counts of a bootstrap this bounds a worker's scratch
+# memory to about CHUNK_PATHS * history rows * 8 bytes, whatever the path count
+CHUNK_PATHS = 4096
+# Chunks per pool task. Fixed, so the paths and their summation order, and with them the
+# results, do not depend on the number of workers
+CHUNKS_PER_TASK = 16
+# Bootstrap steps up to which the drawn days are summed one by one; past it, counting the draws
+# of each historical day and one [paths x history] @ [history x symbols] product is faster
+BOOTSTRAP_GATHER_STEPS = 32
+# Bootstrap steps drawn at once; longer horizons add up blocks, so the drawn days never take more
+# than CHUNK_PATHS * BOOTSTRAP_BLOCK_STEPS * 8 bytes
+BOOTSTRAP_BLOCK_STEPS = 63
+SIMULATION_WORKERS = int(os.getenv("SIMULATION_WORKERS", os.cpu_count() or 1))
+# Every horizon's P/L, as a multiple of gross exposure, lands in this fixed histogram. The fine
+# bins (0.0175% of exposure) keep VaR/CVaR accurate; paths outside the range go to the two
+# overflow bins, whose sums are kept so CVaR stays exact there too
+HISTOGRAM_BINS = 40_000
+HISTOGRAM_RANGE = (-2.0, 5.0)
+# Bins of the terminal-value distribution returned for charts
+DISPLAY_BINS = 60
+
+
+class Distribution:
+    """
+    Bounded-memory summary of a stream of P/L values (as multiples of gross exposure): count and
+    sum per histogram bin plus the running moments and extremes. Merging two is exact for the
+    counts and adds the sums.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(HISTOGRAM_BINS + 2, dtype=np.int64)  # [below, bins..., above]
+        self.sums = np.zeros(HISTOGRAM_BINS + 2)
+        self.n = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.low = math.inf
+        self.high = -math.inf
+
+    def add(self, values: np.ndarray):
+        low, high = HISTOGRAM_RANGE
+        index = np.floor((values - low) * (HISTOGRAM_BINS / (high - low))).astype(np.int64) + 1
+        np.clip(index, 0, HISTOGRAM_BINS + 1, out=index)
+        self.counts += np.bincount(index, minlength=HISTOGRAM_BINS + 2)
+        self.sums += np.bincount(index, weights=values, minlength=HISTOGRAM_BINS + 2)
+        self.n += len(values)
+        self.total += float(values.sum())
+        self.total_squares += float(values @ values)
+        self.low = min(self.low, float(values.min()))
+        self.high = max(self.high, float(values.max()))
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.sums += other.sums
+        self.n += other.n
+        self.total += other.total
+        self.total_squares += other.total_squares
+        self.low = min(self.low, other.low)
+        self.high = max(self.high, other.high)
+        return self
+
+    def _edges(self) -> np.ndarray:
+        low, high = HISTOGRAM_RANGE
+        inner = np.linspace(low, high, HISTOGRAM_BINS + 1)
+        # The overflow bins reach to the extremes actually seen
+        return np.concatenate(([min(self.low, low)], inner, [max(self.high, high)]))
+
+    def quantile(self, q: float) -> float:
+        """Value below which a fraction q of the paths fall, interpolated inside its bin"""
+        target = q * self.n
+        cumulative = np.cumsum(self.counts)
+        b = int(np.searchsorted(cumulative, target, side='left'))
+        b = min(b, len(self.counts) - 1)
+        before = cumulative[b - 1] if b > 0 else 0
+        edges = self._edges()
+        fraction = (target - before) / self.counts[b] if self.counts[b] else 0.0
+        return float(edges[b] + fraction * (edges[b + 1] - edges[b]))
+
+    def tail_mean(self, q: float) -> float:
+        """Mean of the worst fraction q of the paths (the bin holding the cut-off taken pro rata)"""
+        target = q * self.n
+        cumulative = np.cumsum(self.counts)
+        b = int(np.searchsorted(cumulative, target, side='left'))
+        b = min(b, len(self.counts) - 1)
+        before = int(cumulative[b - 1]) if b > 0 else 0
+        partial = target - before
+        tail_sum = self.sums[:b].sum() + (self.sums[b] * partial / self.counts[b] if self.counts[b] else 0.0)
+        return float(tail_sum / target) if target > 0 else float(self.low)
+
+    def histogram(self, bins: int = DISPLAY_BINS):
+        """(edges, counts) between the 0.1th and 99.9th percentiles, from the fine bins"""
+        lo, hi = self.quantile(0.001), self.quantile(0.999)
+        if not hi > lo:
+            return [lo, hi], [int(self.n)]
+        edges = self._edges()
+        first = int(np.searchsorted(edges, lo, side='right')) - 1
+        last = int(np.searchsorted(edges, hi, side='left'))
+        starts = np.unique(np.linspace(first, last, bins + 1).astype(np.int64))
+        counts = np.add.reduceat(self.counts[:starts[-1]], starts[:-1]) if len(starts) > 1 else self.counts[first:last]
+        return edges[starts].tolist(), counts.tolist()
+
+
+def build_model(returns: np.ndarray, values: np.ndarray, method: str = 'bootstrap') -> dict:
+    """
+    What the workers need to generate paths for positions worth `values` (shorts negative)
+    from a [days x symbols] matrix of historical daily returns:
+        bootstrap  whole historical days resampled with replacement, which keeps the
+                   cross-asset correlation and the fat tails of the history
+        normal     correlated normal log returns with the history's mean and shrunk covariance
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}")
+    log_returns = np.log1p(returns)
+    model = {'method': method, 'values': np.asarray(values, dtype=np.float64)}
+    if method == 'bootstrap':
+        model['log_returns'] = np.ascontiguousarray(log_returns)
+    else:
+        estimate = shrunk_covariance(log_returns)
+        covariance = estimate['covariance']
+        try:
+            cholesky = np.linalg.cholesky(covariance)
+        except np.linalg.LinAlgError:
+            # Not quite positive definite (a symbol with no variance): use the PSD square root
+            eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+            cholesky = eigenvectors * np.sqrt(np.clip(eigenvalues, 0.0, None))
+        model.update(mean=estimate['mean'], cholesky=cholesky)
+    return model
+
+
+def _log_growth(rng, model: dict, n: int, steps: int) -> np.ndarray:
+    """[n x symbols] log growth over `steps` more days"""
+    if model['method'] == 'normal':
+        z = rng.standard_normal((n, len(model['values'])))
+        return steps * model['mean'] + np.sqrt(steps) * (z @ model['cholesky'].T)
+    log_returns = model['log_returns']
+    rows = len(log_returns)
+    growth = np.zeros((n, log_returns.shape[1]))
+    for first in range(0, steps, BOOTSTRAP_BLOCK_STEPS):
+        block = min(BOOTSTRAP_BLOCK_STEPS, steps - first)
+        days = rng.integers(rows, size=(n, block))
+        if block < BOOTSTRAP_GATHER_STEPS:
+            for step in range(block):
+                growth += log_returns[days[:, step]]
+        else:
+            # Long blocks: how often each historical day was drawn, then one matrix product
+            counts = np.bincount((days + (np.arange(n) * rows)[:, None]).ravel(), minlength=n * rows).reshape(n, rows)
+            growth += counts @ log_returns
+    return growth
+
+
+def _simulate_chunks(model: dict, horizons, seeds, sizes) -> list:
+    """One Distribution per horizon for the given chunks, each chunk from its own seed"""
+    values = model['values']
+    gross = np.abs(values).sum()
+    distributions = [Distribution() for _ in horizons]
+    for seed, n in zip(seeds, sizes):
+        rng = np.random.default_rng(seed)
+        log_growth = np.zeros((n, len(values)))
+        previous = 0
+        # Horizons are sorted: each one extends the paths of the last
+        for distribution, horizon in zip(distributions, horizons):
+            log_growth += _log_growth(rng, model, n, horizon - previous)
+            previous = horizon
+            distribution.add(np.expm1(log_growth) @ values / gross)
+    return distributions
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def worker_pool(workers: int = SIMULATION_WORKERS):
+    """
+    The process pool simulate() and the optimizer share, created (with the first call's number
+    of workers) by the first call and reused. Workers are forked, which shares the parent's
+    imports (spawn would re-run the web app's module-level setup in each one), so the pool is only
+    ever created from the main thread: a server creates it as it starts, since a fork taken while
+    another thread holds a lock leaves that lock held in the child. Called from any other thread
+    before that, it returns None and the caller runs in-process.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if threading.current_thread() is not threading.main_thread():
+                logger.warning("No worker pool was started; running in-process rather than forking from a request thread")
+                return None
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            # Start the workers now rather than on the first real task
+            _pool.submit(int).result()
+        return _pool
+
+
+def simulate(model: dict, paths: int, horizons=HORIZONS, confidence_levels=CONFIDENCE_LEVELS,
+             seed: int = None, workers: int = SIMULATION_WORKERS, chunk_paths: int = CHUNK_PATHS) -> dict:
+    """
+    Simulate `paths` paths of the positions in model over every horizon (trading days) and report
+    VaR, CVaR and the terminal-value distribution. Chunks are seeded from
+    SeedSequence(seed).spawn, so a seed reproduces the same result on any number of workers.
+    """
+    if not 0 < paths <= MAX_PATHS:
+        raise ValueError(f"paths must be between 1 and {MAX_PATHS}")
+    horizons = sorted({int(h) for h in horizons})
+    if not horizons or horizons[0] < 1:
+        raise ValueError("horizons must be positive numbers of days")
+    if horizons[-1] > MAX_HORIZON_DAYS:
+        raise ValueError(f"horizons can be at most {MAX_HORIZON_DAYS} trading days")
+    values = model['values']
+    value, gross = float(values.sum()), float(np.abs(values).sum())
+    seed_sequence = np.random.SeedSequence(seed)
+    result = {'method': model['method'], 'paths': paths, 'seed': seed_sequence.entropy, 'value': value,
+              'gross_exposure': gross, 'horizons': []}
+    if gross == 0:
+        return result
+
+    n_chunks = math.ceil(paths / chunk_paths)
+    sizes = [chunk_paths] * (n_chunks - 1) + [paths - chunk_paths * (n_chunks - 1)]
+    seeds = seed_sequence.spawn(n_chunks)
+    tasks = [(seeds[i:i + CHUNKS_PER_TASK], sizes[i:i + CHUNKS_PER_TASK]) for i in range(0, n_chunks, CHUNKS_PER_TASK)]
+    pool = worker_pool(workers) if workers > 1 and len(tasks) > 1 else None
+    if pool is None:
+        partials = [_simulate_chunks(model, horizons, task_seeds, task_sizes) for task_seeds, task_sizes in tasks]
+    else:
+        partials = list(pool.map(_simulate_chunks, [model] * len(tasks), [horizons] * len(tasks), *zip(*tasks)))
+    # Merged in task order, which keeps the float sums identical from run to run
+    distributions = partials[0]
+    for partial in partials[1:]:
+        for distribution, other in zip(distributions, partial):
+            distribution.merge(other)
+
+    for horizon, distribution in zip(horizons, distributions):
+        mean = distribution.total / distribution.n
+        variance = max(distribution.total_squares / distribution.n - mean * mean, 0.0)
+        edges, counts = distribution.histogram()
+        result['horizons'].append({
+            'days': horizon,
+            # Losses as positive amounts: the P/L the worst 1 - confidence of paths fall below
+            'var': {str(level): -distribution.quantile(1 - level) * gross for level in confidence_levels},
+            'cvar': {str(level): -distribution.tail_mean(1 - level) * gross for level in confidence_levels},
+            'expected_value': value + mean * gross,
+            'std': math.sqrt(variance) * gross,
+            'percentiles': {str(p): value + distribution.quantile(p / 100) * gross for p in (1, 5, 25, 50, 75, 95, 99)},
+            'worst': value + distribution.low * gross,
+            'best': value + distribution.high * gross,
+            'distribution': {'edges': [value + edge * gross for edge in edges], 'counts': counts},
+        })
+    return result
@@ -0,0 +1,317 @@
+import math
+import os
+
+import numpy as np
+
+from analytics import RISK_FREE_RATE
+from montecarlo import worker_pool
+
+# Points on an efficient frontier sweep by default, and the most a request may ask for
+FRONTIER_POINTS = 50
+MAX_REQUEST_POINTS = 200
+# Trailing window, in trading days, the covariance and mean returns are estimated over by
+# default; a request may ask for any of covariance.COVARIANCE_WINDOWS
+DEFAULT_WINDOW = 756
+# Contiguous frontier points solved one after the other by a pool task, each warm-started from
+# the last. Fixed, so the solutions do not depend on the number of workers
+FRONTIER_POINTS_PER_TASK = 10
+OPTIMIZER_WORKERS = int(os.getenv("OPTIMIZER_WORKERS", os.cpu_count() or 1))
+# Risk aversion sweep, as multiples of the scale at which the return and variance terms balance:
+# the low end is all but the min-variance portfolio, the high end all but the max-return one
+FRONTIER_AVERSION_RANGE = (1e-2, 1e2)
+# Largest change in any weight between iterations at which a solve has converged
+TOLERANCE = 1e-8
+MAX_ITERATIONS = 20_000
+# Golden-section steps refining the max-Sharpe portfolio between frontier points
+SHARPE_REFINE_STEPS = 24
+# Symbols, and security types, held as cash: zero variance, earning the risk-free rate
+CASH_SYMBOLS = ('USDT-USD',)
+CASH_SECURITY_TYPES = ('CASH',)
+# Trades smaller than this many dollars are left out of a rebalance
+MIN_TRADE_VALUE = 10.0
+
+
+def project_capped_simplex(v: np.ndarray, lower: np.ndarray, upper: np.ndarray, total: float = 1.0) -> np.ndarray:
+    """
+    Euclidean projection of v onto {w : sum w = total, lower <= w <= upper}: w = clip(v - theta)
+    for the theta where the sum is total. The sum is piecewise linear in theta with a kink where
+    each weight enters or leaves its bounds, so sorting the kinks finds theta exactly.
+    """
+    kinks = np.concatenate((v - upper, v - lower))
+    # Past v - upper a weight comes off its upper bound (slope -1), past v - lower it sits on its lower one
+    slope_change = np.concatenate((-np.ones(len(v)), np.ones(len(v))))
+    order = np.argsort(kinks, kind='stable')
+    kinks, slope = kinks[order], np.cumsum(slope_change[order])
+    sums = upper.sum() + np.concatenate(([0.0], np.cumsum(slope[:-1] * np.diff(kinks))))
+    k = int(np.searchsorted(-sums, -total, side='left'))  # first kink where the sum is <= total
+    if k == 0:
+        theta = kinks[0]
+    elif k == len(kinks):
+        theta = kinks[-1]
+    else:
+        theta = kinks[k - 1] + (sums[k - 1] - total) / -slope[k - 1] if slope[k - 1] else kinks[k]
+    return np.clip(v - theta, lower, upper)
+
+
+def solve(covariance: np.ndarray, mean: np.ndarray, aversion: float, lower: np.ndarray, upper: np.ndarray,
+          start: np.ndarray, step: float, tolerance: float = TOLERANCE, max_iterations: int = MAX_ITERATIONS):
+    """
+    min 1/2 w^T C w - aversion * mean^T w over the capped simplex by accelerated projected gradient
+    (FISTA), restarting the momentum whenever it points uphill. step is 1 / the largest eigenvalue
+    of C. A start near the answer, such as the neighbouring frontier point, converges in a few
+    dozen iterations. Returns (weights, iterations).
+    """
+    w = project_capped_simplex(start, lower, upper)
+    y, t = w, 1.0
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        w_next = project_capped_simplex(y - step * (covariance @ y - aversion * mean), lower, upper)
+        change = w_next - w
+        if np.abs(change).max() < tolerance:
+            return w_next, iteration
+        if (y - w_next) @ change > 0:
+            y, t = w_next, 1.0
+        else:
+            t_next = (1 + math.sqrt(1 + 4 * t * t)) / 2
+            y = w_next + ((t - 1) / t_next) * change
+            t = t_next
+        w = w_next
+    return w, iteration
+
+
+def _solve_segment(covariance, mean, aversions, lower, upper, starts, step) -> list:
+    """Solve frontier points in order, each starting from its own warm start or the previous answer"""
+    solutions = []
+    previous = None
+    for aversion, start in zip(aversions, starts):
+        w, iterations = solve(covariance, mean, aversion, lower, upper, start if start is not None else previous, step)
+        solutions.append((w, iterations))
+        previous = w
+    return solutions
+
+
+def risk_parity(covariance: np.ndarray, start: np.ndarray = None, tolerance: float = TOLERANCE,
+                max_sweeps: int = 1000) -> np.ndarray:
+    """
+    Long-only weights with equal risk contributions w_i (C w)_i, by cyclical coordinate descent on
+    min 1/2 y^T C y - sum log y_i (each coordinate has a closed form) and w = y / sum y. Assets with
+    no variance get no weight.
+    """
+    n = len(covariance)
+    variances = np.diag(covariance).copy()
+    risky = variances > 0
+    y = np.zeros(n)
+    if not risky.any():
+        return y
+    if start is not None and (start[risky] > 0).all():
+        # Scale a previous answer to the level the objective wants: y^T C y = number of assets
+        y[risky] = start[risky] * math.sqrt(risky.sum() / max(start @ covariance @ start, 1e-300))
+    else:
+        y[risky] = 1 / np.sqrt(variances[risky])
+    covariance_y = covariance @ y
+    indices = np.flatnonzero(risky)
+    for _ in range(max_sweeps):
+        largest_change = 0.0
+        for i in indices:
+            others = covariance_y[i] - variances[i] * y[i]
+            new = (-others + math.sqrt(others * others + 4 * variances[i])) / (2 * variances[i])
+            change = new - y[i]
+            if change:
+                covariance_y += covariance[i] * change
+                y[i] = new
+                largest_change = max(largest_change, abs(change) / new)
+        if largest_change < tolerance:
+            break
+    return y / y.sum()
+
+
+class PortfolioOptimizer:
+    """
+    Long-only allocations over a fixed set of assets from annualized expected returns and
+    covariance. Cash assets (zero variance, earning the risk-free rate) are pooled into one
+    'cash' weight kept between cash_floor and cash_ceiling; every other asset is capped at
+    max_weight. Weights are fractions of the portfolio's total value.
+    """
+
+    def __init__(self, symbols, mean: np.ndarray, covariance: np.ndarray, cash=(), cash_floor: float = 0.0,
+                 cash_ceiling: float = 1.0, max_weight: float = 1.0, risk_free_rate: float = RISK_FREE_RATE):
+        if not 0 <= cash_floor <= 1:
+            raise ValueError("cash_floor must be between 0 and 1")
+        if not 0 < max_weight <= 1:
+            raise ValueError("max_weight must be above 0 and at most 1")
+        cash = set(cash)
+        self.risky = [symbol for symbol in symbols if symbol not in cash]
+        risky_index = [list(symbols).index(symbol) for symbol in self.risky]
+        k = len(self.risky)
+        cash_ceiling = max(cash_ceiling, cash_floor)
+        if k * max_weight + cash_ceiling < 1:
+            raise ValueError(f"max_weight {max_weight} across {k} assets with at most {cash_ceiling:.0%} "
+                             f"in cash cannot invest the whole portfolio")
+        # The last asset is the pooled cash
+        self.mean = np.append(np.asarray(mean, dtype=np.float64)[risky_index], risk_free_rate)
+        self.covariance = np.zeros((k + 1, k + 1))
+        self.covariance[:k, :k] = np.asarray(covariance, dtype=np.float64)[np.ix_(risky_index, risky_index)]
+        self.lower = np.append(np.zeros(k), cash_floor)
+        self.upper = np.append(np.full(k, max_weight), cash_ceiling)
+        self.risk_free_rate = risk_free_rate
+        largest_eigenvalue = float(np.linalg.eigvalsh(self.covariance)[-1])
+        self.step = 1 / largest_eigenvalue if largest_eigenvalue > 0 else 1.0
+        spread = float(self.mean.max() - self.mean.min())
+        # Aversion at which moving between assets trades about as much return as it adds variance
+        self.aversion_scale = largest_eigenvalue / spread if spread > 0 else 1.0
+
+    def _start(self, start=None) -> np.ndarray:
+        if start is not None:
+            return np.asarray(start, dtype=np.float64)
+        return project_capped_simplex(np.full(len(self.mean), 1 / len(self.mean)), self.lower, self.upper)
+
+    def describe(self, w: np.ndarray, iterations: int = None) -> dict:
+        """Weights by symbol (cash pooled under 'cash') with expected return, volatility and Sharpe"""
+        expected_return = float(self.mean @ w)
+        volatility = math.sqrt(max(float(w @ self.covariance @ w), 0.0))
+        result = {
+            'weights': {symbol: round(float(weight), 8) for symbol, weight in zip(self.risky + ['cash'], w)},
+            'expected_return': expected_return,
+            'volatility': volatility,
+            'sharpe': (expected_return - self.risk_free_rate) / volatility if volatility > 0 else None,
+        }
+        if iterations is not None:
+            result['iterations'] = iterations
+        return result
+
+    def min_variance(self, start=None):
+        return solve(self.covariance, self.mean, 0.0, self.lower, self.upper, self._start(start), self.step)
+
+    def frontier(self, points: int = FRONTIER_POINTS, starts=None, workers: int = OPTIMIZER_WORKERS) -> list:
+        """
+        (aversion, weights, iterations) for points risk aversions from 0 (min variance) up to
+        FRONTIER_AVERSION_RANGE, geometrically spaced. Each point starts from starts[i] (the same
+        point of an earlier sweep) when given, otherwise from the point before it. Segments of
+        FRONTIER_POINTS_PER_TASK points run in parallel, each starting from the min-variance answer.
+        """
+        if points < 2:
+            raise ValueError("a frontier needs at least 2 points")
+        aversions = np.concatenate(([0.0], self.aversion_scale * np.geomspace(*FRONTIER_AVERSION_RANGE, points - 1)))
+        starts = list(starts) if starts is not None and len(starts) == points else [None] * points
+        minimum, iterations = self.min_variance(starts[0])
+        starts[0] = minimum
+        tasks = []
+        for first in range(1, points, FRONTIER_POINTS_PER_TASK):
+            segment = slice(first, first + FRONTIER_POINTS_PER_TASK)
+            segment_starts = starts[segment]
+            if segment_starts[0] is None:
+                segment_starts[0] = minimum
+            tasks.append((aversions[segment], segment_starts))
+        args = (self.covariance, self.mean)
+        bounds = (self.lower, self.upper)
+        pool = worker_pool(workers) if workers > 1 and len(tasks) > 1 else None
+        if pool is None:
+            segments = [_solve_segment(*args, task_aversions, *bounds, task_starts, self.step)
+                        for task_aversions, task_starts in tasks]
+        else:
+            n = len(tasks)
+            segments = list(pool.map(_solve_segment, [self.covariance] * n, [self.mean] * n,
+                                     [aversions for aversions, _ in tasks], [self.lower] * n, [self.upper] * n,
+                                     [task_starts for _, task_starts in tasks], [self.step] * n))
+        solutions = [(minimum, iterations)] + [solution for segment in segments for solution in segment]
+        return [(float(aversion), w, iterations) for aversion, (w, iterations) in zip(aversions, solutions)]
+
+    def _sharpe(self, w) -> float:
+        volatility = math.sqrt(max(float(w @ self.covariance @ w), 0.0))
+        return (float(self.mean @ w) - self.risk_free_rate) / volatility if volatility > 0 else -math.inf
+
+    def max_sharpe(self, frontier: list):
+        """
+        The frontier point with the best Sharpe ratio, refined by a golden-section search over the
+        log risk aversion between its neighbours, each solve warm-started from the last.
+        Returns (weights, iterations).
+        """
+        sharpes = [self._sharpe(w) for _, w, _ in frontier]
+        best = int(np.argmax(sharpes))
+        low = frontier[max(best - 1, 1)][0] if best > 1 else frontier[1][0] * FRONTIER_AVERSION_RANGE[0]
+        high = frontier[min(best + 1, len(frontier) - 1)][0]
+        best_w, best_sharpe, iterations = frontier[best][1], sharpes[best], 0
+        a, b = math.log(low), math.log(high)
+        ratio = (math.sqrt(5) - 1) / 2
+        w = best_w
+        cache = {}
+
+        def evaluate(x):
+            nonlocal w, iterations
+            if x not in cache:
+                w, n = solve(self.covariance, self.mean, math.exp(x), self.lower, self.upper, w, self.step)
+                iterations += n
+                cache[x] = (self._sharpe(w), w)
+            return cache[x]
+
+        c, d = b - ratio * (b - a), a + ratio * (b - a)
+        for _ in range(SHARPE_REFINE_STEPS):
+            if evaluate(c)[0] >= evaluate(d)[0]:
+                b, d = d, c
+                c = b - ratio * (b - a)
+            else:
+                a, c = c, d
+                d = a + ratio * (b - a)
+        for sharpe, candidate in cache.values():
+            if sharpe > best_sharpe:
+                best_sharpe, best_w = sharpe, candidate
+        return best_w, iterations
+
+    def risk_parity(self, start=None) -> np.ndarray:
+        """
+        Equal risk contributions across the risky assets, with cash held at its floor. max_weight
+        does not apply: capping a weight would break the equal contributions.
+        """
+        k = len(self.risky)
+        cash = self.lower[-1]
+        w = np.zeros(k + 1)
+        w[:k] = risk_parity(self.covariance[:k, :k], None if start is None else np.asarray(start)[:k]) * (1 - cash)
+        if not w[:k].any():
+            cash = 1.0
+        w[-1] = cash
+        return w
+
+
+def rebalance_trades(portfolio, symbols, prices: dict, target_values: dict, min_trade_value: float = MIN_TRADE_VALUE) -> list:
+    """
+    Trades taking each symbol from its current lots to a target market value (negative for a short),
+    in the shape /api/transactions/batch accepts: 'symbol', 'action', 'quantity', 'cost_basis' (the
+    price the trade is priced at) and, to open a position, 'company_name' and 'type'. Sells and
+    covers also list the lots they would close first in first, out order with each one's
+    realized P/L. Sells and covers come before buys and shorts, so they fund them.
+    """
+    closing, opening = [], []
+    for symbol in symbols:
+        price = prices[symbol]
+        target = float(target_values.get(symbol, 0.0)) / price
+        lots = portfolio.positions[symbol] if symbol in portfolio.positions else None
+        held = {'long': 0.0, 'short': 0.0}
+        if lots is not None:
+            held = {side: float(lots.totals(side)[0]) for side in held}
+        wanted = {'long': max(target, 0.0), 'short': max(-target, 0.0)}
+        for side, close_action, open_action in (('long', 'sell', 'buy'), ('short', 'cover', 'short')):
+            quantity = round(abs(wanted[side] - held[side]), 6)
+            if quantity * price < min_trade_value:
+                continue
+            trade = {'symbol': symbol, 'quantity': quantity, 'cost_basis': price, 'value': quantity * price}
+            if wanted[side] < held[side]:
+                trade['action'] = close_action
+                trade['lots'], remaining = [], quantity
+                # FIFO, as Portfolio.sell and buy_to_cover close them
+                for lot in lots.of_type(side):
+                    if remaining <= 1e-9:
+                        break
+                    closed = min(remaining, lot['quantity'])
+                    pnl = (price - lot['cost_basis']) * closed if side == 'long' else (lot['cost_basis'] - price) * closed
+                    trade['lots'].append({'transactionId': lot['transactionId'], 'date': lot['date'],
+                                          'quantity': closed, 'cost_basis': lot['cost_basis'], 'realized_pnl': pnl})
+                    remaining -= closed
+                trade['realized_pnl'] = sum(lot['realized_pnl'] for lot in trade['lots'])
+                closing.append(trade)
+            else:
+                trade['action'] = open_action
+                if lots is not None:
+                    trade['company_name'] = lots[0].get('company_name', 'N/A')
+                    trade['type'] = portfolio.get_security_type(symbol)
+                opening.append(trade)
+    return closing + opening
@@ -1,6 +1,10 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import uuid # For unique transaction IDs
+from operator import attrgetter
+from lot_store import LotStore, intern_str
+from lot_table import LotTable
 
 class Portfolio:
     """
@@ -12,8 +16,9 @@ class Portfolio:
     def __init__(self, positions: dict = {}, current_prices: dict = {}, previous_closing_prices: dict = {}):
         """
         Initializes an empty portfolio.
-        self.positions: Stores active holdings {symbol: [lot1, lot2, ...]}
-                       Each lot: {
+        self.positions: Stores active holdings {symbol: [lot1, lot2, ...]} as a LotStore, which is
+                        also indexed by transactionId. Mutate it only through add/remove.
+                       Each lot is a compact Lot that reads like the dict it is stored as: {
                            'transactionId': unique_id,
                            'quantity': remaining_quantity,
                            'original_quantity': original_quantity,
@@ -31,46 +36,180 @@ class Portfolio:
         self.previous_closing_prices: Stores the previous day's closing prices for day gain calculation.
                                      {symbol: price}
         self.transaction_history: A list of all recorded transactions.
-        """
-        self.positions = positions # {symbol: [list of lots]}
+        self.closed_lots: Every portion of a lot closed by a Sell or Buy to Cover, so holdings can be
+                          reconstructed for any past date.
+                          Each entry: {'transactionId', 'symbol', 'quantity', 'open_date', 'close_date',
+                                       'position_type', 'security_type'}
+        self.version: Incremented on every change to positions, so derived data can be cached against it.
+        self._changes: When enabled, the lot-level changes ('put', 'del', 'close' records) and trades
+                       ('txn' records) made since the last drain_changes(), so they can be persisted.
+        self._symbol_metrics: {symbol: (key, report fields, totals contribution)} computed in O(1) from
+                              the running sums each SymbolLots keeps. key is (lots, revision, price,
+                              previous close), so an entry is recomputed only when one of them changes.
+        self._totals: Portfolio-wide sums of every symbol's contribution (see _TOTAL_FIELDS). A price
+                      change moves them by that symbol's old and new contribution instead of a re-sum.
+                      Rebuilt from the per-symbol entries whenever the ledger version changes.
+        self._lot_details: {symbol: (key, [lot report rows])}, only built when lots are asked for.
+        self._lot_table: Columnar LotTable of the open lots for the summaries, rebuilt when version changes.
+        self.verbose: Print a line for every trade and price update. Bulk imports turn it off.
+        self.last_message: The last such line, printed or not, so a caller can report why a trade was refused.
+        """
+        self.positions = LotStore.from_dict(positions) # {symbol: SymbolLots}
         self.realized_pnl = 0.0
         self.current_prices = current_prices
         self.previous_closing_prices = previous_closing_prices
         self.transaction_history = []
+        self.closed_lots = []
+        self.version = 0
+        self._changes = None
+        self._symbol_metrics = {}
+        self._totals = None
+        self._totals_version = None
+        self._lot_details = {}
+        self._lot_table = None
+        self.verbose = True
+        self.last_message = None
+
+    def _log(self, message):
+        self.last_message = message
+        if self.verbose:
+            print(message)
     
     def set_realtime_prices(self, current_prices, previous_closing_prices):
         self.current_prices = current_prices
         self.previous_closing_prices = previous_closing_prices
+        if self._totals is not None:
+            # Only symbols whose prices moved are recomputed, each in O(1)
+            for symbol in self.positions:
+                self._refresh_symbol(symbol)
+
+    def update_quote(self, symbol, price, previous_closing_price=None):
+        """Apply one price tick. Symbol and portfolio totals are adjusted in O(1), whatever the number of lots."""
+        self.current_prices[symbol] = price
+        if previous_closing_price is not None:
+            self.previous_closing_prices[symbol] = previous_closing_price
+        if self._totals is not None and symbol in self.positions:
+            self._refresh_symbol(symbol)
         
     def get_positions(self):
         return self.positions
     
     def set_positions(self, positions):
-        self.positions = positions
+        self.positions = positions if isinstance(positions, LotStore) else LotStore.from_dict(positions)
+        self._discard_changes()
+        self.version += 1
+
+    def enable_change_log(self):
+        """Start recording lot changes for drain_changes()"""
+        self._changes = []
+
+    def drain_changes(self):
+        """Returns and clears the lot changes recorded since the last call"""
+        if self._changes is None:
+            return []
+        changes, self._changes = self._changes, []
+        return changes
+
+    def _discard_changes(self):
+        # Replacing the ledger wholesale makes earlier changes meaningless
+        if self._changes is not None:
+            self._changes = []
+
+    def _log_change(self, record):
+        if self._changes is not None:
+            self._changes.append(record)
+
+    def get_lot(self, transaction_id):
+        """Returns (symbol, lot) for an open lot, or None."""
+        return self.positions.find(transaction_id)
+
+    def remove_lot(self, transaction_id):
+        """Deletes an open lot without recording a trade, e.g. to undo a mistyped entry. Returns (symbol, lot) or None."""
+        removed = self.positions.remove(transaction_id)
+        if removed is not None:
+            self._log_change({'op': 'del', 'id': transaction_id})
+            self.version += 1
+        return removed
+
+    def get_closed_lots(self):
+        return self.closed_lots
+
+    def set_closed_lots(self, closed_lots):
+        self.closed_lots = closed_lots
+        self._discard_changes()
+        self.version += 1
+
+    def get_quantity_events(self):
+        """
+        Returns {symbol: [(date, signed_quantity_change), ...]} describing holdings over time.
+        Each open lot adds its remaining quantity on its date. Each closed portion adds its quantity
+        on the lot's date and removes it on the close date. Short lots count as negative quantity.
+        A date of None means the lot has been held since before any price history.
+        """
+        events = {}
+        for symbol, lots in self.positions.items():
+            for lot in lots:
+                sign = 1 if lot['position_type'] == 'long' else -1
+                events.setdefault(symbol, []).append((lot['date'], sign * lot['quantity']))
+        for closed in self.closed_lots:
+            sign = 1 if closed['position_type'] == 'long' else -1
+            symbol_events = events.setdefault(closed['symbol'], [])
+            symbol_events.append((closed['open_date'], sign * closed['quantity']))
+            symbol_events.append((closed['close_date'], -sign * closed['quantity']))
+        return events
+
+    def get_security_type(self, symbol):
+        """Security type of a held or previously held symbol, 'N/A' if unknown."""
+        if symbol in self.positions and self.positions[symbol]:
+            return self.positions[symbol][0].get('security_type', 'N/A')
+        for closed in reversed(self.closed_lots):
+            if closed['symbol'] == symbol:
+                return closed.get('security_type', 'N/A')
+        return 'N/A'
+
+    def _record_closed_lot(self, symbol, lot, quantity, date):
+        closed = {
+            'closeId': str(uuid.uuid4()),
+            'transactionId': lot['transactionId'],
+            'symbol': symbol,
+            'quantity': quantity,
+            'open_date': lot['date'],
+            # A close without a date is being entered now
+            'close_date': intern_str(date if date else datetime.now().strftime("%Y-%m-%d")),
+            'position_type': lot['position_type'],
+            'security_type': lot['security_type']
+        }
+        self.closed_lots.append(closed)
+        self._log_change({'op': 'close', 'lot': closed})
     
     def get_positions_and_quantities(self):
-        positions = self.get_positions()
-        positions_and_quantities = {}
-        for sym in positions.keys():
-            quantity = 0
-            for txn in positions[sym]:
-                quantity += txn['quantity']
-            positions_and_quantities[sym] = float(quantity)
-        return positions_and_quantities
+        return {symbol: float(self.get_gross_quantity(symbol)) for symbol in self.positions}
+
+    def get_gross_quantity(self, symbol):
+        """Shares held across long and short lots, both counted as positive"""
+        lots = self.positions[symbol]
+        return lots.totals('long')[0] + lots.totals('short')[0]
+
+    def get_net_quantity(self, symbol):
+        """Long shares minus shorted shares"""
+        lots = self.positions[symbol]
+        return lots.totals('long')[0] - lots.totals('short')[0]
     
     def _record_transaction(self, symbol, action, quantity, price, date, company_name=None, transaction_id=None):
         """
         Internal helper to record any transaction for historical tracking.
         """
-        self.transaction_history.append({
+        transaction = {
             'transaction_id': transaction_id if transaction_id else str(uuid.uuid4()),
-            'date': date,
-            'symbol': symbol,
+            'date': intern_str(date),
+            'symbol': intern_str(symbol),
             'action': action,
             'quantity': quantity,
             'price': price,
-            'company_name': company_name if company_name else self._get_company_name_for_symbol(symbol)
-        })
+            'company_name': intern_str(company_name if company_name else self._get_company_name_for_symbol(symbol))
+        }
+        self.transaction_history.append(transaction)
+        self._log_change({'op': 'txn', 'transaction': transaction})
 
     def _get_company_name_for_symbol(self, symbol):
         """Helper to get company name from existing lots if available."""
@@ -84,16 +223,13 @@ class Portfolio:
         Records a 'Buy' transaction. Adds a new 'long' lot to the position.
         """
         if quantity <= 0 or price <= 0:
-            print(f"Error: Quantity and price must be positive for Buy. Symbol: {symbol}")
+            self._log(f"Error: Quantity and price must be positive for Buy. Symbol: {symbol}")
             return
 
         transaction_id = str(uuid.uuid4())
         self._record_transaction(symbol, 'Buy', quantity, price, date, company_name, transaction_id)
 
-        if symbol not in self.positions:
-            self.positions[symbol] = []
-
-        self.positions[symbol].append({
+        lot = {
             'transactionId': transaction_id,
             'quantity': quantity,
             'original_quantity': quantity,
@@ -104,10 +240,13 @@ class Portfolio:
             'action': 'Buy', # The action that created this lot
             'company_name': company_name,
             'security_type': security_type
-        })
+        }
+        self.positions.add(symbol, lot)
+        self._log_change({'op': 'put', 'symbol': symbol, 'lot': lot})
+        self.version += 1
         # Sort lots by date for FIFO
         # self.positions[symbol].sort(key=lambda x: datetime.strptime(x['date'], "%Y-%m-%d"))
-        print(f"Bought {quantity} shares of {symbol} at ${price:.2f} on {date}.")
+        self._log(f"Bought {quantity} shares of {symbol} at ${price:.2f} on {date}.")
 
     def sell(self, symbol, quantity, price, date):
         """
@@ -115,20 +254,20 @@ class Portfolio:
         Calculates realized P/L for each portion sold.
         """
         if symbol not in self.positions or not self.positions[symbol]:
-            print(f"Error: Cannot sell {symbol}. No existing position.")
+            self._log(f"Error: Cannot sell {symbol}. No existing position.")
             return
 
-        long_lots = [lot for lot in self.positions[symbol] if lot['position_type'] == 'long']
+        long_lots = self.positions[symbol].of_type('long')
         if not long_lots:
-            print(f"Error: Cannot sell {symbol}. You do not hold a long position.")
+            self._log(f"Error: Cannot sell {symbol}. You do not hold a long position.")
             return
 
         total_held_quantity = sum(lot['quantity'] for lot in long_lots)
         if quantity <= 0:
-            print(f"Error: Quantity must be positive for Sell. Symbol: {symbol}")
+            self._log(f"Error: Quantity must be positive for Sell. Symbol: {symbol}")
             return
         if quantity > total_held_quantity:
-            print(f"Warning: Selling more shares ({quantity}) than held ({total_held_quantity}) for {symbol}. Selling available shares.")
+            self._log(f"Warning: Selling more shares ({quantity}) than held ({total_held_quantity}) for {symbol}. Selling available shares.")
             quantity = total_held_quantity
 
         remaining_to_sell = quantity
@@ -147,43 +286,43 @@ class Portfolio:
             realized_pnl_for_transaction += pnl_from_lot
             self.realized_pnl += pnl_from_lot
 
-            lot['quantity'] -= shares_from_lot
+            self.positions[symbol].reduce(lot['transactionId'], shares_from_lot)
             remaining_to_sell -= shares_from_lot
+            self._record_closed_lot(symbol, lot, shares_from_lot, date)
 
             if lot['quantity'] <= 1e-9: # If lot is fully depleted
-                lots_to_remove.append(lot)
+                lots_to_remove.append(lot['transactionId'])
+            else:
+                self._log_change({'op': 'put', 'symbol': symbol, 'lot': lot.to_dict()})
 
-        # Remove depleted lots and update the position list
-        self.positions[symbol] = [lot for lot in self.positions[symbol] if lot not in lots_to_remove]
-        # Re-sort remaining lots (should already be sorted, but good practice)
-        # self.positions[symbol].sort(key=lambda x: datetime.strptime(x['date'], "%Y-%m-%d"))
+        # Remove depleted lots, O(1) each by transactionId
+        for transaction_id in lots_to_remove:
+            self.positions.remove(transaction_id)
+            self._log_change({'op': 'del', 'id': transaction_id})
 
-        # Clean up symbol if no lots remain
-        if not self.positions[symbol]:
-            del self.positions[symbol]
+        # Clean up prices if no lots remain (the store drops the empty symbol itself)
+        if symbol not in self.positions:
             if symbol in self.current_prices:
                 del self.current_prices[symbol]
             if symbol in self.previous_closing_prices:
                 del self.previous_closing_prices[symbol]
 
         self._record_transaction(symbol, 'Sell', quantity, price, date)
-        print(f"Sold {quantity} shares of {symbol} at ${price:.2f} on {date}. Realized P/L for this sale: ${realized_pnl_for_transaction:.2f}")
+        self.version += 1
+        self._log(f"Sold {quantity} shares of {symbol} at ${price:.2f} on {date}. Realized P/L for this sale: ${realized_pnl_for_transaction:.2f}")
 
     def short_sell(self, symbol, quantity, price, date, company_name='N/A', security_type='Common Stock'):
         """
         Records a 'Sell Short' transaction. Adds a new 'short' lot to the position.
         """
         if quantity <= 0 or price <= 0:
-            print(f"Error: Quantity and price must be positive for Sell Short. Symbol: {symbol}")
+            self._log(f"Error: Quantity and price must be positive for Sell Short. Symbol: {symbol}")
             return
 
         transaction_id = str(uuid.uuid4())
         self._record_transaction(symbol, 'Sell Short', quantity, price, date, company_name, transaction_id)
 
-        if symbol not in self.positions:
-            self.positions[symbol] = []
-
-        self.positions[symbol].append({
+        lot = {
             'transactionId': transaction_id,
             'quantity': quantity, # Stored as positive quantity for short lot, but conceptually negative position
             'original_quantity': quantity,
@@ -194,10 +333,13 @@ class Portfolio:
             'action': 'Sell Short', # The action that created this lot
             'company_name': company_name,
             'security_type': security_type
-        })
+        }
+        self.positions.add(symbol, lot)
+        self._log_change({'op': 'put', 'symbol': symbol, 'lot': lot})
+        self.version += 1
         # Sort short lots by date for FIFO covering
         # self.positions[symbol].sort(key=lambda x: datetime.strptime(x['date'], "%Y-%m-%d"))
-        print(f"Shorted {quantity} shares of {symbol} at ${price:.2f} on {date}.")
+        self._log(f"Shorted {quantity} shares of {symbol} at ${price:.2f} on {date}.")
 
 
     def buy_to_cover(self, symbol, quantity, price, date):
@@ -206,20 +348,20 @@ class Portfolio:
         Calculates realized P/L for each portion covered.
         """
         if symbol not in self.positions or not self.positions[symbol]:
-            print(f"Error: Cannot buy to cover {symbol}. No existing short position.")
+            self._log(f"Error: Cannot buy to cover {symbol}. No existing short position.")
             return
 
-        short_lots = [lot for lot in self.positions[symbol] if lot['position_type'] == 'short']
+        short_lots = self.positions[symbol].of_type('short')
         if not short_lots:
-            print(f"Error: Cannot buy to cover {symbol}. You do not hold a short position.")
+            self._log(f"Error: Cannot buy to cover {symbol}. You do not hold a short position.")
             return
 
         total_shorted_quantity = sum(lot['quantity'] for lot in short_lots)
         if quantity <= 0:
-            print(f"Error: Quantity must be positive for Buy to Cover. Symbol: {symbol}")
+            self._log(f"Error: Quantity must be positive for Buy to Cover. Symbol: {symbol}")
             return
         if quantity > total_shorted_quantity:
-            print(f"Warning: Buying to cover more shares ({quantity}) than shorted ({total_shorted_quantity}) for {symbol}. Covering available shares.")
+            self._log(f"Warning: Buying to cover more shares ({quantity}) than shorted ({total_shorted_quantity}) for {symbol}. Covering available shares.")
             quantity = total_shorted_quantity
 
         remaining_to_cover = quantity
@@ -238,27 +380,30 @@ class Portfolio:
             realized_pnl_for_transaction += pnl_from_lot
             self.realized_pnl += pnl_from_lot
 
-            lot['quantity'] -= shares_from_lot
+            self.positions[symbol].reduce(lot['transactionId'], shares_from_lot)
             remaining_to_cover -= shares_from_lot
+            self._record_closed_lot(symbol, lot, shares_from_lot, date)
 
             if lot['quantity'] <= 1e-9: # If lot is fully depleted
-                lots_to_remove.append(lot)
+                lots_to_remove.append(lot['transactionId'])
+            else:
+                self._log_change({'op': 'put', 'symbol': symbol, 'lot': lot.to_dict()})
 
-        # Remove depleted lots and update the position list
-        self.positions[symbol] = [lot for lot in self.positions[symbol] if lot not in lots_to_remove]
-        # Re-sort remaining lots (should already be sorted, but good practice)
-        # self.positions[symbol].sort(key=lambda x: datetime.strptime(x['date'], "%Y-%m-%d"))
+        # Remove depleted lots, O(1) each by transactionId
+        for transaction_id in lots_to_remove:
+            self.positions.remove(transaction_id)
+            self._log_change({'op': 'del', 'id': transaction_id})
 
-        # Clean up symbol if no lots remain
-        if not self.positions[symbol]:
-            del self.positions[symbol]
+        # Clean up prices if no lots remain (the store drops the empty symbol itself)
+        if symbol not in self.positions:
             if symbol in self.current_prices:
                 del self.current_prices[symbol]
             if symbol in self.previous_closing_prices:
                 del self.previous_closing_prices[symbol]
 
         self._record_transaction(symbol, 'Buy to Cover', quantity, price, date)
-        print(f"Bought to cover {quantity} shares of {symbol} at ${price:.2f} on {date}. Realized P/L for this cover: ${realized_pnl_for_transaction:.2f}")
+        self.version += 1
+        self._log(f"Bought to cover {quantity} shares of {symbol} at ${price:.2f} on {date}. Realized P/L for this cover: ${realized_pnl_for_transaction:.2f}")
 
 
     def update_current_price(self, symbol, price):
@@ -267,10 +412,10 @@ class Portfolio:
         This is crucial for calculating unrealized P/L.
         """
         if price <= 0:
-            print(f"Error: Current price must be positive for {symbol}.")
+            self._log(f"Error: Current price must be positive for {symbol}.")
             return
-        self.current_prices[symbol] = price
-        print(f"Updated current price for {symbol} to ${price:.2f}.")
+        self.update_quote(symbol, price)
+        self._log(f"Updated current price for {symbol} to ${price:.2f}.")
 
     def update_previous_closing_price(self, symbol, price):
         """
@@ -278,10 +423,33 @@ class Portfolio:
         This is crucial for calculating day gain.
         """
         if price <= 0:
-            print(f"Error: Previous closing price must be positive for {symbol}.")
+            self._log(f"Error: Previous closing price must be positive for {symbol}.")
             return
         self.previous_closing_prices[symbol] = price
-        print(f"Updated previous closing price for {symbol} to ${price:.2f}.")
+        if self._totals is not None and symbol in self.positions:
+            self._refresh_symbol(symbol)
+        self._log(f"Updated previous closing price for {symbol} to ${price:.2f}.")
+
+    def get_lot_table(self):
+        """The open lots as a LotTable, built once per ledger version"""
+        if self._lot_table is None or self._lot_table[0] != self.version:
+            self._lot_table = (self.version, LotTable(self.positions))
+        return self._lot_table[1]
+
+    def _position_details_at(self, table, metrics, i):
+        symbol = table.symbols[i]
+        quantity = metrics['quantity'][i]
+        return {
+            'symbol': symbol,
+            'company_name': self._get_company_name_for_symbol(symbol),
+            'quantity': int(quantity) if metrics['integral'][i] else float(quantity),
+            'average_price_per_share': float(metrics['average_price'][i]),
+            'current_price': self.current_prices.get(symbol),
+            'unrealized_pnl': float(metrics['unrealized_pnl'][i]),
+            'unrealized_gain_percent': float(metrics['unrealized_gain_percent'][i]),
+            'day_gain': float(metrics['day_gain'][i]),
+            'day_gain_percent': float(metrics['day_gain_percent'][i])
+        }
 
     def get_position_details(self, symbol):
         """
@@ -292,63 +460,9 @@ class Portfolio:
         if symbol not in self.positions:
             return None
 
-        lots = self.positions[symbol]
-        total_quantity = sum(lot['quantity'] if lot['position_type'] == 'long' else -lot['quantity'] for lot in lots)
-        total_cost_basis = sum(lot['quantity'] * lot['cost_basis'] for lot in lots if lot['position_type'] == 'long')
-        total_proceeds_basis = sum(lot['quantity'] * lot['cost_basis'] for lot in lots if lot['position_type'] == 'short')
-
-        avg_price_per_share = 0.0
-        if total_quantity > 0: # Long position
-            avg_price_per_share = total_cost_basis / total_quantity if total_quantity != 0 else 0.0
-        elif total_quantity < 0: # Short position
-            avg_price_per_share = total_proceeds_basis / abs(total_quantity) if total_quantity != 0 else 0.0
-
-        unrealized_pnl = 0.0
-        unrealized_gain_percent = 0.0
-        day_gain = 0.0
-        day_gain_percent = 0.0
-
-        current_price = self.current_prices.get(symbol)
-        previous_closing_price = self.previous_closing_prices.get(symbol)
-
-        if current_price is not None:
-            for lot in lots:
-                if lot['position_type'] == 'long':
-                    unrealized_pnl += (current_price - lot['cost_basis']) * lot['quantity']
-                else: # short
-                    unrealized_pnl += (lot['cost_basis'] - current_price) * lot['quantity']
-
-            # Calculate overall unrealized gain percentage for the symbol
-            if total_quantity > 0: # Long position
-                if total_cost_basis != 0:
-                    unrealized_gain_percent = (unrealized_pnl / total_cost_basis) * 100
-            elif total_quantity < 0: # Short position
-                if total_proceeds_basis != 0:
-                    unrealized_gain_percent = (unrealized_pnl / total_proceeds_basis) * 100
-
-            # Calculate Day Gain for the aggregate position
-            if previous_closing_price is not None and total_quantity != 0:
-                if total_quantity > 0: # Long position
-                    day_gain = (current_price - previous_closing_price) * total_quantity
-                    if previous_closing_price != 0:
-                        day_gain_percent = (day_gain / (previous_closing_price * total_quantity)) * 100
-                else: # Short position
-                    day_gain = (previous_closing_price - current_price) * abs(total_quantity)
-                    if previous_closing_price != 0:
-                        day_gain_percent = (day_gain / (previous_closing_price * abs(total_quantity))) * 100
-
-
-        return {
-            'symbol': symbol,
-            'company_name': self._get_company_name_for_symbol(symbol),
-            'quantity': total_quantity,
-            'average_price_per_share': avg_price_per_share,
-            'current_price': current_price,
-            'unrealized_pnl': unrealized_pnl,
-            'unrealized_gain_percent': unrealized_gain_percent,
-            'day_gain': day_gain,
-            'day_gain_percent': day_gain_percent
-        }
+        table = self.get_lot_table()
+        metrics = table.symbol_metrics(self.current_prices, self.previous_closing_prices)
+        return self._position_details_at(table, metrics, table.symbol_index(symbol))
 
     def get_portfolio_summary(self):
         """
@@ -356,11 +470,9 @@ class Portfolio:
         including total quantity, average cost/proceeds, total unrealized P/L,
         and total day gain.
         """
-        summary_data = []
-        for symbol in self.positions:
-            details = self.get_position_details(symbol)
-            if details:
-                summary_data.append(details)
+        table = self.get_lot_table()
+        metrics = table.symbol_metrics(self.current_prices, self.previous_closing_prices)
+        summary_data = [self._position_details_at(table, metrics, i) for i in range(len(table.symbols))]
 
         if not summary_data:
             return pd.DataFrame(columns=[
@@ -395,11 +507,12 @@ class Portfolio:
         """
         Calculates and returns the total unrealized profit/loss for the portfolio.
         """
+        table = self.get_lot_table()
+        unrealized = table.symbol_metrics(self.current_prices, self.previous_closing_prices)['unrealized_pnl']
+        # Added symbol by symbol, like the per-position loop this replaces
         total_unrealized = 0.0
-        for symbol in self.positions:
-            details = self.get_position_details(symbol)
-            if details and details['unrealized_pnl'] is not None:
-                total_unrealized += details['unrealized_pnl']
+        for value in unrealized.tolist():
+            total_unrealized += value
         return total_unrealized
 
     def get_total_pnl(self):
@@ -412,69 +525,57 @@ class Portfolio:
         """
         Returns a pandas DataFrame summarizing the unrealized P/L and Day Gain for each individual active lot.
         """
-        lot_pnl_data = []
-        for symbol, lots in self.positions.items():
-            current_price = self.current_prices.get(symbol)
-            previous_closing_price = self.previous_closing_prices.get(symbol)
-
-            for lot in lots:
-                if lot['quantity'] > 0: # Only process active lots
-                    unrealized_pnl = 0.0
-                    unrealized_gain_percent = 0.0
-                    day_gain = 0.0
-                    day_gain_percent = 0.0
-
-                    cost_or_proceeds = lot['quantity'] * lot['cost_basis']
-
-                    if current_price is not None:
-                        if lot['position_type'] == 'long':
-                            unrealized_pnl = (current_price - lot['cost_basis']) * lot['quantity']
-                            if cost_or_proceeds != 0:
-                                unrealized_gain_percent = (unrealized_pnl / cost_or_proceeds) * 100
-                        elif lot['position_type'] == 'short':
-                            unrealized_pnl = (lot['cost_basis'] - current_price) * lot['quantity']
-                            if cost_or_proceeds != 0:
-                                unrealized_gain_percent = (unrealized_pnl / cost_or_proceeds) * 100
-
-                    # Calculate Day Gain per lot
-                    if current_price is not None and previous_closing_price is not None and lot['quantity'] != 0:
-                        if lot['position_type'] == 'long':
-                            day_gain = (current_price - previous_closing_price) * lot['quantity']
-                            if previous_closing_price != 0:
-                                day_gain_percent = (day_gain / (lot['quantity'] * previous_closing_price)) * 100
-                        elif lot['position_type'] == 'short':
-                            day_gain = (previous_closing_price - current_price) * lot['quantity']
-                            if previous_closing_price != 0:
-                                day_gain_percent = (day_gain / (lot['quantity'] * previous_closing_price)) * 100
-
-                    lot_pnl_data.append({
-                        'Symbol': symbol,
-                        'Company Name': lot['company_name'],
-                        'Lot ID': lot['transactionId'],
-                        'Position Type': lot['position_type'].capitalize(),
-                        'Transaction Action': lot['action'],
-                        'Security Type': lot['security_type'],
-                        'Quantity': lot['quantity'],
-                        'Original Quantity': lot['original_quantity'],
-                        'Purchase/Short Price': lot['cost_basis'],
-                        'Total Lot Cost Basis': lot['total_lot_cost_basis'],
-                        'Date': lot['date'],
-                        'Current Price': current_price,
-                        'Unrealized P/L': unrealized_pnl,
-                        'Unrealized Gain %': unrealized_gain_percent,
-                        'Day Gain': day_gain,
-                        'Day Gain %': day_gain_percent
-                    })
-        if not lot_pnl_data:
+        table = self.get_lot_table()
+        active = np.flatnonzero(table.quantity > 0) # Only process active lots
+        if len(active) == 0:
             return pd.DataFrame(columns=[
                 'Symbol', 'Company Name', 'Lot ID', 'Position Type', 'Transaction Action', 'Security Type',
                 'Quantity', 'Original Quantity', 'Purchase/Short Price', 'Total Lot Cost Basis',
                 'Date', 'Current Price', 'Unrealized P/L', 'Unrealized Gain %',
                 'Day Gain', 'Day Gain %'
             ])
+
+        metrics = table.lot_metrics(self.current_prices, self.previous_closing_prices)
+        lots = table.lots if len(active) == len(table) else list(map(table.lots.__getitem__, active.tolist()))
+        codes = table.symbol_code[active]
+        prices = np.array([self.current_prices.get(symbol) for symbol in table.symbols], dtype=object)
+        column = lambda key: list(map(attrgetter(key), lots))
+        # A gain the per-lot loop computed from int quantity, cost and prices was an int, so a column
+        # of them was int64; anything else, including the 0.0 default, made it float64
+        is_int = lambda values: np.fromiter((isinstance(value, (int, np.integer)) for value in values), dtype=bool, count=len(values))
+        int_lot = table.integral_quantity[active] & is_int(column('cost_basis'))
+        int_price = is_int(prices)[codes]
+        int_previous = is_int([self.previous_closing_prices.get(symbol) for symbol in table.symbols])[codes]
+        # Text and stored fields come straight from the lots so the column types stay as they were
+        lot_pnl_data = {
+            'Symbol': np.array(table.symbols, dtype=object)[codes].tolist(),
+            'Company Name': column('company_name'),
+            'Lot ID': column('transactionId'),
+            'Position Type': list(map(str.capitalize, column('position_type'))),
+            'Transaction Action': column('action'),
+            'Security Type': column('security_type'),
+            'Quantity': column('quantity'),
+            'Original Quantity': column('original_quantity'),
+            'Purchase/Short Price': column('cost_basis'),
+            'Total Lot Cost Basis': column('total_lot_cost_basis'),
+            'Date': column('date'),
+            'Current Price': prices[codes].tolist(),
+            'Unrealized P/L': self._gain_column(metrics['unrealized_pnl'][active], int_lot & int_price),
+            'Unrealized Gain %': metrics['unrealized_gain_percent'][active] + 0.0,
+            'Day Gain': self._gain_column(metrics['day_gain'][active], int_lot & int_price & int_previous),
+            'Day Gain %': metrics['day_gain_percent'][active] + 0.0
+        }
         return pd.DataFrame(lot_pnl_data).sort_values(by=['Symbol', 'Date']).reset_index(drop=True)
 
 
+    @staticmethod
+    def _gain_column(values: np.ndarray, integral: np.ndarray) -> np.ndarray:
+        """Per-lot gains typed as the loop produced them: int64 when every one was an int"""
+        if len(values) and integral.all():
+            return values.astype(np.int64)
+        # A short at its cost gives -1 * 0.0; the loop's (cost - price) * quantity gave 0.0
+        return values + 0.0
+
     def get_transaction_history(self):
         """
         Returns the complete transaction history as a pandas DataFrame.
@@ -483,156 +584,177 @@ class Portfolio:
             return pd.DataFrame(columns=['transaction_id', 'date', 'symbol', 'action', 'quantity', 'price', 'company_name'])
         return pd.DataFrame(self.transaction_history)
 
-    def get_detailed_portfolio_report(self):
+    # Per-symbol amounts summed into the portfolio totals
+    _TOTAL_FIELDS = ('value', 'day_gain', 'previous_value', 'unrealized_gain', 'cost_basis')
+
+    def _compute_symbol_metrics(self, symbol, lots, current_price, previous_closing_price):
         """
-        Generates a nested dictionary report of the portfolio, including:
-        - Overall portfolio summary (balance, day change, total gain)
-        - Details for each symbol (price, quantity, day gain, total gain)
-        - Details for each active lot within a symbol (purchase price, quantity, value, total gain)
+        Symbol-level report fields from the lots' running sums, O(1) whatever the number of lots.
+        Returns (report fields, contribution to each of _TOTAL_FIELDS).
         """
-        total_portfolio_value = 0.0
-        total_portfolio_day_gain = 0.0
-        total_portfolio_previous_day_value = 0.0
-        total_portfolio_unrealized_gain = 0.0
-        total_portfolio_cost_basis_for_unrealized = 0.0
-
-        all_symbol_details = []
-
-        for symbol, lots in self.positions.items():
-            current_price = self.current_prices.get(symbol)
-            previous_closing_price = self.previous_closing_prices.get(symbol)
-
-            symbol_total_quantity = 0.0
-            symbol_current_value = 0.0
-            symbol_day_gain = 0.0
-            symbol_unrealized_gain = 0.0
-            symbol_cost_basis = 0.0 # For calculating symbol's unrealized gain %
-
-            symbol_lot_details = []
-
-            for lot in lots:
-                if lot['quantity'] <= 0: # Skip depleted lots
-                    continue
-
-                lot_quantity = lot['quantity']
-                lot_purchase_price = lot['cost_basis']
-                lot_type = lot['position_type'] # 'long' or 'short'
-
-                # Calculate lot-specific metrics
-                lot_value = 0.0
-                lot_gain = 0.0
-                lot_gain_percent = 0.0
-
-                if current_price is not None:
-                    lot_value = lot_quantity * current_price if lot_type == 'long' else -lot_quantity * current_price
-                    if lot_type == 'long':
-                        lot_gain = (current_price - lot_purchase_price) * lot_quantity
-                        if lot_purchase_price != 0:
-                            lot_gain_percent = (lot_gain / (lot_quantity * lot_purchase_price)) * 100
-                    else: # short
-                        lot_gain = (lot_purchase_price - current_price) * lot_quantity
-                        if lot_purchase_price != 0:
-                            lot_gain_percent = (lot_gain / (lot_quantity * lot_purchase_price)) * 100
-
-                # Map internal transaction_action to the 'action' field in lot_detail
-                lot_action_for_report = lot['action']
-
-                symbol_lot_details.append({
-                    "transactionId": lot["transactionId"],
-                    "date": str(lot["date"]),
-                    "purchasePrice": round(lot_purchase_price, 4),
-                    "quantity": round(lot_quantity, 4),
-                    "value": round(lot_value, 2),
-                    "totalGain": round(lot_gain, 2),
-                    "totalGainPercent": round(lot_gain_percent, 2),
-                    "action": lot_action_for_report,
-                    "securityType": lot["security_type"] # Added securityType
-                })
-
-                # Aggregate for symbol-level metrics
-                if lot_type == 'long':
-                    symbol_total_quantity += lot_quantity
-                    symbol_cost_basis += lot_quantity * lot_purchase_price
-                else: # short
-                    symbol_total_quantity -= lot_quantity # Negative for short positions
-                    symbol_cost_basis += lot_quantity * lot_purchase_price # Proceeds for short
-
-                if current_price is not None:
-                    if lot_type == 'long':
-                        symbol_current_value += lot_quantity * current_price
-                        symbol_unrealized_gain += (current_price - lot_purchase_price) * lot_quantity
-                    else: # short
-                        symbol_current_value -= lot_quantity * current_price # Value of short position is negative
-                        symbol_unrealized_gain += (lot_purchase_price - current_price) * lot_quantity
-
-                if current_price is not None and previous_closing_price is not None:
-                    if lot_type == 'long':
-                        symbol_day_gain += (current_price - previous_closing_price) * lot_quantity
-                    else: # short
-                        symbol_day_gain += (previous_closing_price - current_price) * lot_quantity
-
-            # Calculate symbol-level day gain percentage
-            symbol_day_gain_percent = 0.0
-            if previous_closing_price is not None and symbol_total_quantity != 0:
-                if symbol_total_quantity > 0: # Long position
-                    if previous_closing_price != 0:
-                        symbol_day_gain_percent = (symbol_day_gain / (previous_closing_price * symbol_total_quantity)) * 100
-                else: # Short position
-                    if previous_closing_price != 0:
-                        symbol_day_gain_percent = (symbol_day_gain / (previous_closing_price * abs(symbol_total_quantity))) * 100
-
-            # Calculate symbol-level total gain percentage (unrealized)
-            symbol_total_gain_percent = 0.0
-            if symbol_cost_basis != 0:
-                symbol_total_gain_percent = (symbol_unrealized_gain / symbol_cost_basis) * 100
-
-            symbol_detail = {
-                "id": symbol.lower(),
-                "symbol": symbol,
-                "name": self._get_company_name_for_symbol(symbol),
-                "price": round(current_price, 2) if current_price is not None else None,
-                "quantity": round(symbol_total_quantity, 4),
-                "dayGain": round(symbol_day_gain, 2),
-                "dayGainPercent": round(symbol_day_gain_percent, 2),
-                "value": round(symbol_current_value, 2),
-                "totalGain": round(symbol_unrealized_gain, 2), # This is total unrealized gain for the symbol
-                "totalGainPercent": round(symbol_total_gain_percent, 2), # This is total unrealized gain percent for the symbol
-                "purchases": symbol_lot_details # Renamed from 'purchases' to 'lots' to be more general
-            }
-            all_symbol_details.append(symbol_detail)
-
-            # Aggregate for portfolio-level metrics
-            total_portfolio_value += symbol_current_value
-            total_portfolio_day_gain += symbol_day_gain
-            total_portfolio_unrealized_gain += symbol_unrealized_gain
-            total_portfolio_cost_basis_for_unrealized += symbol_cost_basis # Sum of initial cost/proceeds for active lots
+        long_quantity, long_cost = lots.totals('long')
+        short_quantity, short_cost = lots.totals('short')
+        quantity = long_quantity - short_quantity # Negative for short positions
+        cost_basis = long_cost + short_cost # Cost of longs plus proceeds of shorts
 
-            # For portfolio day percent, we need total value from previous close
+        value = 0.0
+        unrealized_gain = 0.0
+        day_gain = 0.0
+        if current_price is not None:
+            value = quantity * current_price # Value of a short position is negative
+            unrealized_gain = (current_price * long_quantity - long_cost) + (short_cost - current_price * short_quantity)
             if previous_closing_price is not None:
-                if symbol_total_quantity > 0: # Long
-                    total_portfolio_previous_day_value += previous_closing_price * symbol_total_quantity
-                else: # Short
-                    total_portfolio_previous_day_value += previous_closing_price * abs(symbol_total_quantity)
+                day_gain = (current_price - previous_closing_price) * quantity
 
+        day_gain_percent = 0.0
+        previous_value = 0.0
+        if previous_closing_price is not None:
+            previous_value = previous_closing_price * abs(quantity)
+            if quantity != 0 and previous_closing_price != 0:
+                day_gain_percent = (day_gain / previous_value) * 100
+
+        total_gain_percent = 0.0
+        if cost_basis != 0:
+            total_gain_percent = (unrealized_gain / cost_basis) * 100
+
+        metrics = {
+            "id": symbol.lower(),
+            "symbol": symbol,
+            "name": self._get_company_name_for_symbol(symbol),
+            "price": round(current_price, 2) if current_price is not None else None,
+            "quantity": round(quantity, 4),
+            "dayGain": round(day_gain, 2),
+            "dayGainPercent": round(day_gain_percent, 2),
+            "value": round(value, 2),
+            "totalGain": round(unrealized_gain, 2), # This is total unrealized gain for the symbol
+            "totalGainPercent": round(total_gain_percent, 2), # This is total unrealized gain percent for the symbol
+        }
+        return metrics, (value, day_gain, previous_value, unrealized_gain, cost_basis)
+
+    def _refresh_symbol(self, symbol):
+        """Current report fields of a held symbol, recomputed only if its lots or prices changed"""
+        lots = self.positions[symbol]
+        current_price = self.current_prices.get(symbol)
+        previous_closing_price = self.previous_closing_prices.get(symbol)
+        key = (lots, lots.revision, current_price, previous_closing_price)
+        entry = self._symbol_metrics.get(symbol)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        metrics, contribution = self._compute_symbol_metrics(symbol, lots, current_price, previous_closing_price)
+        if self._totals is not None:
+            previous = entry[2] if entry is not None else (0.0,) * len(self._TOTAL_FIELDS)
+            self._totals = [total - old + new for total, old, new in zip(self._totals, previous, contribution)]
+        self._symbol_metrics[symbol] = (key, metrics, contribution)
+        return metrics
+
+    def _portfolio_totals(self):
+        """Portfolio-wide sums, re-added from the per-symbol entries only after a ledger change"""
+        if self._totals is None or self._totals_version != self.version:
+            self._totals = None
+            self._symbol_metrics = {symbol: entry for symbol, entry in self._symbol_metrics.items() if symbol in self.positions}
+            for symbol in self.positions:
+                self._refresh_symbol(symbol)
+            contributions = [entry[2] for entry in self._symbol_metrics.values()]
+            self._totals = [sum(values) for values in zip(*contributions)] or [0.0] * len(self._TOTAL_FIELDS)
+            self._totals_version = self.version
+        return self._totals
+
+    def get_portfolio_totals(self):
+        """
+        Overall portfolio summary (balance, day change, total unrealized gain). After the first call
+        this is O(1) per price update; only a change to the ledger costs a pass over the symbols.
+        """
+        value, day_gain, previous_value, unrealized_gain, cost_basis = self._portfolio_totals()
 
         # Calculate portfolio-level percentages
         portfolio_day_percent = 0.0
-        if total_portfolio_previous_day_value != 0:
-            portfolio_day_percent = (total_portfolio_day_gain / total_portfolio_previous_day_value) * 100
+        if previous_value != 0:
+            portfolio_day_percent = (day_gain / previous_value) * 100
 
         portfolio_total_gain_percent = 0.0
-        if total_portfolio_cost_basis_for_unrealized != 0:
-            portfolio_total_gain_percent = (total_portfolio_unrealized_gain / total_portfolio_cost_basis_for_unrealized) * 100
+        if cost_basis != 0:
+            portfolio_total_gain_percent = (unrealized_gain / cost_basis) * 100
 
-        portfolio_info = {
-            "balance": round(total_portfolio_value, 2),
-            "dayChange": round(total_portfolio_day_gain, 2),
+        return {
+            "balance": round(value, 2),
+            "dayChange": round(day_gain, 2),
             "dayPercent": round(portfolio_day_percent, 2),
-            "totalGain": round(total_portfolio_unrealized_gain, 2), # This is total unrealized gain
+            "totalGain": round(unrealized_gain, 2), # This is total unrealized gain
             "totalGainPercent": round(portfolio_total_gain_percent, 2), # This is total unrealized gain percent
-            "timestamp": datetime.now().isoformat(),
-            "positions": all_symbol_details
         }
+
+    def get_lot_details(self, symbol):
+        """
+        Report rows for each active lot of a symbol (purchase price, quantity, value, total gain).
+        Built on first request and reused until the symbol's lots or price change; treat as read-only.
+        """
+        lots = self.positions[symbol]
+        current_price = self.current_prices.get(symbol)
+        key = (lots, lots.revision, current_price)
+        cached = self._lot_details.get(symbol)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        symbol_lot_details = []
+        for lot in lots:
+            if lot.quantity <= 0: # Skip depleted lots
+                continue
+
+            lot_quantity = lot.quantity
+            lot_purchase_price = lot.cost_basis
+            lot_type = lot.position_type # 'long' or 'short'
+
+            # Calculate lot-specific metrics
+            lot_value = 0.0
+            lot_gain = 0.0
+            lot_gain_percent = 0.0
+
+            if current_price is not None:
+                lot_value = lot_quantity * current_price if lot_type == 'long' else -lot_quantity * current_price
+                if lot_type == 'long':
+                    lot_gain = (current_price - lot_purchase_price) * lot_quantity
+                else: # short
+                    lot_gain = (lot_purchase_price - current_price) * lot_quantity
+                if lot_purchase_price != 0:
+                    lot_gain_percent = (lot_gain / (lot_quantity * lot_purchase_price)) * 100
+
+            symbol_lot_details.append({
+                "transactionId": lot.transactionId,
+                "date": str(lot.date),
+                "purchasePrice": round(lot_purchase_price, 4),
+                "quantity": round(lot_quantity, 4),
+                "value": round(lot_value, 2),
+                "totalGain": round(lot_gain, 2),
+                "totalGainPercent": round(lot_gain_percent, 2),
+                "action": lot.action, # The action that created this lot
+                "securityType": lot.security_type
+            })
+
+        self._lot_details = {held: entry for held, entry in self._lot_details.items() if held in self.positions}
+        self._lot_details[symbol] = (key, symbol_lot_details)
+        return symbol_lot_details
+
+    def get_detailed_portfolio_report(self, include_lots=True):
+        """
+        Generates a nested dictionary report of the portfolio, including:
+        - Overall portfolio summary (balance, day change, total gain)
+        - Details for each symbol (price, quantity, day gain, total gain)
+        - Details for each active lot within a symbol (purchase price, quantity, value, total gain),
+          left out with include_lots=False
+        Symbol and portfolio figures come from running sums, and lot rows are only rebuilt for
+        symbols whose lots or price changed since the last report.
+        """
+        self._portfolio_totals()
+        all_symbol_details = []
+        for symbol in self.positions:
+            symbol_detail = dict(self._refresh_symbol(symbol))
+            if include_lots:
+                symbol_detail["purchases"] = self.get_lot_details(symbol)
+            all_symbol_details.append(symbol_detail)
+
+        portfolio_info = self.get_portfolio_totals()
+        portfolio_info["timestamp"] = datetime.now().isoformat()
+        portfolio_info["positions"] = all_symbol_details
         return portfolio_info
 
 
@@ -2,7 +2,7 @@ import os
 import pandas as pd
 import requests
 import yfinance as yf
-from datetime import datetime, date
+from datetime import datetime, date, timezone
 import numpy as np
 from dotenv import load_dotenv
 import os
@@ -12,35 +12,197 @@ import uuid
 from zoneinfo import ZoneInfo
 import websocket
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from portfolio import Portfolio
+from metrics import LatencyHistogram
+from quote_cache import QuoteCache
+from price_store import PriceStore
+from ledger_journal import LedgerJournal
+from sqlite_store import IMPORTED_KEY, SQLiteStore, SQLitePriceStore, import_data_dir
+from rwlock import ReadWriteLock
+from csv_import import CSVImporter, get_format
+from report_delta import ReportHistory
+from intraday_cache import IntradayBarCache, BASE_INTERVAL, MARKET_TZ, interval_seconds
+import equity_engine
+import analytics
+from covariance import CovarianceService, diversification, sample_returns
+import montecarlo
+import optimizer
 load_dotenv()
 
 finnhub_key = os.getenv("FINNHUB_API_KEY")
 client = finnhub.Client(api_key=finnhub_key)
+
+# Max in-flight requests per upstream quote provider
+PROVIDER_CONCURRENCY = {'finnhub': 8, 'coingecko': 2}
+# How long a portfolio refresh waits on any one symbol before using its last known price
+QUOTE_TIMEOUT_SECONDS = 5.0
+# Minimum seconds between checks for new daily bars for the same symbol
+PRICE_REFRESH_INTERVAL_SECONDS = 6 * 60 * 60
+# How often the in-memory ledger checks disk for edits made by another process
+LEDGER_RECHECK_SECONDS = 1.0
+# Index the analytics compare the portfolio against
+BENCHMARK_SYMBOL = os.getenv("BENCHMARK_SYMBOL", "SPY")
+# Largest batch /api/transactions/batch accepts in one request
+MAX_BATCH_TRANSACTIONS = 10_000
+TRANSACTION_ACTIONS = ('buy', 'sell', 'short', 'cover')
+# 'files' (JSON ledger + journal, .npy price files) or 'sqlite' (everything in data/portfolio.db)
+STORAGE_BACKEND = os.getenv("PORTFOLIO_STORAGE", "files")
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
+
+# Shared by every PortfolioManager in the process so concurrent requests reuse upstream quotes
+quote_cache = QuoteCache()
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    """The process-wide PortfolioManager shared by every route, so they all see one in-memory ledger"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = PortfolioManager()
+    return _manager
+
+
 class PortfolioManager:
-    def __init__(self, data_dir="data", tx_file="transactions.json", portfolio_cache_file="portfolio_cache.json"):
+    def __init__(self, data_dir="data", tx_file="transactions.json", portfolio_cache_file="portfolio_cache.json",
+                 price_watermark_file="price_watermarks.json", closed_lots_file="closed_lots.json",
+                 journal_file="transactions.journal", storage=None):
         self.data_dir = data_dir
         self.tx_file = os.path.join(data_dir, tx_file)
+        self.closed_lots_file = os.path.join(data_dir, closed_lots_file)
         self.portfolio_cache_file = os.path.join(data_dir, portfolio_cache_file)
+        self.price_watermark_file = os.path.join(data_dir, price_watermark_file)
         os.makedirs(self.data_dir, exist_ok=True)
-        self.portfolio = Portfolio(positions=self.get_positions())
+        self.storage = storage or STORAGE_BACKEND
+        if self.storage == 'sqlite':
+            db_path = os.path.join(data_dir, "portfolio.db")
+            self.db = SQLiteStore(db_path)
+            if not self.db.get_meta(IMPORTED_KEY):
+                # Start from whatever the file-based backend had, again if the last attempt failed
+                import_data_dir(data_dir, self.db)
+            self.price_store = SQLitePriceStore(self.db)
+            self.journal = self.db
+        else:
+            self.db = None
+            self.price_store = PriceStore(os.path.join(data_dir, "prices"))
+            self.journal = LedgerJournal(os.path.join(data_dir, journal_file), self.tx_file, self.closed_lots_file)
+        self.price_watermarks = self._load_price_watermarks()
+        self._price_locks = {}
+        self._watermark_lock = threading.Lock()
+        # Guards the in-memory ledger: requests read it concurrently, transactions write it
+        self._lock = ReadWriteLock()
+        # set_realtime_prices + report generation mutate the Portfolio's price fields
+        self._report_lock = threading.Lock()
+        self._last_report = None
+        self.report_history = ReportHistory()
+        self.portfolio = Portfolio()
+        self.portfolio.enable_change_log()
+        self._ledger_checked_at = 0.0
+        self._load_ledger()
+        self._equity_memo = {}  # {period: {'version', 'watermark', 'days', 'history'}}
+        self.intraday_bars = IntradayBarCache(self._download_intraday, store=self.db)
+        self._intraday_memo = {}  # {(days, interval): {'tag', 'history'}}
+        self._analytics_memo = {}  # {(period, benchmark): {'version', 'watermark', 'analytics'}}
+        # {(window, benchmark): {'version', 'watermark', 'rolling', 'portfolio', 'holdings'}}, kept across
+        # ledger changes: the RollingWindows find where their series changed and recompute from there
+        self._rolling_memo = {}
+        self.covariance = CovarianceService()
+        self._covariance_memo = {}  # {window: {'version', 'watermark', 'estimate', 'weights'}}
+        # {(symbols, cash_floor, max_weight, points): {'frontier', 'risk_parity'}}: the last solutions,
+        # which warm-start the next optimization of the same assets under the same constraints
+        self._optimizer_starts = {}
+        self._optimizer_lock = threading.Lock()
+        # The RollingWindows are updated in place, so only one request at a time may touch them
+        self._rolling_lock = threading.Lock()
+        self.quote_executor = ThreadPoolExecutor(max_workers=sum(PROVIDER_CONCURRENCY.values()), thread_name_prefix="quote")
+        # Price top-ups for symbols whose quote failed, one at a time and off the quote pool
+        self.top_up_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="top-up")
+        self._pending_top_ups = set()
+        self._pending_top_ups_lock = threading.Lock()
+        self.provider_limits = {provider: threading.BoundedSemaphore(n) for provider, n in PROVIDER_CONCURRENCY.items()}
+        self.provider_latency = {provider: LatencyHistogram() for provider in PROVIDER_CONCURRENCY}
+        self.coin_ids = {}
+        self._refresh_coin_ids()
 
     
     def save_positions(self):
-        with open(self.tx_file, 'w') as f:
-            json.dump(self.portfolio.get_positions(), f)
-            
+        """Append the lot changes since the last save to the journal, folding it into a snapshot now and then"""
+        self.journal.append(self.portfolio.drain_changes())
+        if self.journal.needs_compaction():
+            self.journal.compact(self.portfolio.get_positions().to_dict(), self.portfolio.get_closed_lots())
+        self._tx_file_version = self.journal.version()
+
+    def _save_bulk(self):
+        """
+        Persist a large batch of changes in one write. SQLite takes the records in one transaction;
+        the file journal skips appending them and writes the new snapshot straight away.
+        """
+        changes = self.portfolio.drain_changes()
+        if self.db is not None:
+            self.journal.append(changes)
+        else:
+            self.journal.compact(self.portfolio.get_positions().to_dict(), self.portfolio.get_closed_lots())
+        self._tx_file_version = self.journal.version()
+
     def write_positions(self, positions):
-        with open(self.tx_file, 'w') as f:
-            json.dump(positions, f)
-            
-    def get_positions(self):
-        with open(self.tx_file, 'r') as f:
-            return json.load(f)
-           
+        with self._lock.write():
+            self.journal.compact(positions, self.portfolio.get_closed_lots())
+            self.portfolio.set_positions(positions)
+            self._tx_file_version = self.journal.version()
+            self._invalidate_derived()
+
+    def _invalidate_derived(self):
+        """Drop everything computed from the ledger; the memos are version-checked too, this just frees them"""
+        self._equity_memo.clear()
+        self._intraday_memo.clear()
+        self._analytics_memo.clear()
+        self._covariance_memo.clear()
+
+    @property
+    def ledger_version(self) -> int:
+        return self.portfolio.version
+
+    def _load_ledger(self):
+        """Snapshot plus journal replay into the in-memory portfolio"""
+        positions, closed_lots = self.journal.load()
+        self.portfolio.set_positions(positions)
+        self.portfolio.set_closed_lots(closed_lots)
+        # Keep replay at startup bounded
+        if self.journal.needs_compaction():
+            self.journal.compact(positions.to_dict(), closed_lots)
+        self._tx_file_version = self.journal.version()
+
+    def _sync_positions(self):
+        """
+        Pick up ledger edits made outside this process. Every change made through this manager is
+        already in memory, so disk is only looked at once per LEDGER_RECHECK_SECONDS.
+        """
+        now = time.monotonic()
+        if now - self._ledger_checked_at < LEDGER_RECHECK_SECONDS:
+            return
+        self._ledger_checked_at = now
+        if self.journal.version() == self._tx_file_version:
+            return
+        with self._lock.write():
+            if self.journal.version() != self._tx_file_version:
+                self._load_ledger()
+                self._invalidate_derived()
+
     def add_transaction(self, symbol: str, quantity: float, cost_basis: float, date: str = None,
                         company_name: str = None, type: str = None, action: str = None):
+        self._sync_positions()
+        with self._lock.write():
+            self._apply_transaction(symbol, quantity, cost_basis, date, company_name, type, action)
+            self.save_positions()
+            self._invalidate_derived()
+
+    def _apply_transaction(self, symbol: str, quantity: float, cost_basis: float, date: str = None,
+                           company_name: str = None, type: str = None, action: str = None):
         if action == 'buy':
             self.portfolio.buy(symbol=symbol, quantity=quantity, price=cost_basis, date=date, company_name=company_name, security_type=type)
         elif action == 'sell':
@@ -49,53 +211,177 @@ class PortfolioManager:
             self.portfolio.short_sell(symbol=symbol, quantity=quantity, price=cost_basis, date=date, company_name=company_name, security_type=type)
         elif action == 'cover':
             self.portfolio.buy_to_cover(symbol=symbol, quantity=quantity, price=cost_basis, date=date)
-        self.save_positions()
         
+    def import_csv(self, stream, fmt: str = None, columns: dict = None) -> dict:
+        """
+        Bulk import trades from a brokerage CSV text stream (see csv_import for the formats).
+        The file is parsed before the write lock is taken; the trades are then applied in date
+        order through the FIFO logic and saved once. Returns the import summary.
+        """
+        importer = CSVImporter(get_format(fmt, columns)).parse(stream)
+        self._sync_positions()
+        with self._lock.write():
+            checkpoint = self._checkpoint()
+            try:
+                imported = importer.apply(self.portfolio, self._apply_transaction)
+            except Exception:
+                # Leave the ledger as it was on disk rather than half imported
+                self._rollback(checkpoint)
+                raise
+            if imported:
+                self._save_bulk()
+                self._invalidate_derived()
+        summary = importer.summary(imported)
+        print(f"CSV import: {imported} trades from {summary['rows']} rows, {summary['error_count']} errors")
+        return summary
+
+    @staticmethod
+    def _validate_transaction(item) -> tuple:
+        """(arguments for _apply_transaction, None) for a well-formed trade, else (None, reason)"""
+        if not isinstance(item, dict):
+            return None, "Transaction must be an object"
+        action = item.get("action")
+        if action not in TRANSACTION_ACTIONS:
+            return None, f"action must be one of {', '.join(TRANSACTION_ACTIONS)}"
+        symbol = item.get("symbol")
+        if not isinstance(symbol, str) or not symbol.strip():
+            return None, "Missing symbol"
+        quantity, cost_basis = item.get("quantity"), item.get("cost_basis")
+        for name, value in (("quantity", quantity), ("cost_basis", cost_basis)):
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value) or value <= 0:
+                return None, f"{name} must be a positive number"
+        date = item.get("date")
+        if date is not None:
+            try:
+                datetime.strptime(date, "%Y-%m-%d")
+            except (TypeError, ValueError):
+                return None, "date must be YYYY-MM-DD"
+        company_name, type = item.get("company_name"), item.get("type")
+        if action in ('buy', 'short') and not (company_name and type):
+            return None, "company_name and type are required to open a position"
+        return (symbol.strip(), quantity, cost_basis, date, company_name, type, action), None
+
+    def _checkpoint(self):
+        """What a rollback needs beyond the ledger on disk"""
+        return self.portfolio.realized_pnl, len(self.portfolio.transaction_history)
+
+    def _rollback(self, checkpoint):
+        """Drop unsaved changes: reload the ledger and undo the in-memory P/L and trade history"""
+        realized_pnl, history_length = checkpoint
+        self._load_ledger()
+        self.portfolio.realized_pnl = realized_pnl
+        del self.portfolio.transaction_history[history_length:]
+        self._invalidate_derived()
+
+    def add_transactions(self, transactions: list) -> dict:
+        """
+        Apply a list of trades atomically: every item is validated first, then they are applied in
+        order under one write lock, saved once and the derived caches dropped once. If any item is
+        invalid or refused by the portfolio (selling a symbol not held, ...) nothing is applied.
+        Returns {'applied': bool, 'results': [{'index', 'status', ...} per item]}.
+        """
+        results = []
+        trades = []
+        for index, item in enumerate(transactions):
+            trade, error = self._validate_transaction(item)
+            results.append({'index': index, 'status': 'invalid', 'error': error} if error else {'index': index, 'status': 'valid'})
+            trades.append(trade)
+        if any(result['status'] == 'invalid' for result in results):
+            for result in results:
+                if result['status'] == 'valid':
+                    result['status'] = 'not_applied'
+            return {'applied': False, 'results': results}
+
+        self._sync_positions()
+        with self._lock.write():
+            checkpoint = self._checkpoint()
+            verbose, self.portfolio.verbose = self.portfolio.verbose, False
+            refused = False
+            try:
+                for result, trade in zip(results, trades):
+                    version = self.portfolio.version
+                    self.portfolio.last_message = None
+                    self._apply_transaction(*trade)
+                    if self.portfolio.version == version:
+                        result.update(status='refused', error=self.portfolio.last_message or "Not applied")
+                        refused = True
+                        break
+                    recorded = self.portfolio.transaction_history[-1]
+                    result.update(status='applied', transaction_id=recorded['transaction_id'], quantity=recorded['quantity'])
+            except Exception:
+                self._rollback(checkpoint)
+                raise
+            finally:
+                self.portfolio.verbose = verbose
+            if refused:
+                self._rollback(checkpoint)
+                for result in results:
+                    if result['status'] == 'applied':
+                        result.update(status='rolled_back')
+                        del result['transaction_id'], result['quantity']
+                    elif result['status'] == 'valid':
+                        result['status'] = 'not_applied'
+                return {'applied': False, 'results': results}
+            if trades:
+                self.save_positions()
+                self._invalidate_derived()
+        return {'applied': True, 'results': results}
+
     def remove_transaction(self, transaction_id: str):
-        positions = self.get_positions()
-        new_positions = {}
-        for symbol in positions.keys():
-            transactions = []
-            if len(positions[symbol]) == 1 and positions[symbol][0]['transactionId'] == transaction_id:
-                continue
-            elif len(positions[symbol]) == 1 and positions[symbol][0]['transactionId'] != transaction_id:
-                transactions.append(positions[symbol][0])
-                new_positions[symbol] = transactions
-            else:
-                for txn in positions[symbol]:
-                    if txn['transactionId'] == transaction_id:
-                        continue
-                    transactions.append(txn)
-                new_positions[symbol] = transactions
-        self.write_positions(new_positions)
-
-    def _read_cached_json(self, json_path: str) -> pd.DataFrame:
-        """Read JSON with potential multi-index headers and flatten columns"""
-        try:
-            df = pd.read_json(json_path)
-        except (ValueError, pd.errors.ParserError):
-            # Fallback for single-level header
-            df = pd.read_json(json_path)
-        return df
+        # The lot store is indexed by transactionId, no need to walk every position
+        self._sync_positions()
+        with self._lock.write():
+            if self.portfolio.remove_lot(transaction_id) is not None:
+                self.save_positions()
+                self._invalidate_derived()
 
-    def _get_price_data(self, symbol: str, period: str = "5y") -> pd.DataFrame:
-        json_path = os.path.join(self.data_dir, f"{symbol}.json")
-        if os.path.exists(json_path):
-            df = self._read_cached_json(json_path)
-            return df
-        # No cache: download full period
-        print("Downloading and saving 5y of price data for " + symbol)
-        
+    def _load_price_watermarks(self) -> dict:
+        if not os.path.exists(self.price_watermark_file):
+            return {}
+        with open(self.price_watermark_file) as f:
+            return json.load(f)
+
+    def _save_price_watermarks(self):
+        self._write_atomic(self.price_watermark_file, lambda path: self._dump_json(self.price_watermarks, path))
+
+    @staticmethod
+    def _dump_json(obj, path):
+        with open(path, 'w') as f:
+            json.dump(obj, f)
+
+    @staticmethod
+    def _write_atomic(path, write):
+        """Write to a temp file next to path, then swap it in so readers never see a partial file"""
+        tmp_path = f"{path}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def _last_complete_session(self, symbol) -> date:
+        """The most recent day whose daily bar should be final by now"""
+        if self.is_crypto_symbol(symbol):
+            return (pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=1)).date()
+        return (pd.Timestamp.now(tz="America/New_York").normalize() - pd.offsets.BDay(1)).date()
+
+    def _needs_top_up(self, symbol) -> bool:
+        watermark = self.price_watermarks.get(symbol)
+        if watermark and time.time() - watermark['checked_at'] < PRICE_REFRESH_INTERVAL_SECONDS:
+            return False
+        return self.price_store.last_time(symbol).date() < self._last_complete_session(symbol)
+
+    def _provider_symbol(self, symbol):
         if self.is_crypto_symbol(symbol) and '-USD' not in symbol:
-            symbol = symbol + '-USD'
+            return symbol + '-USD'
+        return symbol
+
+    def _download_history(self, symbol, max_retries=5, allow_empty=False, **history_kwargs) -> pd.DataFrame:
+        symbol = self._provider_symbol(symbol)
         attempt = 0
         backoff_factor = 1.0
-        max_retries = 5
         while attempt < max_retries:
             try:
-                df = yf.Ticker(symbol).history(period=period, auto_adjust=False)
+                df = yf.Ticker(symbol).history(auto_adjust=False, **history_kwargs)
                 # If empty or malformed, consider as failure
-                if df is None or df.empty:
+                if df is None or (df.empty and not allow_empty):
                     raise ValueError("Empty DataFrame returned while trying to download")
                 break
             except Exception as e:
@@ -108,38 +394,132 @@ class PortfolioManager:
                 print(f"Retrying in {wait:.1f} seconds...")
                 time.sleep(wait)
 
-        df.to_json(json_path)
+        if df.empty:
+            return df
+        # Drop today's still-forming bar and store timestamps as naive UTC
+        df = df[df.index.date < pd.Timestamp.now(tz=df.index.tz).date()]
+        df.index = df.index.tz_convert("UTC").tz_localize(None)
         return df
 
-    def get_latest_crypto_price(self, ticker):
-        print("Getting latest quote from CoinGecko for: " + ticker)
-        coin_name = self.portfolio.get_positions()[ticker][0]['company_name']
+    def _record_price_watermark(self, symbol):
+        with self._watermark_lock:
+            self.price_watermarks[symbol] = {
+                'last_bar': self.price_store.last_time(symbol).date().isoformat(),
+                'checked_at': time.time(),
+            }
+            self._save_price_watermarks()
+
+    def _top_up_price_data(self, symbol):
+        """Fetch only the bars after the last stored one and append them to the price store"""
+        last_stored = self.price_store.last_time(symbol).date()
+        print(f"Topping up price data for {symbol} from {last_stored}")
         try:
-            response = requests.get(f'https://api.coingecko.com/api/v3/simple/price?ids={coin_name}&vs_currencies=usd', timeout=10)
+            new_bars = self._download_history(symbol, max_retries=2, allow_empty=True, start=last_stored.isoformat())
+            self.price_store.append(symbol, new_bars)
         except Exception as e:
-            print("CoinGecko has failed. Using fallback and reading from file")
-            last_known_price = self._get_price_data(ticker)['Close'].iloc[-1]
-            return {'Close': last_known_price}, pd.to_datetime(date.today().isoformat())
+            print(f"Could not top up {symbol}, serving stored history: {e}")
+        self._record_price_watermark(symbol)
+
+    def get_price_watermark(self, symbol):
+        watermark = self.price_watermarks.get(symbol)
+        return watermark['last_bar'] if watermark else None
+
+    def _ensure_price_data(self, symbol: str, period: str = "5y"):
+        """Make sure the price store holds up to date history for symbol"""
+        with self._price_locks.setdefault(symbol, threading.Lock()):
+            if not self.price_store.exists(symbol):
+                json_path = os.path.join(self.data_dir, f"{symbol}.json")
+                if os.path.exists(json_path):
+                    # One-time migration from the old df.to_json cache
+                    self.price_store.migrate_json(symbol, json_path)
+                else:
+                    print("Downloading and saving 5y of price data for " + symbol)
+                    self.price_store.write(symbol, self._download_history(symbol, period=period))
+                    self._record_price_watermark(symbol)
+                    return
+            if self._needs_top_up(symbol):
+                self._top_up_price_data(symbol)
+
+    def _migrate_price_json(self, symbol: str):
+        """The local part of _ensure_price_data only, and only if no other thread is updating the symbol"""
+        lock = self._price_locks.setdefault(symbol, threading.Lock())
+        if self.price_store.exists(symbol) or not lock.acquire(blocking=False):
+            return
+        try:
+            json_path = os.path.join(self.data_dir, f"{symbol}.json")
+            if not self.price_store.exists(symbol) and os.path.exists(json_path):
+                self.price_store.migrate_json(symbol, json_path)
+        finally:
+            lock.release()
+
+    def _get_price_data(self, symbol: str, period: str = "5y") -> pd.DataFrame:
+        self._ensure_price_data(symbol, period)
+        return self.price_store.read_frame(symbol)
+
+    def _get_closes(self, symbol: str, period: str = "5y"):
+        """(epoch_seconds, close) arrays for symbol, read straight from the memory-mapped store"""
+        self._ensure_price_data(symbol, period)
+        return self.price_store.closes(symbol)
+
+    def _refresh_coin_ids(self):
+        """Map any crypto/cash holding we have not seen yet to its CoinGecko coin id"""
+        for symbol, lots in self.portfolio.get_positions().items():
+            if symbol not in self.coin_ids and self.is_crypto_symbol(symbol):
+                self.coin_ids[symbol] = lots[0]['company_name'].lower()
+
+    def get_latest_crypto_prices(self, tickers) -> dict:
+        """
+        Quote every crypto/cash ticker with a single CoinGecko /simple/price call.
+        Tickers still fresh in the quote cache are not re-requested.
+        If the request fails, the whole group falls back to the last cached close.
+        """
+        return quote_cache.get_many(tickers, {ticker: self._asset_class(ticker) for ticker in tickers}, self._fetch_crypto_prices)
+
+    def _fetch_crypto_prices(self, tickers) -> dict:
+        if not tickers:
+            return {}
+        print("Getting latest quotes from CoinGecko for: " + ", ".join(tickers))
+        self._refresh_coin_ids()
+        today = pd.to_datetime(date.today().isoformat())
+        ids = ",".join(sorted({self.coin_ids[ticker] for ticker in tickers}))
+        try:
+            response = self._call_provider('coingecko', requests.get, f'{COINGECKO_API_URL}/simple/price?ids={ids}&vs_currencies=usd', timeout=10)
+            response.raise_for_status()
+            data = response.json()
+            if not isinstance(data, dict):
+                raise ValueError(f"unexpected response {str(data)[:80]}")
+        except Exception as e:
+            print(f"CoinGecko has failed ({e}). Using fallback and reading from file")
+            data = {}
+
+        quotes = {}
+        for ticker in tickers:
+            entry = data.get(self.coin_ids[ticker])
+            price = entry.get("usd") if isinstance(entry, dict) else None
+            if not isinstance(price, (int, float)):
+                price = self._get_price_data(ticker)['Close'].iloc[-1]
+            quotes[ticker] = ({'Close': price}, today)
+        return quotes
+
+    def get_latest_crypto_price(self, ticker):
+        return self.get_latest_crypto_prices([ticker])[ticker]
 
-        data = response.json()
-        crypto_id, data = next(iter(data.items()))
-        price = data["usd"]
-        new_data = {
-            'Close': price
-        }
-        return new_data, pd.to_datetime(date.today().isoformat())
-    
     def is_crypto_symbol(self, symbol):
-        symbol_transaction = self.portfolio.get_positions()[symbol][0]
-        return symbol_transaction['security_type'].lower() == 'crypto' or symbol_transaction['security_type'].lower() == 'cash'
-        
+        security_type = self._asset_class(symbol)
+        return security_type == 'crypto' or security_type == 'cash'
+
+    def _asset_class(self, symbol):
+        return self.portfolio.get_security_type(symbol).lower()
+
     def get_realtime_quote(self, symbol):
         if self.is_crypto_symbol(symbol):
             return self.get_latest_crypto_price(ticker=symbol)
-        
+        return quote_cache.get(symbol, self._asset_class(symbol), lambda: self._fetch_finnhub_quote(symbol))
+
+    def _fetch_finnhub_quote(self, symbol):
         print("Getting latest quote from FinnHub for: " + symbol)
-        quote = client.quote(symbol=symbol)
-                
+        quote = self._call_provider('finnhub', client.quote, symbol=symbol)
+
         new_data = {
             'Close': quote.get("c"),
             'High': quote.get("h"),
@@ -152,59 +532,478 @@ class PortfolioManager:
         index = pd.to_datetime(date.today().isoformat())
         return new_data, index
 
-    def _load_all_price_data(self, period: str = "5y") -> pd.DataFrame:
-        syms = self.portfolio.get_positions().keys()
-        frames = []
-        for sym in syms:
-            df = self._get_price_data(sym, period)[['Close']].copy()
-            df = df.rename(columns={"Close": sym})
-            frames.append(df)
-        if not frames:
-            return pd.DataFrame()
-        data = pd.concat(frames, axis=1).sort_index().fillna(0)
-        return data
+    def _call_provider(self, provider, fn, *args, **kwargs):
+        """Run an upstream call under the provider's concurrency limit and record its latency"""
+        with self.provider_limits[provider]:
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.provider_latency[provider].observe(time.perf_counter() - start)
+
+    def _get_fallback_quote(self, symbol):
+        """
+        Last known quote, else the last stored close, else None. Never downloads: this runs when a
+        provider already failed or ran out of time, so any price top-up is left to the background.
+        """
+        last_known = quote_cache.peek(symbol)
+        if last_known is not None:
+            return last_known
+        self._migrate_price_json(symbol)
+        self._top_up_in_background(symbol)
+        if not self.price_store.exists(symbol):
+            return None
+        _, closes = self.price_store.closes(symbol)
+        if not len(closes):
+            return None
+        new_data = {
+            'Close': float(closes[-1]),
+            'previous_close_price': float(closes[-2] if len(closes) > 1 else closes[-1]),
+        }
+        return new_data, pd.to_datetime(date.today().isoformat())
+
+    def _top_up_in_background(self, symbol):
+        """Queue a price top-up for symbol unless one is already queued or running"""
+        with self._pending_top_ups_lock:
+            if symbol in self._pending_top_ups:
+                return
+            self._pending_top_ups.add(symbol)
+
+        def top_up():
+            try:
+                self._ensure_price_data(symbol)
+            finally:
+                with self._pending_top_ups_lock:
+                    self._pending_top_ups.discard(symbol)
+
+        self.top_up_executor.submit(top_up)
+
+    def get_realtime_quotes(self, symbols) -> dict:
+        """
+        Fetch quotes for all symbols concurrently. Any symbol that errors or does not answer
+        within QUOTE_TIMEOUT_SECONDS falls back to its last known price so one slow
+        provider call cannot stall the whole report.
+        """
+        crypto = [symbol for symbol in symbols if self.is_crypto_symbol(symbol)]
+        futures = {symbol: self.quote_executor.submit(self.get_realtime_quote, symbol) for symbol in symbols if symbol not in crypto}
+        crypto_future = self.quote_executor.submit(self.get_latest_crypto_prices, crypto)
+        done, _ = wait([*futures.values(), crypto_future], timeout=QUOTE_TIMEOUT_SECONDS)
+        # Every crypto symbol shares the outcome of the one batched request
+        futures.update({symbol: crypto_future for symbol in crypto})
+
+        quotes = {}
+        for symbol, future in futures.items():
+            if future in done and future.exception() is None:
+                result = future.result()
+                quote = result.get(symbol) if future is crypto_future else result
+                if quote is not None:
+                    quotes[symbol] = quote
+                    continue
+                reason = "missing from the response"
+            else:
+                reason = future.exception() if future in done else f"timed out after {QUOTE_TIMEOUT_SECONDS}s"
+            print(f"Quote for {symbol} failed ({reason}). Using last known price")
+            quotes[symbol] = self._get_fallback_quote(symbol)
+        return quotes
+
+    def get_provider_latency(self) -> dict:
+        return {provider: histogram.snapshot() for provider, histogram in self.provider_latency.items()}
+
+    def get_quote_cache_stats(self) -> dict:
+        return quote_cache.stats()
+
+    def get_streamable_symbols(self) -> list:
+        """Held symbols the trade WebSocket can price. Crypto and cash keep going through the REST quotes"""
+        return [symbol for symbol in self.portfolio.get_positions() if not self.is_crypto_symbol(symbol)]
+
+    def apply_trade(self, symbol: str, price: float, epoch_ms: int = None):
+        """
+        Fold a streamed trade into the cached quote, which also marks it fresh.
+        A symbol with no quote yet is left alone: the next report fetches it once and picks up its
+        previous close, which a trade does not carry.
+        """
+        cached = quote_cache.peek(symbol)
+        if cached is None:
+            return
+        quote, index = cached
+        quote = dict(quote, Close=price)
+        if quote.get('High') is not None:
+            quote['High'] = max(quote['High'], price)
+        if quote.get('Low') is not None:
+            quote['Low'] = min(quote['Low'], price)
+        previous_close = quote.get('previous_close_price')
+        if previous_close:
+            quote['percent_change'] = round((price - previous_close) / previous_close * 100, 4)
+        if epoch_ms:
+            index = pd.Timestamp(epoch_ms, unit='ms').normalize()
+        quote_cache.put(symbol, (quote, index))
+
+    def _price_matrix(self, symbols, period: str = "5y", since_day: int = None):
+        """Weekday-aligned [days x symbols] close matrix built from the memory-mapped store"""
+        return equity_engine.build_price_matrix([self._get_closes(symbol, period) for symbol in symbols], since_day)
+
+    def _holding_events(self):
+        """Per-symbol (days, quantity changes) arrays for every held or previously held symbol"""
+        events = self.portfolio.get_quantity_events()
+        return {
+            symbol: (equity_engine.parse_days([date for date, _ in symbol_events]),
+                     np.fromiter((change for _, change in symbol_events), dtype=np.float64, count=len(symbol_events)))
+            for symbol, symbol_events in events.items()
+        }
+
+    def _ensure_ledger_prices(self, extra=(), period: str = "5y", ever_held: bool = True):
+        """
+        Bring the stored prices of the symbols in the ledger (every one ever held, or only those
+        held now) and of `extra` up to date. The symbols are read under the ledger lock, but the
+        downloads run without it: a writer would wait behind them, and every new reader behind it.
+        """
+        with self._lock.read():
+            symbols = list(self.portfolio.get_quantity_events() if ever_held else self.portfolio.positions)
+        for symbol in symbols + list(extra):
+            self._ensure_price_data(symbol, period)
 
     def compute_equity_history(self, period: str = "5y") -> list[dict]:
-        price_data = self._load_all_price_data(period)
+        """
+        Daily equity curve using the quantity actually held on each day, reconstructed from
+        lot dates and closed lots. The result is memoized against the ledger version and the
+        last stored bar of every symbol. When only new bars arrived, just the days from the
+        oldest previous watermark onwards are recomputed and appended.
+        """
+        self._sync_positions()
+        self._ensure_ledger_prices(period=period)
+        with self._lock.read():
+            return self._compute_equity_history(period)
 
-        # Cache current holdings
-        holdings = self.portfolio.get_positions_and_quantities()
+    def _compute_equity_history(self, period: str) -> list[dict]:
+        version = self.portfolio.version
+        events = self._holding_events()
+        symbols = list(events)
+        event_arrays = [events[symbol] for symbol in symbols]
+        watermark = {symbol: self.price_store.last_time(symbol) for symbol in symbols}
 
-        # Only keep columns for current holdings
-        price_data = price_data[list(holdings.keys())]
-        
-        # Get rid of weekends. We dont have data 
-        price_data = price_data[price_data.index.day_of_week < 5]
-
-        # Multiply each column by the quantity held
-        for symbol, qty in holdings.items():
-            price_data[symbol] = price_data[symbol] * qty
-
-        # Sum across columns (each row is total equity on that date)
-        columns = price_data.columns
-        price_data['date'] = price_data.index.date
-        daily_aggregated_values = price_data.groupby('date')[columns].sum()
-        price_data = price_data.drop(columns=['date'])
-        price_data['equity'] = daily_aggregated_values.sum(axis=1) if len(daily_aggregated_values.columns) > 1 else price_data[symbol]
-                
-        price_data['equity'].dropna(inplace=True)
-                
-        price_data['equity_pct_change'] = price_data['equity'].pct_change()
-
-        # Identify rows where the equity dropped by more than 10%
-        # This gets rid of trading holidays. We dont have data from weekends or holidays
-        rows_to_drop = price_data[price_data['equity_pct_change'] < -0.10].index
-        price_data.drop(rows_to_drop, inplace=True)
-        price_data_cleaned = price_data.drop(columns=['equity_pct_change'])
-        equity = price_data_cleaned['equity'].dropna()
-        
-        # Return as list of dicts with timestamp
-        equity_history = [
-            {"time": int(pd.Timestamp(ts).timestamp()), "equity": round(equity, 2)}
-            for ts, equity in zip(equity.index, equity)
-        ]
+        memo = self._equity_memo.get(period)
+        if memo and memo['version'] == version:
+            if memo['watermark'] == watermark:
+                return memo['history']
+            if all(watermark[symbol] >= memo['watermark'][symbol] for symbol in symbols):
+                cutoff_day = min(memo['watermark'].values()).value // 10**9 // equity_engine.SECONDS_PER_DAY
+                tail_days, tail_prices = self._price_matrix(symbols, period, since_day=cutoff_day)
+                tail_holdings = equity_engine.holdings_matrix(tail_days, event_arrays)
+                tail_equity = equity_engine.daily_equity(tail_prices, tail_holdings)
+                kept = memo['days'] < cutoff_day
+                # Symbols whose history began before the tail can have holidays in it from its first row
+                started = np.array([len(seconds) > 0 and equity_engine.to_days(seconds[0]) < cutoff_day
+                                    for seconds in (self.price_store.closes(symbol)[0] for symbol in symbols)], dtype=bool)
+                tail_keep = equity_engine.holiday_mask(tail_prices, tail_holdings, started)
+                cutoff_time = int(cutoff_day) * equity_engine.SECONDS_PER_DAY
+                history = [point for point in memo['history'] if point['time'] < cutoff_time]
+                history += equity_engine.equity_points(tail_days, tail_equity, tail_keep)
+                self._equity_memo[period] = {'version': version, 'watermark': watermark, 'history': history,
+                                             'days': np.concatenate([memo['days'][kept], tail_days])}
+                return history
+
+        days, prices = self._price_matrix(symbols, period)
+        holdings = equity_engine.holdings_matrix(days, event_arrays)
+        equity = equity_engine.daily_equity(prices, holdings)
+        history = equity_engine.equity_points(days, equity, equity_engine.holiday_mask(prices, holdings))
+        self._equity_memo[period] = {'version': version, 'watermark': watermark, 'history': history,
+                                     'days': days}
+        return history
 
-        return equity_history
+    def compute_analytics(self, period: str = "5y", benchmark: str = None) -> dict:
+        """
+        Return and risk metrics (CAGR, volatility, Sharpe, Sortino, max drawdown, beta/alpha) from
+        the daily time-weighted returns of the holdings, over the trailing period. Memoized per
+        (ledger version, last stored bar of every symbol and the benchmark, benchmark).
+        """
+        if period not in analytics.PERIOD_DAYS:
+            raise ValueError(f"Unknown period {period!r}, expected one of {', '.join(analytics.PERIOD_DAYS)}")
+        benchmark = (benchmark or BENCHMARK_SYMBOL).upper()
+        self._sync_positions()
+        # Every stored history covers at least 5y; 'max' uses whatever is there
+        self._ensure_ledger_prices([benchmark])
+        with self._lock.read():
+            return self._compute_analytics(period, benchmark)
+
+    def _compute_analytics(self, period: str, benchmark: str) -> dict:
+        version = self.portfolio.version
+        events = self._holding_events()
+        symbols = list(events)
+        watermark = {symbol: self.price_store.last_time(symbol) for symbol in symbols + [benchmark]}
+
+        memo = self._analytics_memo.get((period, benchmark))
+        if memo and memo['version'] == version and memo['watermark'] == watermark:
+            return memo['analytics']
+
+        days, prices = self._price_matrix(symbols)
+        holdings = equity_engine.holdings_matrix(days, [events[symbol] for symbol in symbols])
+        result = analytics.portfolio_analytics(days, prices, holdings, self._get_closes(benchmark), period)
+        result['benchmark'] = benchmark
+        self._analytics_memo[(period, benchmark)] = {'version': version, 'watermark': watermark, 'analytics': result}
+        return result
+
+    def compute_rolling(self, window: int = 63, benchmark: str = None) -> dict:
+        """
+        Rolling volatility, Sharpe, beta and drawdown series over a trailing window of trading days,
+        for the portfolio's time-weighted returns and for every symbol held, plus the portfolio's
+        monthly returns. New bars only extend the tail of each series.
+        """
+        if window not in analytics.ROLLING_WINDOWS:
+            raise ValueError(f"window must be one of {', '.join(map(str, analytics.ROLLING_WINDOWS))}")
+        benchmark = (benchmark or BENCHMARK_SYMBOL).upper()
+        self._sync_positions()
+        self._ensure_ledger_prices([benchmark])
+        with self._lock.read(), self._rolling_lock:
+            return self._compute_rolling(window, benchmark)
+
+    def _compute_rolling(self, window: int, benchmark: str) -> dict:
+        version = self.portfolio.version
+        events = self._holding_events()
+        symbols = list(events)
+        watermark = {symbol: self.price_store.last_time(symbol) for symbol in symbols + [benchmark]}
+
+        memo = self._rolling_memo.get((window, benchmark))
+        if memo and memo['version'] == version and memo['watermark'] == watermark:
+            return memo['rolling']
+
+        days, prices = self._price_matrix(symbols)
+        holdings = equity_engine.holdings_matrix(days, [events[symbol] for symbol in symbols])
+        benchmark_closes = self._get_closes(benchmark)
+        return_days, returns, benchmark_returns = analytics.portfolio_returns(days, prices, holdings, benchmark_closes)
+        portfolio_window = memo['portfolio'] if memo else analytics.RollingWindow(window)
+        portfolio_window.update(return_days, returns, benchmark_returns)
+
+        previous = memo['holdings'] if memo else {}
+        holding_windows = {}
+        if len(days) > 1:
+            symbol_returns, first = analytics.holding_returns(prices)
+            all_benchmark = analytics.price_returns(days, *benchmark_closes)
+            for j, symbol in enumerate(symbols):
+                if symbol not in self.portfolio.positions:
+                    continue
+                start = first[j]
+                holding_windows[symbol] = previous.get(symbol) or analytics.RollingWindow(window)
+                holding_windows[symbol].update(days[1 + start:], symbol_returns[start:, j], all_benchmark[start:])
+
+        rolling = {
+            'window': window,
+            'benchmark': benchmark,
+            'portfolio': {**portfolio_window.series(), 'monthly_returns': analytics.monthly_returns(return_days, returns)},
+            'holdings': {symbol: holding_window.series() for symbol, holding_window in holding_windows.items()},
+        }
+        self._rolling_memo[(window, benchmark)] = {'version': version, 'watermark': watermark, 'rolling': rolling,
+                                                   'portfolio': portfolio_window, 'holdings': holding_windows}
+        return rolling
+
+    def get_covariance(self, window: int = 252) -> dict:
+        """
+        Shrunk covariance and correlation of the daily returns of every symbol held, on the
+        benchmark's trading calendar (see covariance.CovarianceService), with the current market
+        weights and what they imply for diversification. Arrays are NumPy; see covariance_report
+        for the JSON form. Memoized against the ledger version and the last stored bars.
+        """
+        self._sync_positions()
+        self._ensure_ledger_prices([BENCHMARK_SYMBOL], ever_held=False)
+        with self._lock.read():
+            version = self.portfolio.version
+            symbols = list(self.portfolio.positions)
+            watermark = {symbol: self.price_store.last_time(symbol) for symbol in symbols + [BENCHMARK_SYMBOL]}
+            memo = self._covariance_memo.get(window)
+            if memo and memo['version'] == version and memo['watermark'] == watermark:
+                return memo['covariance']
+
+            calendar = equity_engine.to_days(self._get_closes(BENCHMARK_SYMBOL)[0])
+            columns = [self._get_closes(symbol) for symbol in symbols]
+            estimate = self.covariance.estimate(window, symbols, calendar, columns)
+            # Market value at the last close, shorts negative
+            values = np.array([float(self.portfolio.get_net_quantity(symbol)) * float(closes[-1]) if len(closes) else 0.0
+                               for symbol, (_, closes) in zip(symbols, columns)])
+            weights = values / np.abs(values).sum() if np.abs(values).sum() > 0 else values
+            result = {**estimate, 'weights': weights, 'diversification': diversification(estimate, weights)}
+            self._covariance_memo[window] = {'version': version, 'watermark': watermark, 'covariance': result}
+            return result
+
+    def covariance_report(self, window: int = 252) -> dict:
+        """get_covariance as JSON-ready lists, days as epoch seconds"""
+        estimate = self.get_covariance(window)
+        report = {}
+        for key, value in estimate.items():
+            if isinstance(value, np.ndarray):
+                report[key] = np.round(value, 6).tolist()
+            elif key in ('start', 'end'):
+                report[key] = value * equity_engine.SECONDS_PER_DAY
+            else:
+                report[key] = value
+        return report
+
+    def simulate_risk(self, paths: int = 1_000_000, horizons=montecarlo.HORIZONS, method: str = 'bootstrap',
+                      seed: int = None, lookback: int = montecarlo.LOOKBACK_DAYS) -> dict:
+        """
+        Monte Carlo VaR, CVaR and terminal-value distribution of the current positions (net
+        quantity at the last close, shorts negative) over each horizon in trading days, from the
+        last `lookback` days of returns every symbol held has on the benchmark's calendar. The
+        simulation runs on a process pool outside the ledger lock; see montecarlo.simulate.
+        """
+        if method not in montecarlo.METHODS:
+            raise ValueError(f"method must be one of {', '.join(montecarlo.METHODS)}")
+        self._sync_positions()
+        self._ensure_ledger_prices([BENCHMARK_SYMBOL], ever_held=False)
+        with self._lock.read():
+            symbols = list(self.portfolio.positions)
+            quantities = {symbol: float(self.portfolio.get_net_quantity(symbol)) for symbol in symbols}
+            calendar = equity_engine.to_days(self._get_closes(BENCHMARK_SYMBOL)[0])
+            columns = [self._get_closes(symbol) for symbol in symbols]
+        # Flat positions and symbols with no bars carry no risk
+        held = [(symbol, column) for symbol, column in zip(symbols, columns) if len(column[1]) and quantities[symbol]]
+        symbols, columns = [symbol for symbol, _ in held], [column for _, column in held]
+        if not symbols:
+            raise ValueError("no priced positions to simulate")
+        days, returns = sample_returns(calendar, columns, lookback)
+        if len(days) < 2:
+            raise ValueError("not enough common price history to simulate")
+        values = np.array([quantities[symbol] * float(closes[-1]) for symbol, (_, closes) in zip(symbols, columns)])
+        result = montecarlo.simulate(montecarlo.build_model(returns, values, method), paths, horizons, seed=seed)
+        result.update(symbols=symbols, values=values.round(2).tolist(), observations=len(days),
+                      start=int(days[0]) * equity_engine.SECONDS_PER_DAY, end=int(days[-1]) * equity_engine.SECONDS_PER_DAY)
+        return result
+
+    def _is_cash(self, symbol: str) -> bool:
+        return symbol in optimizer.CASH_SYMBOLS or self.portfolio.get_security_type(symbol) in optimizer.CASH_SECURITY_TYPES
+
+    def _holding_values(self, symbols):
+        """(prices, market values, total value) of symbols; the caller holds the ledger lock"""
+        prices = {}
+        for symbol in symbols:
+            price = self.portfolio.current_prices.get(symbol)
+            prices[symbol] = float(price) if price else float(self._get_closes(symbol)[1][-1])
+        values = {symbol: float(self.portfolio.get_net_quantity(symbol)) * prices[symbol] for symbol in symbols}
+        total = sum(values.values())
+        if total <= 0:
+            raise ValueError("portfolio has no net value to allocate")
+        return prices, values, total
+
+    def optimize_holdings(self, window: int = optimizer.DEFAULT_WINDOW, points: int = optimizer.FRONTIER_POINTS, cash_floor: float = 0.0,
+                          max_weight: float = 1.0) -> dict:
+        """
+        Long-only efficient frontier, min-variance, max-Sharpe and risk-parity allocations of the
+        symbols held, from the cached covariance and mean returns of a trailing window, with the
+        trades that reach each target from today's lots. Cash (USDT-USD or any CASH position) is
+        pooled and kept between cash_floor and the larger of the floor and today's cash weight, so
+        a target may deploy cash but never raises it past that. Each solve warm-starts from the last
+        optimization of the same holdings and constraints.
+        """
+        estimate = self.get_covariance(window)
+        if 'covariance' not in estimate:
+            raise ValueError("not enough common price history to optimize")
+        symbols = estimate['symbols']
+        with self._lock.read():
+            cash = [symbol for symbol in symbols if self._is_cash(symbol)]
+            _, values, total = self._holding_values(symbols)
+        cash_weight = sum(values[symbol] for symbol in cash) / total
+        # The solves run without the ledger lock, so they never hold up a trade
+        model = optimizer.PortfolioOptimizer(symbols, estimate['mean'], estimate['covariance'], cash=cash,
+                                             cash_floor=cash_floor, cash_ceiling=max(cash_floor, cash_weight),
+                                             max_weight=max_weight)
+        # Today's cash weight moves the cash ceiling; the solver projects the old answers onto it
+        key = (tuple(symbols), cash_floor, max_weight, points)
+        with self._optimizer_lock:
+            starts = self._optimizer_starts.get(key, {})
+        frontier = model.frontier(points, starts.get('frontier'))
+        targets = {
+            'min_variance': frontier[0][1:],
+            'max_sharpe': model.max_sharpe(frontier),
+            'risk_parity': (model.risk_parity(starts.get('risk_parity')), None),
+        }
+        with self._optimizer_lock:
+            self._optimizer_starts = {key: {'frontier': [w for _, w, _ in frontier], 'risk_parity': targets['risk_parity'][0]}}
+
+        with self._lock.read():
+            # Trades go from the lots as they are now, which may have changed during the solves
+            prices, values, total = self._holding_values(symbols)
+            cash_weight = sum(values[symbol] for symbol in cash) / total
+            # Cash moves in and out of the largest cash position, or a new USDT-USD one
+            primary_cash = max(cash, key=values.get) if cash else optimizer.CASH_SYMBOLS[0]
+            prices.setdefault(primary_cash, 1.0)
+            trade_symbols = symbols + ([primary_cash] if primary_cash not in symbols else [])
+            current = np.array([values[symbol] for symbol in model.risky] + [cash_weight * total]) / total
+            result = {
+                'window': window, 'observations': estimate['observations'], 'total_value': total,
+                'cash_symbols': cash, 'cash_floor': cash_floor, 'max_weight': max_weight,
+                'current': model.describe(current),
+                'frontier': [{'aversion': aversion, **{field: value for field, value in model.describe(w, iterations).items() if field != 'weights'}}
+                             for aversion, w, iterations in frontier],
+            }
+            for name, (w, iterations) in targets.items():
+                target_values = {symbol: weight * total for symbol, weight in zip(model.risky, w)}
+                other_cash = sum(values[symbol] for symbol in cash if symbol != primary_cash)
+                for symbol in cash:
+                    target_values[symbol] = values[symbol]
+                target_values[primary_cash] = w[-1] * total - other_cash
+                trades = optimizer.rebalance_trades(self.portfolio, trade_symbols, prices, target_values)
+                for trade in trades:
+                    if trade['action'] in ('buy', 'short') and 'type' not in trade:
+                        trade.update(company_name=primary_cash, type=optimizer.CASH_SECURITY_TYPES[0])
+                result[name] = {**model.describe(w, iterations), 'trades': trades}
+            return result
+
+    def _download_intraday(self, symbols, start) -> dict:
+        """Regular-hours 1 minute closes since start (epoch seconds) for symbols, in one yf.download call"""
+        tickers = {self._provider_symbol(symbol): symbol for symbol in symbols}
+        frame = yf.download(tickers=list(tickers), interval=BASE_INTERVAL, start=datetime.fromtimestamp(start, timezone.utc),
+                            auto_adjust=False, prepost=False, progress=False)
+        if frame is None or frame.empty:
+            return {}
+        closes = frame['Close']
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(next(iter(tickers)))
+        index = closes.index if closes.index.tz is not None else closes.index.tz_localize('UTC')
+        # Keep only data within regular market hours (9:30 AM to 4:00 PM)
+        closes = closes.set_axis(index.tz_convert(MARKET_TZ)).between_time("09:30", "16:00")
+        seconds = closes.index.tz_convert('UTC').tz_localize(None).values.astype('datetime64[s]').astype(np.int64)
+        bars = {}
+        for ticker, symbol in tickers.items():
+            if ticker not in closes.columns:
+                continue
+            column = closes[ticker].to_numpy(dtype=np.float64)
+            present = ~np.isnan(column)
+            bars[symbol] = (seconds[present], column[present])
+        return bars
+
+    def compute_intraday_equity(self, days: int = 1, interval: str = BASE_INTERVAL) -> list[dict]:
+        """
+        Intraday equity curve over the last `days` calendar days at `interval` bars.
+        Bars come from the intraday cache, so only bars newer than the cached ones are downloaded,
+        and the curve is memoized until the ledger or the cached bars change.
+        """
+        self._sync_positions()
+        with self._lock.read():
+            return self._compute_intraday_equity(days, interval)
+
+    def _compute_intraday_equity(self, days: int, interval: str) -> list[dict]:
+        bucket_seconds = interval_seconds(interval)
+        events = self._holding_events()
+        symbols = list(events)
+        self.intraday_bars.refresh(symbols, days)
+
+        tag = (self.portfolio.version, self.intraday_bars.generation,
+               int(self.intraday_bars.window_start(days)) // bucket_seconds)
+        memo = self._intraday_memo.get((days, interval))
+        if memo and memo['tag'] == tag:
+            return memo['history']
+
+        bars = self.intraday_bars.bars(symbols, interval, days)
+        times, prices = equity_engine.build_bar_matrix([bars[symbol] for symbol in symbols])
+        # Quantities only change between sessions, so sample them per day and spread to the bars
+        bar_days, day_of_bar = np.unique(times // equity_engine.SECONDS_PER_DAY, return_inverse=True)
+        holdings = equity_engine.holdings_matrix(bar_days, [events[symbol] for symbol in symbols])[day_of_bar]
+        # A minute with no trade in one symbol keeps its last price; minutes before a held symbol's
+        # first bar in the window are dropped rather than shown as a dip
+        prices = analytics.forward_fill(prices)
+        equity = equity_engine.daily_equity(prices, holdings)
+        keep = equity_engine.holiday_mask(prices, holdings, np.ones(len(symbols), dtype=bool))
+        history = equity_engine.equity_points(times, equity, keep, unit=1)
+        self._intraday_memo[(days, interval)] = {'tag': tag, 'history': history}
+        return history
 
     def is_past_12_in_china(self):
         now = pd.Timestamp.now()
@@ -213,20 +1012,49 @@ class PortfolioManager:
         return now.date() > ny_time.date()
     
     def get_portfolio_info_from_cache(self):
+        with self._report_lock:
+            if self._last_report is None:
+                self._last_report = self._read_report_cache()
+            return self._last_report
+
+    def _read_report_cache(self):
+        if self.db is not None:
+            return self.db.get_cache('portfolio', {})
         with open(self.portfolio_cache_file) as f:
             return json.load(f)
         return {}
         
     def get_portfolio_info(self):
+        self._sync_positions()
+        # Quotes are fetched before taking the lock so a slow provider never holds up a transaction
+        quotes = self.get_realtime_quotes(list(self.portfolio.get_positions().keys()))
+        with self._lock.read(), self._report_lock:
+            return self._build_portfolio_info(quotes)
+
+    def get_portfolio_delta(self, since=None) -> dict:
+        """Rebuild the report and return only what changed since the client's version"""
+        self.get_portfolio_info()
+        return self.report_history.delta_since(since)
+
+    def _build_portfolio_info(self, quotes):
         total_value = 0
         realtime_prices = {}
         previous_close_price = {}
         type_breakdown = {}
-        positions = self.get_positions()
-        self.portfolio.set_positions(positions)
+        positions = self.portfolio.get_positions()
+        missing = [symbol for symbol in positions if symbol not in quotes]
+        if missing:
+            # Bought while the quotes were in flight
+            quotes.update(self.get_realtime_quotes(missing))
         for symbol in positions:
-            purchases = positions[symbol]
-            live_price, live_date = self.get_realtime_quote(symbol)
+            if quotes[symbol] is None:
+                # No quote and no stored history yet: keep whatever price the report had
+                if symbol in self.portfolio.current_prices:
+                    realtime_prices[symbol] = self.portfolio.current_prices[symbol]
+                if symbol in self.portfolio.previous_closing_prices:
+                    previous_close_price[symbol] = self.portfolio.previous_closing_prices[symbol]
+                continue
+            live_price, live_date = quotes[symbol]
             price = live_price['Close']
             realtime_prices[symbol] = price
 
@@ -238,11 +1066,11 @@ class PortfolioManager:
 
             previous_close_price[symbol] = float(prev_close)
             
-            total_quantity = sum(p["quantity"] for p in purchases)
+            total_quantity = self.portfolio.get_gross_quantity(symbol)
             value = round(price * total_quantity, 2)
             total_value += value
             
-            category = purchases[0]['security_type'].lower()
+            category = positions[symbol][0]['security_type'].lower()
             type_breakdown[category] = type_breakdown.get(category, 0) + value
             
         self.portfolio.set_realtime_prices(current_prices=realtime_prices, previous_closing_prices=previous_close_price)
@@ -254,8 +1082,13 @@ class PortfolioManager:
         portfolio_info = self.portfolio.get_detailed_portfolio_report()
         portfolio_info['portfolioHighlights'] = portfolio_highlights
 
-        with open(self.portfolio_cache_file, 'w') as f:
-            json.dump(portfolio_info, f)
+        self.report_history.publish(portfolio_info)
+        self._last_report = portfolio_info
+        if self.db is not None:
+            self.db.put_cache('portfolio', portfolio_info)
+        else:
+            with open(self.portfolio_cache_file, 'w') as f:
+                json.dump(portfolio_info, f)
 
         return portfolio_info
 
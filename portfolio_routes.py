@@ -1,8 +1,11 @@
 from __main__ import app
-from flask import request, jsonify
-from portfolio_manager import PortfolioManager
+from flask import request, jsonify, Response, stream_with_context
+from portfolio_manager import get_manager, MAX_BATCH_TRANSACTIONS
+from live_stream import get_broadcaster
+import io
+import json
 import requests
-manager = PortfolioManager()
+manager = get_manager()
 
 @app.route("/api/add_transaction", methods=["POST"])
 def add_transaction():
@@ -22,6 +25,39 @@ def add_transaction():
     return jsonify({"message": f"Transaction added for {symbol.upper()}."})
 
 
+@app.route("/api/transactions/batch", methods=["POST"])
+def add_transactions():
+    # {"transactions": [{symbol, quantity, cost_basis, action, date, company_name, type}, ...]}, all or nothing
+    data = request.get_json(silent=True) or {}
+    transactions = data.get("transactions") if isinstance(data, dict) else None
+    if not isinstance(transactions, list) or not transactions:
+        return jsonify({"error": "Expected a non-empty transactions list"}), 400
+    if len(transactions) > MAX_BATCH_TRANSACTIONS:
+        return jsonify({"error": f"At most {MAX_BATCH_TRANSACTIONS} transactions per batch"}), 413
+
+    response = manager.add_transactions(transactions)
+    if not response['applied']:
+        invalid = any(result['status'] == 'invalid' for result in response['results'])
+        response["error"] = "Batch rejected, nothing was applied"
+        return jsonify(response), 400 if invalid else 409
+    response["message"] = f"{len(transactions)} transactions added."
+    return jsonify(response)
+
+
+@app.route("/api/import_csv", methods=["POST"])
+def import_csv():
+    # multipart upload: file, plus optional format ('schwab' or 'generic') and columns (JSON {field: header})
+    upload = request.files.get("file")
+    if upload is None:
+        return jsonify({"error": "No CSV file uploaded"}), 400
+    try:
+        columns = json.loads(request.form["columns"]) if request.form.get("columns") else None
+        stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+        return jsonify(manager.import_csv(stream, request.form.get("format"), columns))
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+
 @app.route("/api/transactions/<id>", methods=["DELETE"])
 def delete_trasaction(id):
     manager.remove_transaction(id)
@@ -32,11 +68,35 @@ def get_portfolio_info():
     response = manager.get_portfolio_info()
     return jsonify(response)
 
+def _parse_version(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+@app.route("/api/portfolio/delta", methods=["GET"])
+def get_portfolio_delta():
+    # Only the symbols, lots and totals that changed since the client's version
+    return jsonify(manager.get_portfolio_delta(_parse_version(request.args.get("since"))))
+
+@app.route("/api/portfolio/stream", methods=["GET"])
+def stream_portfolio():
+    # Every client shares one upstream trade feed and one recompute per batch of trades
+    broadcaster = get_broadcaster(manager)
+    deltas = request.args.get("mode") == "delta"
+    since = _parse_version(request.headers.get("Last-Event-ID") or request.args.get("since"))
+    return Response(stream_with_context(broadcaster.events(deltas, since)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route("/api/cache/portfolio", methods=["GET"])
 def get_portfolio_info_from_cache():
     response = manager.get_portfolio_info_from_cache()
     return jsonify(response)
 
+@app.route("/api/metrics/quotes", methods=["GET"])
+def get_quote_metrics():
+    return jsonify({"latency": manager.get_provider_latency(), "cache": manager.get_quote_cache_stats()})
+
 def search_coins(query):
     url = f"https://api.coingecko.com/api/v3/search?query={query}"
     response = requests.get(url, timeout=10)
@@ -0,0 +1,125 @@
+import glob
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume', 'Dividends', 'Stock Splits')
+# Column 0 of every file holds the bar time in epoch seconds
+TIME_COLUMN = 0
+
+
+class PriceStore:
+    """
+    Columnar store for daily OHLCV history, one memory-mapped .npy file per symbol.
+    Each file is a Fortran-ordered float64 matrix [bars x (1 + len(PRICE_COLUMNS))] so that
+    every column, and in particular Close, is contiguous on disk and can be handed out
+    as a read-only view of the mapping without copying or parsing.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self._maps = {}  # {symbol: ((mtime_ns, size, inode), memmap)}
+        self._lock = threading.Lock()
+
+    def path(self, symbol: str) -> str:
+        return os.path.join(self.root, f"{symbol}.npy")
+
+    def exists(self, symbol: str) -> bool:
+        return os.path.exists(self.path(symbol))
+
+    def _matrix(self, symbol: str) -> np.ndarray:
+        """Memory-map the symbol's file, re-mapping only if it was rewritten since the last read"""
+        stat = os.stat(self.path(symbol))
+        # Writes go through os.replace, so a rewrite always brings a new inode, even within the
+        # filesystem's timestamp granularity or after a clock step
+        key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self._lock:
+            cached = self._maps.get(symbol)
+            if cached is None or cached[0] != key:
+                cached = (key, np.load(self.path(symbol), mmap_mode='r'))
+                self._maps[symbol] = cached
+            return cached[1]
+
+    def times(self, symbol: str) -> np.ndarray:
+        return self._matrix(symbol)[:, TIME_COLUMN].astype('datetime64[s]')
+
+    def column(self, symbol: str, name: str = 'Close') -> np.ndarray:
+        """Zero-copy, read-only view of one column"""
+        return self._matrix(symbol)[:, 1 + PRICE_COLUMNS.index(name)]
+
+    def closes(self, symbol: str):
+        """Return (epoch_seconds, close) as views of the mapped file"""
+        matrix = self._matrix(symbol)
+        return matrix[:, TIME_COLUMN], matrix[:, 1 + PRICE_COLUMNS.index('Close')]
+
+    def last_time(self, symbol: str) -> pd.Timestamp:
+        return pd.Timestamp(int(self._matrix(symbol)[-1, TIME_COLUMN]), unit='s')
+
+    def read_frame(self, symbol: str) -> pd.DataFrame:
+        matrix = self._matrix(symbol)
+        index = pd.DatetimeIndex(matrix[:, TIME_COLUMN].astype('datetime64[s]'))
+        return pd.DataFrame(np.asarray(matrix[:, 1:]), index=index, columns=list(PRICE_COLUMNS))
+
+    @staticmethod
+    def _to_matrix(df: pd.DataFrame) -> np.ndarray:
+        """Convert a frame indexed by naive UTC timestamps into the on-disk layout"""
+        matrix = np.empty((len(df), 1 + len(PRICE_COLUMNS)), dtype=np.float64, order='F')
+        matrix[:, TIME_COLUMN] = df.index.values.astype('datetime64[s]').astype(np.int64)
+        for i, name in enumerate(PRICE_COLUMNS, start=1):
+            matrix[:, i] = df[name].to_numpy(dtype=np.float64) if name in df.columns else np.nan
+        return matrix
+
+    def _write_matrix(self, symbol: str, matrix: np.ndarray):
+        tmp_path = f"{self.path(symbol)}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.asfortranarray(matrix))
+        os.replace(tmp_path, self.path(symbol))
+
+    def write(self, symbol: str, df: pd.DataFrame):
+        self._write_matrix(symbol, self._to_matrix(df.sort_index()))
+
+    def append(self, symbol: str, df: pd.DataFrame):
+        """Add bars, replacing any stored bars at or after the first new timestamp"""
+        if df.empty:
+            return
+        new = self._to_matrix(df.sort_index())
+        if not self.exists(symbol):
+            self._write_matrix(symbol, new)
+            return
+        old = self._matrix(symbol)
+        keep = np.searchsorted(old[:, TIME_COLUMN], new[0, TIME_COLUMN], side='left')
+        self._write_matrix(symbol, np.vstack([old[:keep], new]))
+
+    def migrate_json(self, symbol: str, json_path: str):
+        """One-time import of a legacy df.to_json price file"""
+        df = pd.read_json(json_path)
+        if 'Close' not in df.columns:
+            raise ValueError(f"{json_path} is not a price file")
+        df.index = pd.DatetimeIndex(df.index)
+        self.write(symbol, df)
+
+
+def migrate_data_dir(data_dir: str, store: PriceStore) -> list:
+    """Import every legacy data/{symbol}.json price file that is not in the store yet"""
+    migrated = []
+    for json_path in sorted(glob.glob(os.path.join(data_dir, "*.json"))):
+        symbol = os.path.splitext(os.path.basename(json_path))[0]
+        if store.exists(symbol):
+            continue
+        try:
+            store.migrate_json(symbol, json_path)
+        except (ValueError, KeyError, TypeError):
+            # transactions.json, portfolio_cache.json etc. are not price files
+            continue
+        migrated.append(symbol)
+    return migrated
+
+
+if __name__ == '__main__':
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "data"
+    migrated = migrate_data_dir(data_dir, PriceStore(os.path.join(data_dir, "prices")))
+    print(f"Migrated {len(migrated)} symbols: {', '.join(migrated)}")
@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds a quote stays fresh, per asset class. Finnhub's free tier allows 60 calls/minute,
+# so equities are the class worth tuning against the hit/miss counters.
+DEFAULT_TTLS = {
+    'equity': 15.0,
+    'etf': 15.0,
+    'crypto': 30.0,
+    'cash': 300.0,
+}
+
+
+class _Flight:
+    """An upstream call in progress that other callers can wait on"""
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QuoteCache:
+    """
+    In-process quote cache shared by every request handler.
+    - Entries expire after a TTL that depends on the asset class.
+    - The least recently used symbol is evicted once max_entries is reached.
+    - Concurrent misses for the same symbol are coalesced into a single upstream call.
+    - If a refresh fails, the expired (stale) value is served instead of an error.
+    """
+
+    def __init__(self, ttls: dict = None, default_ttl: float = 15.0, max_entries: int = 512,
+                 wait_timeout: float = 30.0, clock=time.monotonic):
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self.clock = clock
+        self._entries = OrderedDict()  # {symbol: (value, fetched_at)}
+        self._inflight = {}  # {symbol: _Flight}
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stale': 0, 'coalesced': 0, 'evictions': 0, 'errors': 0}
+
+    def ttl_for(self, asset_class: str) -> float:
+        return self.ttls.get((asset_class or '').lower(), self.default_ttl)
+
+    def get(self, symbol: str, asset_class: str, loader):
+        """Return the quote for symbol, calling loader() only if no fresh entry exists"""
+        results, errors = self._fetch([symbol], {symbol: asset_class}, lambda missing: {symbol: loader()})
+        if symbol not in results:
+            raise errors[symbol]
+        return results[symbol]
+
+    def get_many(self, symbols, asset_classes: dict, loader) -> dict:
+        """
+        Return {symbol: quote} for every symbol that could be resolved.
+        loader(missing_symbols) is called at most once, with only the symbols that are
+        neither fresh in the cache nor already being fetched by another caller.
+        """
+        return self._fetch(symbols, asset_classes, loader)[0]
+
+    def _fetch(self, symbols, asset_classes: dict, loader):
+        results = {}
+        errors = {}
+        leading = {}
+        following = {}
+        with self._lock:
+            for symbol in symbols:
+                entry = self._entries.get(symbol)
+                if entry is not None:
+                    self._entries.move_to_end(symbol)
+                    if self.clock() - entry[1] <= self.ttl_for(asset_classes.get(symbol)):
+                        self.counters['hits'] += 1
+                        results[symbol] = entry[0]
+                        continue
+                if symbol in self._inflight:
+                    self.counters['coalesced'] += 1
+                    following[symbol] = self._inflight[symbol]
+                    continue
+                self.counters['stale' if entry is not None else 'misses'] += 1
+                leading[symbol] = self._inflight[symbol] = _Flight()
+
+        if leading:
+            self._load(leading, loader)
+        for symbol, flight in leading.items():
+            self._resolve(symbol, flight, results, errors)
+        for symbol, flight in following.items():
+            flight.event.wait(self.wait_timeout)
+            self._resolve(symbol, flight, results, errors)
+        return results, errors
+
+    def _load(self, flights: dict, loader):
+        try:
+            loaded = loader(list(flights))
+            error = None
+        except Exception as e:
+            loaded = {}
+            error = e
+        with self._lock:
+            now = self.clock()
+            for symbol, flight in flights.items():
+                del self._inflight[symbol]
+                if symbol in loaded:
+                    flight.value = loaded[symbol]
+                    self._store(symbol, flight.value, now)
+                else:
+                    self.counters['errors'] += 1
+                    flight.error = error or KeyError(symbol)
+                flight.event.set()
+
+    def _resolve(self, symbol, flight, results, errors):
+        if flight.event.is_set() and flight.error is None:
+            results[symbol] = flight.value
+            return
+        stale = self.peek(symbol)
+        if stale is not None:
+            results[symbol] = stale
+        else:
+            errors[symbol] = flight.error or TimeoutError(f"Timed out waiting for the {symbol} quote")
+
+    def _store(self, symbol, value, now):
+        self._entries[symbol] = (value, now)
+        self._entries.move_to_end(symbol)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def put(self, symbol: str, value):
+        with self._lock:
+            self._store(symbol, value, self.clock())
+
+    def peek(self, symbol: str):
+        """Return the cached quote for symbol regardless of age, or None"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+        return entry[0] if entry is not None else None
+
+    def invalidate(self, symbol: str = None):
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(symbol, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses'] + self.counters['stale'] + self.counters['coalesced']
+            return {
+                **self.counters,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hit_rate': round((self.counters['hits'] + self.counters['coalesced']) / lookups, 4) if lookups else 0.0,
+                'ttls': dict(self.ttls),
+            }
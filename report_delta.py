@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Fields that change on every build and do not by themselves make a new version
+REPORT_META_FIELDS = ('version', 'timestamp')
+
+
+def _diff_lots(old_lots: list, new_lots: list) -> dict:
+    old_by_id = {lot['transactionId']: lot for lot in old_lots}
+    upsert = []
+    for lot in new_lots:
+        if old_by_id.pop(lot['transactionId'], None) != lot:
+            upsert.append(lot)
+    patch = {}
+    if upsert:
+        patch['upsert'] = upsert
+    if old_by_id:
+        patch['remove'] = list(old_by_id)
+    return patch
+
+
+def diff_reports(old: dict, new: dict) -> dict:
+    """
+    Changes that turn the old portfolio report into the new one:
+        totals     changed top-level fields (balance, dayChange, portfolioHighlights, ...)
+        positions  {'upsert': [...], 'remove': [ids]}
+    A new symbol is sent whole. A known symbol only carries its id, the fields that changed, and
+    'lots': {'upsert': [full lots], 'remove': [transactionIds]} when its lots changed.
+    """
+    delta = {}
+    totals = {key: value for key, value in new.items()
+              if key != 'positions' and key not in REPORT_META_FIELDS and old.get(key) != value}
+    if totals:
+        delta['totals'] = totals
+
+    old_positions = {position['id']: position for position in old.get('positions', [])}
+    upsert = []
+    for position in new.get('positions', []):
+        previous = old_positions.pop(position['id'], None)
+        if previous is None:
+            upsert.append(position)
+            continue
+        patch = {key: value for key, value in position.items()
+                 if key != 'purchases' and previous.get(key) != value}
+        lots = _diff_lots(previous.get('purchases', []), position.get('purchases', []))
+        if lots:
+            patch['lots'] = lots
+        if patch:
+            patch['id'] = position['id']
+            upsert.append(patch)
+    positions = {}
+    if upsert:
+        positions['upsert'] = upsert
+    if old_positions:
+        positions['remove'] = list(old_positions)
+    if positions:
+        delta['positions'] = positions
+    return delta
+
+
+class ReportHistory:
+    """
+    Keeps the last few portfolio reports by version so a client can ask for just what changed
+    since the version it holds. The version only moves when the report content changes.
+    Versions start from the wall clock so they never repeat across restarts; a client holding
+    a version this process does not know simply gets the full report.
+    """
+
+    def __init__(self, max_versions: int = 32):
+        self.max_versions = max_versions
+        self.version = int(time.time() * 1000)
+        self._reports = OrderedDict()
+        self._deltas = {}  # since -> delta to the current version
+        self._lock = threading.Lock()
+
+    def publish(self, report: dict) -> int:
+        """Record a freshly built report, stamping it with its version"""
+        with self._lock:
+            latest = self._reports.get(self.version)
+            if latest is None or diff_reports(latest, report):
+                self.version += 1
+                self._deltas.clear()
+            report['version'] = self.version
+            self._reports[self.version] = report
+            self._reports.move_to_end(self.version)
+            while len(self._reports) > self.max_versions:
+                self._reports.popitem(last=False)
+            return self.version
+
+    def latest(self):
+        with self._lock:
+            return self._reports.get(self.version)
+
+    def delta_since(self, since) -> dict:
+        """
+        {'version', 'since', 'timestamp', 'totals'?, 'positions'?}, or {'version', 'full'} when
+        since is missing or too old. Deltas are shared between clients asking from the same version.
+        """
+        with self._lock:
+            current = self._reports.get(self.version)
+            if current is None:
+                return {'version': None, 'full': None}
+            old = self._reports.get(since)
+            if old is None:
+                return {'version': self.version, 'full': current}
+            delta = self._deltas.get(since)
+            if delta is None:
+                delta = diff_reports(old, current) if since != self.version else {}
+                self._deltas[since] = delta
+            return {'version': self.version, 'since': since, 'timestamp': current.get('timestamp'), **delta}
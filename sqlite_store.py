@@ -0,0 +1,352 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from ledger_journal import LedgerJournal
+from lot_store import LotStore
+from price_store import PRICE_COLUMNS, TIME_COLUMN, PriceStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lots (
+    transaction_id TEXT NOT NULL UNIQUE,
+    symbol TEXT NOT NULL,
+    date TEXT,
+    position_type TEXT NOT NULL,
+    quantity REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lots_symbol ON lots (symbol);
+CREATE INDEX IF NOT EXISTS lots_date ON lots (date);
+
+CREATE TABLE IF NOT EXISTS closed_lots (
+    close_id TEXT PRIMARY KEY,
+    transaction_id TEXT,
+    symbol TEXT NOT NULL,
+    open_date TEXT,
+    close_date TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS closed_lots_symbol ON closed_lots (symbol, close_date);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id TEXT PRIMARY KEY,
+    date TEXT,
+    symbol TEXT NOT NULL,
+    action TEXT NOT NULL,
+    quantity REAL NOT NULL,
+    price REAL NOT NULL,
+    company_name TEXT
+);
+CREATE INDEX IF NOT EXISTS transactions_symbol ON transactions (symbol, date);
+
+CREATE TABLE IF NOT EXISTS daily_bars (
+    symbol TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, adj_close REAL, volume REAL, dividends REAL, stock_splits REAL,
+    PRIMARY KEY (symbol, time)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS intraday_bars (
+    symbol TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    close REAL,
+    PRIMARY KEY (symbol, interval, time)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# meta row written once import_data_dir has copied everything over
+IMPORTED_KEY = 'imported_data_dir'
+
+
+BAR_COLUMNS = ('open', 'high', 'low', 'close', 'adj_close', 'volume', 'dividends', 'stock_splits')
+
+
+class SQLiteStore:
+    """
+    Single-file SQLite backend for everything under data/: open and closed lots, the transaction
+    history, daily and intraday bars, and the cached portfolio report.
+
+    For the ledger it has the same interface as LedgerJournal (load / append / compact / version),
+    taking the same 'put' / 'del' / 'close' / 'txn' records, so PortfolioManager can use either.
+    Bars are keyed by (symbol, time) so "closes for these symbols since X" is an index range scan.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        tables = {name for name, in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self._conn.executescript(SCHEMA)
+        if 'lots' in tables and 'meta' not in tables:
+            # Databases from before the meta table were imported when they were created
+            self._conn.execute("INSERT OR IGNORE INTO meta VALUES (?, ?)", (IMPORTED_KEY, json.dumps(True)))
+        self._lock = threading.Lock()
+        self._ledger_writes = 0  # our own ledger commits; PRAGMA data_version only counts other connections'
+
+    def _write(self, statements):
+        """Run [(sql, params or [params, ...]), ...] in one transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    if isinstance(params, list):
+                        self._conn.executemany(sql, params)
+                    else:
+                        self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # Ledger
+
+    def load(self):
+        """Returns (LotStore, closed_lots) in FIFO order"""
+        positions = LotStore()
+        for symbol, data in self._query("SELECT symbol, data FROM lots ORDER BY rowid"):
+            positions.add(symbol, json.loads(data))
+        closed_lots = [json.loads(data) for data, in self._query("SELECT data FROM closed_lots ORDER BY rowid")]
+        return positions, closed_lots
+
+    @staticmethod
+    def _lot_row(symbol, lot):
+        return (lot['transactionId'], symbol, lot.get('date'), lot['position_type'], lot['quantity'], json.dumps(lot))
+
+    @staticmethod
+    def _closed_row(closed, position=None):
+        # Closed lots written before closeId existed are keyed by their place in the list
+        close_id = closed.get('closeId') or f"{closed['transactionId']}:{position}"
+        return (close_id, closed['transactionId'], closed['symbol'], closed.get('open_date'), closed.get('close_date'), json.dumps(closed))
+
+    def append(self, records):
+        if not records:
+            return
+        statements = []
+        for record in records:
+            op = record['op']
+            if op == 'put':
+                # Upsert keeps the rowid, and with it the lot's FIFO position
+                statements.append(("INSERT INTO lots (transaction_id, symbol, date, position_type, quantity, data) "
+                                   "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (transaction_id) DO UPDATE SET "
+                                   "quantity = excluded.quantity, data = excluded.data",
+                                   self._lot_row(record['symbol'], record['lot'])))
+            elif op == 'del':
+                statements.append(("DELETE FROM lots WHERE transaction_id = ?", (record['id'],)))
+            elif op == 'close':
+                statements.append(("INSERT OR IGNORE INTO closed_lots VALUES (?, ?, ?, ?, ?, ?)", self._closed_row(record['lot'])))
+            elif op == 'txn':
+                txn = record['transaction']
+                statements.append(("INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   (txn['transaction_id'], txn['date'], txn['symbol'], txn['action'],
+                                    txn['quantity'], txn['price'], txn['company_name'])))
+        self._write(statements)
+        self._ledger_writes += 1
+
+    def needs_compaction(self) -> bool:
+        return False
+
+    def compact(self, positions: dict, closed_lots: list):
+        """Replace the whole ledger"""
+        self._write([
+            ("DELETE FROM lots", ()),
+            ("DELETE FROM closed_lots", ()),
+            ("INSERT INTO lots (transaction_id, symbol, date, position_type, quantity, data) VALUES (?, ?, ?, ?, ?, ?)",
+             [self._lot_row(symbol, lot) for symbol, lots in positions.items() for lot in lots]),
+            ("INSERT OR IGNORE INTO closed_lots VALUES (?, ?, ?, ?, ?, ?)",
+             [self._closed_row(closed, position) for position, closed in enumerate(closed_lots)]),
+        ])
+        self._ledger_writes += 1
+
+    def version(self):
+        return self._query("PRAGMA data_version")[0][0], self._ledger_writes
+
+    def sync(self):
+        pass
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def transactions(self, symbol: str = None, since: str = None) -> list:
+        sql = "SELECT transaction_id, date, symbol, action, quantity, price, company_name FROM transactions"
+        where, params = [], []
+        if symbol is not None:
+            where.append("symbol = ?")
+            params.append(symbol)
+        if since is not None:
+            where.append("date >= ?")
+            params.append(since)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        keys = ('transaction_id', 'date', 'symbol', 'action', 'quantity', 'price', 'company_name')
+        return [dict(zip(keys, row)) for row in self._query(sql + " ORDER BY date", params)]
+
+    # Cached report
+
+    def put_cache(self, key: str, value):
+        self._write([("INSERT OR REPLACE INTO cache VALUES (?, ?)", (key, json.dumps(value)))])
+
+    def get_cache(self, key: str, default=None):
+        rows = self._query("SELECT value FROM cache WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else default
+
+    def put_meta(self, key: str, value):
+        self._write([("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))])
+
+    def get_meta(self, key: str, default=None):
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else default
+
+    # Daily bars
+
+    def write_bars(self, symbol: str, matrix: np.ndarray, since: int = None):
+        """Store PriceStore-layout rows, replacing the symbol's bars (from `since` onwards if given)"""
+        delete = ("DELETE FROM daily_bars WHERE symbol = ?", (symbol,)) if since is None else \
+                 ("DELETE FROM daily_bars WHERE symbol = ? AND time >= ?", (symbol, int(since)))
+        rows = [(symbol, int(row[TIME_COLUMN]), *(None if np.isnan(v) else float(v) for v in row[1:])) for row in matrix]
+        self._write([delete, (f"INSERT INTO daily_bars VALUES (?, ?, {', '.join('?' * len(BAR_COLUMNS))})", rows)])
+
+    def bar_matrix(self, symbol: str, since: int = None, columns=BAR_COLUMNS) -> np.ndarray:
+        sql = f"SELECT time, {', '.join(columns)} FROM daily_bars WHERE symbol = ?"
+        params = [symbol]
+        if since is not None:
+            sql += " AND time >= ?"
+            params.append(int(since))
+        rows = self._query(sql + " ORDER BY time", params)
+        return np.array(rows, dtype=np.float64).reshape(len(rows), 1 + len(columns))
+
+    def closes(self, symbols, since: int = None) -> dict:
+        """{symbol: (epoch_seconds, close)} for each symbol, optionally only bars at or after `since`"""
+        result = {}
+        for symbol in symbols:
+            matrix = self.bar_matrix(symbol, since, ('close',))
+            result[symbol] = (matrix[:, 0], matrix[:, 1])
+        return result
+
+    def last_bar_time(self, symbol: str):
+        return self._query("SELECT MAX(time) FROM daily_bars WHERE symbol = ?", (symbol,))[0][0]
+
+    # Intraday bars
+
+    def write_intraday(self, symbol: str, interval: str, seconds, closes):
+        rows = [(symbol, interval, int(t), float(c)) for t, c in zip(seconds, closes)]
+        self._write([("INSERT OR REPLACE INTO intraday_bars VALUES (?, ?, ?, ?)", rows)])
+
+    def intraday(self, symbol: str, interval: str, start: int, end: int):
+        """(epoch_seconds, closes) of bars in [start, end)"""
+        rows = self._query("SELECT time, close FROM intraday_bars WHERE symbol = ? AND interval = ? AND time >= ? AND time < ? "
+                           "ORDER BY time", (symbol, interval, int(start), int(end)))
+        matrix = np.array(rows, dtype=np.float64).reshape(len(rows), 2)
+        return matrix[:, 0].astype(np.int64), matrix[:, 1]
+
+    def has_intraday(self, symbol: str, interval: str, start: int, end: int) -> bool:
+        return bool(self._query("SELECT 1 FROM intraday_bars WHERE symbol = ? AND interval = ? AND time >= ? AND time < ? LIMIT 1",
+                                (symbol, interval, int(start), int(end))))
+
+
+class SQLitePriceStore:
+    """The PriceStore interface PortfolioManager uses, backed by SQLiteStore's daily_bars table"""
+
+    def __init__(self, store: SQLiteStore):
+        self.store = store
+
+    def exists(self, symbol: str) -> bool:
+        return self.store.last_bar_time(symbol) is not None
+
+    def closes(self, symbol: str):
+        return self.store.closes([symbol])[symbol]
+
+    def column(self, symbol: str, name: str = 'Close') -> np.ndarray:
+        return self.store.bar_matrix(symbol, columns=(BAR_COLUMNS[PRICE_COLUMNS.index(name)],))[:, 1]
+
+    def times(self, symbol: str) -> np.ndarray:
+        return self.store.bar_matrix(symbol, columns=())[:, 0].astype('datetime64[s]')
+
+    def last_time(self, symbol: str) -> pd.Timestamp:
+        return pd.Timestamp(int(self.store.last_bar_time(symbol)), unit='s')
+
+    def read_frame(self, symbol: str) -> pd.DataFrame:
+        matrix = self.store.bar_matrix(symbol)
+        index = pd.DatetimeIndex(matrix[:, TIME_COLUMN].astype(np.int64).astype('datetime64[s]'))
+        return pd.DataFrame(matrix[:, 1:], index=index, columns=list(PRICE_COLUMNS))
+
+    def write(self, symbol: str, df: pd.DataFrame):
+        self.store.write_bars(symbol, PriceStore._to_matrix(df.sort_index()))
+
+    def append(self, symbol: str, df: pd.DataFrame):
+        """Add bars, replacing any stored bars at or after the first new timestamp"""
+        if df.empty:
+            return
+        matrix = PriceStore._to_matrix(df.sort_index())
+        self.store.write_bars(symbol, matrix, since=matrix[0, TIME_COLUMN])
+
+    def migrate_json(self, symbol: str, json_path: str):
+        df = pd.read_json(json_path)
+        if 'Close' not in df.columns:
+            raise ValueError(f"{json_path} is not a price file")
+        df.index = pd.DatetimeIndex(df.index)
+        self.write(symbol, df)
+
+
+def import_data_dir(data_dir: str, store: SQLiteStore) -> dict:
+    """
+    Copy an existing file-based data/ directory into the database: the ledger (snapshot plus
+    journal), daily bars from data/prices or the legacy {symbol}.json files, and the cached report.
+    Every step replaces what it writes, so an import that failed part way can simply be run again;
+    the IMPORTED_KEY meta row is only written once all of them have committed.
+    """
+    journal = LedgerJournal(os.path.join(data_dir, "transactions.journal"), os.path.join(data_dir, "transactions.json"),
+                            os.path.join(data_dir, "closed_lots.json"))
+    positions, closed_lots = journal.load()
+    store.compact(positions.to_dict(), closed_lots)
+
+    prices = SQLitePriceStore(store)
+    file_store = PriceStore(os.path.join(data_dir, "prices"))
+    imported = []
+    candidates = {os.path.splitext(name)[0] for name in os.listdir(file_store.root) if name.endswith('.npy')}
+    candidates |= {os.path.splitext(name)[0] for name in os.listdir(data_dir) if name.endswith('.json')}
+    for symbol in sorted(candidates):
+        try:
+            if file_store.exists(symbol):
+                prices.write(symbol, file_store.read_frame(symbol))
+            else:
+                prices.migrate_json(symbol, os.path.join(data_dir, f"{symbol}.json"))
+        except (ValueError, KeyError, TypeError):
+            # transactions.json, portfolio_cache.json etc. are not price files
+            continue
+        imported.append(symbol)
+
+    cache_path = os.path.join(data_dir, "portfolio_cache.json")
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            store.put_cache('portfolio', json.load(f))
+    store.put_meta(IMPORTED_KEY, True)
+    return {'lots': positions.lot_count(), 'closed_lots': len(closed_lots), 'symbols': imported}
+
+
+if __name__ == '__main__':
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "data"
+    summary = import_data_dir(data_dir, SQLiteStore(os.path.join(data_dir, "portfolio.db")))
+    print(f"Imported {summary['lots']} lots, {summary['closed_lots']} closed lots and "
+          f"{len(summary['symbols'])} symbols: {', '.join(summary['symbols'])}")
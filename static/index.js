@@ -749,34 +749,144 @@ function submitNewTransaction(event) {
   closeNewTransactionModal();
 }
 
-// Function to fetch data and render, which will be called repeatedly
-async function pollInvestments() {
-  console.log("Fetching investments..."); // For debugging
-  const apiData =
-    investments.length < 1
-      ? await fetchPortfolioDataOnFirstLoad()
-      : await fetchDataFromAPI();
-  if (apiData.positions.length > 0) {
-    // Only update if data was successfully fetched
+// Version of the report the page currently shows, used to ask the server for deltas
+let portfolioVersion = null;
+
+// Re-render everything that depends on the portfolio report
+function renderPortfolio() {
+  calculateInvestmentAggregates(); // Recalculate aggregates for new API data
+  renderInvestments(); // Re-render the list with updated data
+  render401kBalance(); // Update 401k balance as well
+  renderPortfolioHighlights(); // Update portfolio highlights
+}
+
+// Render a full portfolio report from the API
+function applyPortfolioData(apiData) {
+  if (apiData && Array.isArray(apiData.positions)) {
     // Clear the existing sample data and populate with API data
-    console.log(apiData.positions);
-    console.log(apiData);
     investments.splice(0, investments.length, ...apiData.positions); // Add all fetched data
     four01kData = apiData;
-    calculateInvestmentAggregates(); // Recalculate aggregates for new API data
-    renderInvestments(); // Re-render the list with updated data
-    render401kBalance(); // Update 401k balance as well
-    renderPortfolioHighlights(); // Update portfolio highlights
+    portfolioVersion = apiData.version ?? null;
+    renderPortfolio();
+  }
+}
+
+// Patch a symbol's lots in place: changed lots replace the old ones by transactionId
+function applyLotPatch(investment, lots) {
+  if (lots.remove) {
+    const removed = new Set(lots.remove);
+    investment.purchases = investment.purchases.filter(
+      (lot) => !removed.has(lot.transactionId)
+    );
+  }
+  (lots.upsert || []).forEach((lot) => {
+    const index = investment.purchases.findIndex(
+      (existing) => existing.transactionId === lot.transactionId
+    );
+    if (index === -1) {
+      investment.purchases.push(lot);
+    } else {
+      investment.purchases[index] = lot;
+    }
+  });
+}
+
+/**
+ * Applies a delta from /api/portfolio/delta or the delta stream to the current data in place.
+ * Returns false when the delta does not start from the version we hold, so the caller can resync.
+ */
+function applyPortfolioDelta(delta) {
+  if (delta.full) {
+    applyPortfolioData(delta.full);
+    return true;
   }
-  // Schedule the next fetch after 10 seconds (10000 milliseconds)
-  // This ensures the next call starts 10 seconds *after the current one finishes*
+  if (delta.since !== portfolioVersion) {
+    return false;
+  }
+  portfolioVersion = delta.version;
+  Object.assign(four01kData, delta.totals || {});
+  four01kData.timestamp = delta.timestamp;
+  const positions = delta.positions || {};
+  if (!delta.totals && !positions.upsert && !positions.remove) {
+    render401kBalance(); // Only the timestamp moved
+    return true;
+  }
+  if (positions.remove) {
+    const removed = new Set(positions.remove);
+    for (let i = investments.length - 1; i >= 0; i--) {
+      if (removed.has(investments[i].id)) investments.splice(i, 1);
+    }
+  }
+  (positions.upsert || []).forEach((patch) => {
+    const investment = investments.find((item) => item.id === patch.id);
+    if (!investment) {
+      investments.push(patch); // New symbol, sent whole
+      return;
+    }
+    const { lots, ...fields } = patch;
+    Object.assign(investment, fields);
+    if (lots) applyLotPatch(investment, lots);
+  });
+  renderPortfolio();
+  return true;
+}
+
+// Ask for whatever changed since the version we hold
+async function fetchPortfolioDelta(since) {
+  const query = since === null ? "" : `?since=${since}`;
+  const response = await fetch(`api/portfolio/delta${query}`);
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  return response.json();
+}
+
+// Fallback for browsers without EventSource: fetch deltas and render, which will be called repeatedly
+async function pollInvestments() {
+  console.log("Fetching investments..."); // For debugging
+  try {
+    if (investments.length < 1) {
+      applyPortfolioData(await fetchPortfolioDataOnFirstLoad());
+    }
+    if (!applyPortfolioDelta(await fetchPortfolioDelta(portfolioVersion))) {
+      applyPortfolioDelta(await fetchPortfolioDelta(null));
+    }
+  } catch (error) {
+    console.error("Error fetching portfolio changes:", error);
+  }
+  // This ensures the next call starts 20 seconds *after the current one finishes*
   setTimeout(pollInvestments, 20000);
 }
 
+// Show the cached report straight away, then let the server push what changes whenever trades come in
+async function startLiveInvestments() {
+  if (!window.EventSource) {
+    pollInvestments();
+    return;
+  }
+  applyPortfolioData(await fetchPortfolioDataOnFirstLoad());
+  let source = null;
+  const connect = (since) => {
+    const query = since === null ? "" : `&since=${since}`;
+    source = new EventSource(`/api/portfolio/stream?mode=delta${query}`);
+    source.onmessage = (event) => {
+      if (!applyPortfolioDelta(JSON.parse(event.data))) {
+        // Out of step with the server: start over from a full report
+        source.close();
+        portfolioVersion = null;
+        connect(null);
+      }
+    };
+    // EventSource reconnects on its own and resumes from the last event id
+    source.onerror = (error) => console.error("Portfolio stream interrupted:", error);
+  };
+  connect(portfolioVersion);
+}
+
 // Initial render when the DOM is fully loaded
 document.addEventListener("DOMContentLoaded", () => {
-  // Start the polling process when the page loads
-  pollInvestments();
+  // Start live updates when the page loads
+  startLiveInvestments();
 
   // Attach event listeners to gain view dropdown button
   document
@@ -0,0 +1,101 @@
+"""
+CoinGecko batching against a local fake server: one /simple/price request per refresh carries
+every crypto and cash id, and the group falls back to stored closes when the call fails.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+import pytest
+
+import portfolio_manager
+from quote_cache import QuoteCache
+
+STORED_CLOSES = {'BTC-USD': 40_000.0, 'ETH-USD': 2_000.0, 'USDT-USD': 1.0}
+HOLDINGS = (('BTC-USD', 'Bitcoin', 'CRYPTO'), ('ETH-USD', 'Ethereum', 'CRYPTO'), ('USDT-USD', 'Tether', 'CASH'))
+
+
+class FakeCoinGecko(BaseHTTPRequestHandler):
+    # Set per test: (status, body) to answer with
+    response = (200, b'{}')
+    requests = []
+
+    def do_GET(self):
+        FakeCoinGecko.requests.append(self.path)
+        status, body = FakeCoinGecko.response
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(('127.0.0.1', 0), FakeCoinGecko)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    FakeCoinGecko.requests = []
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def manager(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(portfolio_manager, 'COINGECKO_API_URL', f'http://127.0.0.1:{server.server_port}/api/v3')
+    monkeypatch.setattr(portfolio_manager, 'quote_cache', QuoteCache())
+    monkeypatch.setattr(portfolio_manager.PortfolioManager, '_needs_top_up', lambda self, symbol: False)
+    manager = portfolio_manager.PortfolioManager(data_dir=str(tmp_path))
+    manager.portfolio.verbose = False
+    index = pd.DatetimeIndex([pd.Timestamp('2024-01-02'), pd.Timestamp('2024-01-03')])
+    for symbol, name, security_type in HOLDINGS:
+        manager.portfolio.buy(symbol, 1, STORED_CLOSES[symbol], '2024-01-02', name, security_type)
+        bars = pd.DataFrame({column: [STORED_CLOSES[symbol]] * 2 for column in ('Open', 'High', 'Low', 'Close')}, index=index)
+        manager.price_store.write(symbol, bars)
+    return manager
+
+
+def closes(quotes):
+    return {symbol: quote[0]['Close'] for symbol, quote in quotes.items()}
+
+
+def test_one_request_carries_every_id(manager):
+    FakeCoinGecko.response = (200, json.dumps({'bitcoin': {'usd': 50_000}, 'ethereum': {'usd': 2_500},
+                                               'tether': {'usd': 1.001}}).encode())
+    quotes = manager.get_latest_crypto_prices(['BTC-USD', 'ETH-USD', 'USDT-USD'])
+    assert len(FakeCoinGecko.requests) == 1
+    request = urlparse(FakeCoinGecko.requests[0])
+    assert request.path == '/api/v3/simple/price'
+    assert set(parse_qs(request.query)['ids'][0].split(',')) == {'bitcoin', 'ethereum', 'tether'}
+    assert closes(quotes) == {'BTC-USD': 50_000, 'ETH-USD': 2_500, 'USDT-USD': 1.001}
+
+    # Still fresh: no second request
+    manager.get_latest_crypto_prices(['BTC-USD', 'ETH-USD', 'USDT-USD'])
+    assert len(FakeCoinGecko.requests) == 1
+
+
+@pytest.mark.parametrize('response', [(503, b'{"error": "busy"}'), (200, b'<html>not json'), (200, b'[1, 2]'), (200, b'{"bitcoin": "n/a", "ethereum": {"usd": null}}')])
+def test_group_falls_back_to_stored_closes(manager, response):
+    FakeCoinGecko.response = response
+    quotes = manager.get_latest_crypto_prices(['BTC-USD', 'ETH-USD', 'USDT-USD'])
+    assert len(FakeCoinGecko.requests) == 1
+    assert closes(quotes) == STORED_CLOSES
+
+
+def test_id_missing_from_response_falls_back_alone(manager):
+    FakeCoinGecko.response = (200, json.dumps({'bitcoin': {'usd': 50_000}}).encode())
+    quotes = manager.get_latest_crypto_prices(['BTC-USD', 'ETH-USD', 'USDT-USD'])
+    assert closes(quotes) == {'BTC-USD': 50_000, 'ETH-USD': 2_000.0, 'USDT-USD': 1.0}
+
+
+def test_symbols_left_out_of_the_batch_fall_back_to_stored_closes(manager, monkeypatch):
+    # What the batch returns when its load failed and nothing was cached yet
+    monkeypatch.setattr(manager, 'get_latest_crypto_prices', lambda tickers: {})
+    quotes = manager.get_realtime_quotes(['BTC-USD', 'ETH-USD', 'USDT-USD'])
+    assert closes(quotes) == STORED_CLOSES
@@ -0,0 +1,34 @@
+"""
+A failed quote falls back to stored closes and leaves the price top-up to one background worker,
+queued once per symbol, so the quote pool stays free for quotes.
+"""
+import threading
+
+import pandas as pd
+
+import portfolio_manager
+from quote_cache import QuoteCache
+
+
+def test_top_ups_run_off_the_quote_pool_once_per_symbol(tmp_path, monkeypatch):
+    monkeypatch.setattr(portfolio_manager, 'quote_cache', QuoteCache())
+    monkeypatch.setattr(portfolio_manager.PortfolioManager, '_refresh_coin_ids', lambda self: None)
+    manager = portfolio_manager.PortfolioManager(data_dir=str(tmp_path))
+    index = pd.DatetimeIndex([pd.Timestamp('2024-01-02'), pd.Timestamp('2024-01-03')])
+    manager.price_store.write('AAPL', pd.DataFrame({column: [100.0, 101.0] for column in ('Open', 'High', 'Low', 'Close')},
+                                                   index=index))
+    release, calls = threading.Event(), []
+
+    def slow_download(symbol, period="5y"):
+        calls.append((symbol, threading.current_thread().name))
+        release.wait(5)
+
+    monkeypatch.setattr(manager, '_ensure_price_data', slow_download)
+    for _ in range(5):
+        quote, _ = manager._get_fallback_quote('AAPL')
+        assert quote == {'Close': 101.0, 'previous_close_price': 100.0}
+    manager._get_fallback_quote('MSFT')
+    release.set()
+    manager.top_up_executor.shutdown(wait=True)
+    assert sorted(symbol for symbol, _ in calls) == ['AAPL', 'MSFT']
+    assert all(name.startswith('top-up') for _, name in calls)
@@ -0,0 +1,23 @@
+import numpy as np
+
+import equity_engine
+
+
+def test_holiday_dropped_but_large_sale_kept():
+    # Symbol 0 lists on day 1 and has no bar on day 3; 90% of it is sold on day 4
+    prices = np.array([[0, 10], [100, 10], [100, 10], [0, 10], [100, 10]], dtype=float)
+    holdings = np.array([[1, 1], [1, 1], [1, 1], [1, 1], [0.1, 1]], dtype=float)
+    assert equity_engine.holiday_mask(prices, holdings).tolist() == [True, True, True, False, True]
+
+
+def test_missing_bar_of_a_symbol_not_held_is_not_a_holiday():
+    prices = np.array([[100, 10], [0, 11], [100, 12]], dtype=float)
+    holdings = np.array([[0, 1], [0, 1], [1, 1]], dtype=float)
+    assert equity_engine.holiday_mask(prices, holdings).all()
+
+
+def test_tail_of_the_calendar_counts_history_before_it():
+    prices = np.array([[0, 10], [100, 10]], dtype=float)
+    holdings = np.ones(2)
+    assert equity_engine.holiday_mask(prices, holdings).tolist() == [True, True]
+    assert equity_engine.holiday_mask(prices, holdings, np.array([True, False])).tolist() == [False, True]
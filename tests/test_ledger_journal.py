@@ -0,0 +1,137 @@
+"""
+The ledger's persistence, on both storage backends: replaying the journal over the snapshot rebuilds the ledger the manager
+had, compaction folds the journal into the snapshot without changing it, and a torn last record
+from a crash is dropped and cut off the file.
+"""
+import io
+import json
+import os
+
+import pytest
+
+import portfolio_manager
+from ledger_journal import LedgerJournal
+
+CSV = """date,action,symbol,quantity,price,company_name,type
+2024-02-01,buy,MSFT,4,400,MICROSOFT CORP,Equity
+2024-02-02,sell,MSFT,1,410,,
+2024-02-05,short,TSLA,3,190,TESLA INC,Equity
+"""
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    monkeypatch.setattr(portfolio_manager.PortfolioManager, '_refresh_coin_ids', lambda self: None)
+
+
+def make_manager(data_dir, **kwargs):
+    manager = portfolio_manager.PortfolioManager(data_dir=str(data_dir), **kwargs)
+    manager.portfolio.verbose = False
+    return manager
+
+
+def trade(manager):
+    """Every way the routes change the ledger"""
+    manager.add_transaction('AAPL', 10, 150.0, '2024-01-02', 'APPLE INC', 'Equity', 'buy')
+    manager.add_transaction('AAPL', 5, 160.0, '2024-01-03', 'APPLE INC', 'Equity', 'buy')
+    manager.add_transaction('AAPL', 12, 170.0, '2024-01-04', action='sell')
+    manager.add_transaction('NVDA', 8, 500.0, '2024-01-05', 'NVIDIA CORP', 'Equity', 'short')
+    manager.add_transaction('NVDA', 3, 450.0, '2024-01-08', action='cover')
+    result = manager.add_transactions([
+        {'action': 'buy', 'symbol': 'BTC-USD', 'quantity': 0.5, 'cost_basis': 40_000.0, 'date': '2024-01-09',
+         'company_name': 'BITCOIN', 'type': 'CRYPTO'},
+        {'action': 'buy', 'symbol': 'GOOG', 'quantity': 7, 'cost_basis': 140.0, 'date': '2024-01-10',
+         'company_name': 'ALPHABET INC', 'type': 'Equity'},
+    ])
+    assert result['applied']
+    manager.import_csv(io.StringIO(CSV), 'generic')
+    manager.remove_transaction(result['results'][1]['transaction_id'])
+
+
+def ledger(manager):
+    return manager.portfolio.get_positions().to_dict(), manager.portfolio.get_closed_lots()
+
+
+@pytest.mark.parametrize('storage', ['files', 'sqlite'])
+def test_restart_replays_the_same_ledger(tmp_path, storage):
+    manager = make_manager(tmp_path, storage=storage)
+    trade(manager)
+    before = ledger(manager)
+    assert set(before[0]) == {'AAPL', 'NVDA', 'BTC-USD', 'MSFT', 'TSLA'} and len(before[1]) >= 3
+    manager.journal.close()
+    if storage == 'files':
+        assert os.path.getsize(tmp_path / 'transactions.journal') > 0
+    assert ledger(make_manager(tmp_path, storage=storage)) == before
+
+
+def test_backends_store_the_same_ledger(tmp_path):
+    ledgers = []
+    for storage in ('files', 'sqlite'):
+        manager = make_manager(tmp_path / storage, storage=storage)
+        trade(manager)
+        manager.journal.close()
+        ledgers.append(ledger(make_manager(tmp_path / storage, storage=storage)))
+    files, sqlite = ledgers
+    # Transaction ids are random; everything else about each lot must match
+    assert strip_ids(files) == strip_ids(sqlite)
+
+
+def strip_ids(ledger):
+    positions, closed_lots = ledger
+    drop = ('transactionId', 'closeId')
+    return ({symbol: [{k: v for k, v in lot.items() if k not in drop} for lot in lots] for symbol, lots in positions.items()},
+            [{k: v for k, v in closed.items() if k not in drop} for closed in closed_lots])
+
+
+def test_compaction_keeps_the_ledger(tmp_path):
+    manager = make_manager(tmp_path)
+    manager.journal.compact_after = 3
+    trade(manager)
+    before = ledger(manager)
+    manager.journal.close()
+    # Compacted at least once on the way, and replaying what is left still gives the same ledger
+    with open(tmp_path / 'transactions.json') as f:
+        assert json.load(f)
+    assert manager.journal.records < 3
+    assert ledger(make_manager(tmp_path)) == before
+
+    manager.journal.compact(*before)
+    assert os.path.getsize(tmp_path / 'transactions.journal') == 0
+    assert ledger(make_manager(tmp_path)) == before
+
+
+def test_replaying_records_already_in_the_snapshot_is_harmless(tmp_path):
+    journal = LedgerJournal(str(tmp_path / 'j'), str(tmp_path / 's.json'), str(tmp_path / 'c.json'))
+    lot = {'transactionId': 't1', 'date': '2024-01-02', 'quantity': 5, 'cost_basis': 10.0, 'position_type': 'long'}
+    closed = {'transactionId': 't0', 'closeId': 'c0', 'symbol': 'AAPL', 'quantity': 1}
+    records = [{'op': 'put', 'symbol': 'AAPL', 'lot': lot}, {'op': 'close', 'lot': closed}]
+    journal.append(records)
+    positions, closed_lots = journal.load()
+    # A crash between writing the snapshot and truncating the journal
+    journal._write_atomic(journal.snapshot_path, positions.to_dict())
+    journal._write_atomic(journal.closed_lots_path, closed_lots)
+    journal.close()
+    replayed, replayed_closed = LedgerJournal(journal.journal_path, journal.snapshot_path, journal.closed_lots_path).load()
+    assert replayed.to_dict() == positions.to_dict() == {'AAPL': [lot]}
+    assert replayed_closed == closed_lots == [closed]
+
+
+def test_torn_last_record_is_dropped_and_truncated(tmp_path):
+    manager = make_manager(tmp_path)
+    trade(manager)
+    before = ledger(manager)
+    manager.journal.close()
+    path = tmp_path / 'transactions.journal'
+    size = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        # A crash half way through writing the next record
+        f.write(b'{"op":"put","symbol":"AAPL","lot":{"transactionId":"x"')
+
+    restarted = make_manager(tmp_path)
+    assert ledger(restarted) == before
+    assert os.path.getsize(path) == size
+    # New records go after the last whole one
+    restarted.add_transaction('AMZN', 2, 180.0, '2024-03-01', 'AMAZON.COM INC', 'Equity', 'buy')
+    after = ledger(restarted)
+    restarted.journal.close()
+    assert ledger(make_manager(tmp_path)) == after
@@ -0,0 +1,197 @@
+"""
+TradeStream and PortfolioBroadcaster against a local fake Finnhub WebSocket: subscriptions follow
+set_symbols, a burst of trades costs one recompute, a dropped connection is retried with backoff,
+slow subscribers only ever hold the newest report, and nothing runs while nobody is subscribed.
+"""
+import json
+import socket
+import threading
+import time
+
+import pytest
+from websockets.sync.server import serve
+
+import live_stream
+
+
+class FakeFinnhub:
+    """Records what clients send; each connection can be handed trades or dropped"""
+
+    def __init__(self, drop_after=None):
+        self.drop_after = drop_after  # drop every connection this many seconds after it opens
+        self.received = []
+        self.connected_at = []
+        self.connections = []
+        self._lock = threading.Lock()
+        self.server = serve(self._handle, '127.0.0.1', 0)
+        self.url = f"ws://127.0.0.1:{self.server.socket.getsockname()[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _handle(self, connection):
+        with self._lock:
+            self.connected_at.append(time.monotonic())
+            self.connections.append(connection)
+        deadline = None if self.drop_after is None else time.monotonic() + self.drop_after
+        while deadline is None or time.monotonic() < deadline:
+            try:
+                message = connection.recv(timeout=0.05)
+            except TimeoutError:
+                continue
+            except Exception:
+                return
+            with self._lock:
+                self.received.append(json.loads(message))
+        # Drop it the way a failing upstream would, without a closing handshake
+        connection.socket.shutdown(socket.SHUT_RDWR)
+
+    def messages(self):
+        with self._lock:
+            return list(self.received)
+
+    def send_trades(self, trades):
+        with self._lock:
+            connection = self.connections[-1]
+        connection.send(json.dumps({'type': 'trade', 'data': [{'s': s, 'p': p, 't': t} for s, p, t in trades]}))
+
+    def close(self):
+        self.server.shutdown()
+
+
+class FakeManager:
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.trades = []
+        self.recomputes = 0
+
+    def apply_trade(self, symbol, price, at):
+        self.trades.append((symbol, price, at))
+
+    def get_streamable_symbols(self):
+        return self.symbols
+
+    def get_portfolio_info(self):
+        self.recomputes += 1
+        return {'version': self.recomputes}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def finnhub(monkeypatch):
+    server = FakeFinnhub()
+    monkeypatch.setattr(live_stream, 'FINNHUB_WS_URL', server.url)
+    yield server
+    server.close()
+
+
+def test_set_symbols_sends_only_the_difference(finnhub):
+    stream = live_stream.TradeStream('token', lambda trades: None)
+    stream.set_symbols(['MSFT', 'AAPL'])
+    stream.start()
+    try:
+        wait_for(lambda: len(finnhub.messages()) == 2)
+        stream.set_symbols(['MSFT', 'TSLA'])
+        wait_for(lambda: len(finnhub.messages()) == 4)
+        stream.set_symbols(['MSFT', 'TSLA'])
+        time.sleep(0.2)
+    finally:
+        stream.stop()
+    assert finnhub.messages() == [
+        {'type': 'subscribe', 'symbol': 'AAPL'},
+        {'type': 'subscribe', 'symbol': 'MSFT'},
+        {'type': 'subscribe', 'symbol': 'TSLA'},
+        {'type': 'unsubscribe', 'symbol': 'AAPL'},
+    ]
+
+
+def test_burst_of_trades_is_one_recompute(finnhub, monkeypatch):
+    monkeypatch.setattr(live_stream, 'LIVE_BATCH_SECONDS', 0.3)
+    manager = FakeManager(['AAPL'])
+    broadcaster = live_stream.PortfolioBroadcaster(manager, token='token').start()
+    broadcaster.subscribe()
+    try:
+        wait_for(lambda: manager.recomputes == 1 and finnhub.messages())
+        for i in range(20):
+            finnhub.send_trades([('AAPL', 100.0 + i, i)])
+        wait_for(lambda: len(manager.trades) == 20)
+        time.sleep(live_stream.LIVE_BATCH_SECONDS * 2)
+    finally:
+        broadcaster.stop()
+    assert manager.recomputes == 2
+    assert manager.trades[-1] == ('AAPL', 119.0, 19)
+
+
+def test_latest_trade_per_symbol_in_a_message(finnhub):
+    received = []
+    stream = live_stream.TradeStream('token', received.append)
+    stream.start()
+    try:
+        wait_for(lambda: finnhub.connections)
+        finnhub.send_trades([('AAPL', 101.0, 2), ('AAPL', 100.0, 1), ('MSFT', 300.0, 1)])
+        wait_for(lambda: received)
+    finally:
+        stream.stop()
+    assert received == [{'AAPL': (101.0, 2), 'MSFT': (300.0, 1)}]
+
+
+def test_reconnects_with_backoff_and_resubscribes(monkeypatch):
+    server = FakeFinnhub(drop_after=0.05)
+    monkeypatch.setattr(live_stream, 'RECONNECT_INITIAL_BACKOFF_SECONDS', 0.1)
+    stream = live_stream.TradeStream('token', lambda trades: None, url=server.url)
+    stream.set_symbols(['AAPL'])
+    stream.start()
+    try:
+        wait_for(lambda: len(server.connected_at) >= 4)
+    finally:
+        stream.stop()
+        server.close()
+    gaps = [b - a for a, b in zip(server.connected_at, server.connected_at[1:])]
+    # 0.2, 0.4, 0.8 s of backoff on top of the time each connection stayed up
+    assert gaps[0] >= 0.2 and gaps[1] >= 0.4 and gaps[2] >= 0.8
+    assert gaps[1] > gaps[0] and gaps[2] > gaps[1]
+    # Every new connection subscribes again
+    assert server.messages().count({'type': 'subscribe', 'symbol': 'AAPL'}) >= 3
+
+
+def test_slow_subscriber_only_gets_the_newest_report():
+    broadcaster = live_stream.PortfolioBroadcaster(FakeManager([]))
+    slow = broadcaster.subscribe()
+    for version in range(1, 6):
+        broadcaster._publish(version, json.dumps({'version': version}))
+    assert slow.get_nowait() == (5, '{"version": 5}')
+    assert slow.empty()
+    # A client joining later starts from the newest report too
+    assert broadcaster.subscribe().get_nowait() == (5, '{"version": 5}')
+
+
+def test_idle_without_subscribers(finnhub, monkeypatch):
+    monkeypatch.setattr(live_stream, 'LIVE_BATCH_SECONDS', 0.01)
+    monkeypatch.setattr(live_stream, 'LIVE_IDLE_REFRESH_SECONDS', 0.05)
+    manager = FakeManager(['AAPL'])
+    broadcaster = live_stream.PortfolioBroadcaster(manager, token='token').start()
+    try:
+        # Started, but nobody has subscribed yet
+        time.sleep(0.3)
+        assert manager.recomputes == 0 and not finnhub.connections
+
+        mailbox = broadcaster.subscribe()
+        wait_for(lambda: manager.recomputes >= 3)
+        assert len(finnhub.connected_at) == 1
+        broadcaster.unsubscribe(mailbox)
+        wait_for(lambda: broadcaster.stream is None)
+        idle_at = manager.recomputes
+        time.sleep(0.3)
+        assert manager.recomputes == idle_at
+
+        # The next client brings the stream and the refreshes back
+        broadcaster.subscribe()
+        wait_for(lambda: len(finnhub.connected_at) == 2 and manager.recomputes > idle_at)
+        assert finnhub.messages().count({'type': 'subscribe', 'symbol': 'AAPL'}) == 2
+    finally:
+        broadcaster.stop()
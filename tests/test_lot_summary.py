@@ -0,0 +1,96 @@
+"""
+get_pnl_per_lot_summary on the LotTable gives the same frame as the per-lot loop it replaced:
+same values, same column dtypes (int64 gains for all-int ledgers), and no negative zeros.
+"""
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio import Portfolio
+
+COLUMNS = ['Symbol', 'Company Name', 'Lot ID', 'Position Type', 'Transaction Action', 'Security Type',
+           'Quantity', 'Original Quantity', 'Purchase/Short Price', 'Total Lot Cost Basis',
+           'Date', 'Current Price', 'Unrealized P/L', 'Unrealized Gain %', 'Day Gain', 'Day Gain %']
+
+
+def loop_summary(portfolio):
+    """The per-lot loop get_pnl_per_lot_summary used before the LotTable"""
+    rows = []
+    for symbol, lots in portfolio.positions.items():
+        current_price = portfolio.current_prices.get(symbol)
+        previous_closing_price = portfolio.previous_closing_prices.get(symbol)
+        for lot in lots:
+            if lot['quantity'] > 0:
+                unrealized_pnl = unrealized_gain_percent = day_gain = day_gain_percent = 0.0
+                cost_or_proceeds = lot['quantity'] * lot['cost_basis']
+                if current_price is not None:
+                    if lot['position_type'] == 'long':
+                        unrealized_pnl = (current_price - lot['cost_basis']) * lot['quantity']
+                    else:
+                        unrealized_pnl = (lot['cost_basis'] - current_price) * lot['quantity']
+                    if cost_or_proceeds != 0:
+                        unrealized_gain_percent = (unrealized_pnl / cost_or_proceeds) * 100
+                if current_price is not None and previous_closing_price is not None and lot['quantity'] != 0:
+                    if lot['position_type'] == 'long':
+                        day_gain = (current_price - previous_closing_price) * lot['quantity']
+                    else:
+                        day_gain = (previous_closing_price - current_price) * lot['quantity']
+                    if previous_closing_price != 0:
+                        day_gain_percent = (day_gain / (lot['quantity'] * previous_closing_price)) * 100
+                rows.append(dict(zip(COLUMNS, (
+                    symbol, lot['company_name'], lot['transactionId'], lot['position_type'].capitalize(), lot['action'],
+                    lot['security_type'], lot['quantity'], lot['original_quantity'], lot['cost_basis'],
+                    lot['total_lot_cost_basis'], lot['date'], current_price, unrealized_pnl, unrealized_gain_percent,
+                    day_gain, day_gain_percent))))
+    if not rows:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.DataFrame(rows).sort_values(by=['Symbol', 'Date']).reset_index(drop=True)
+
+
+def random_portfolio(rng, integers):
+    portfolio = Portfolio(positions={}, current_prices={}, previous_closing_prices={})
+    portfolio.verbose = False
+    number = (lambda low, high: rng.randint(low, high)) if integers else (lambda low, high: round(rng.uniform(low, high), 2))
+    symbols = [f"S{i}" for i in range(6)]
+    for day in range(40):
+        symbol = rng.choice(symbols)
+        date = f"2024-{1 + day // 28:02d}-{1 + day % 28:02d}"
+        action = rng.choice(['buy', 'buy', 'sell', 'short', 'cover'])
+        quantity, price = number(1, 20), number(5, 15)
+        if action == 'buy':
+            portfolio.buy(symbol, quantity, price, date, f"{symbol} INC", 'Equity')
+        elif action == 'short':
+            portfolio.short_sell(symbol, quantity, price, date, f"{symbol} INC", 'Equity')
+        elif action == 'sell':
+            portfolio.sell(symbol, quantity, price, date)
+        else:
+            portfolio.buy_to_cover(symbol, quantity, price, date)
+    for symbol in symbols[:-1]:  # The last symbol has no quote
+        # Prices drawn from the same small range as the costs, so some lots sit exactly at cost
+        portfolio.current_prices[symbol] = number(5, 15)
+        if symbol != symbols[0]:
+            portfolio.previous_closing_prices[symbol] = rng.choice([portfolio.current_prices[symbol], number(5, 15)])
+    return portfolio
+
+
+@pytest.mark.parametrize('integers', [True, False])
+@pytest.mark.parametrize('seed', range(10))
+def test_matches_the_per_lot_loop(seed, integers):
+    portfolio = random_portfolio(random.Random(seed), integers)
+    expected, actual = loop_summary(portfolio), portfolio.get_pnl_per_lot_summary()
+    pd.testing.assert_frame_equal(actual, expected, check_exact=True)
+    for name in ('Unrealized P/L', 'Unrealized Gain %', 'Day Gain', 'Day Gain %'):
+        values = actual[name].to_numpy(dtype=np.float64)
+        assert not np.signbit(values[values == 0]).any(), name
+
+
+def test_all_int_gains_stay_int():
+    portfolio = Portfolio(positions={}, current_prices={'A': 12, 'B': 10}, previous_closing_prices={'A': 11, 'B': 10})
+    portfolio.verbose = False
+    portfolio.buy('A', 5, 10, '2024-01-02', 'A INC', 'Equity')
+    portfolio.short_sell('B', 3, 10, '2024-01-03', 'B INC', 'Equity')
+    summary = portfolio.get_pnl_per_lot_summary()
+    assert summary['Unrealized P/L'].dtype == np.int64 and summary['Day Gain'].dtype == np.int64
+    assert summary['Unrealized P/L'].tolist() == [10, 0] and summary['Day Gain'].tolist() == [5, 0]
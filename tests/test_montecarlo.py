@@ -0,0 +1,35 @@
+"""Horizon limits, the block-wise bootstrap, and where the worker pool may be forked"""
+import threading
+
+import numpy as np
+import pytest
+
+import montecarlo
+
+
+def test_horizons_past_a_year_are_rejected():
+    model = montecarlo.build_model(np.full((10, 1), 0.01), np.array([100.0]))
+    with pytest.raises(ValueError):
+        montecarlo.simulate(model, 100, horizons=(montecarlo.MAX_HORIZON_DAYS + 1,), workers=1)
+    with pytest.raises(ValueError):
+        montecarlo.simulate(model, 100, horizons=(5, 10_000_000), workers=1)
+
+
+@pytest.mark.parametrize('steps', [1, 31, 63, 100, 252])
+def test_bootstrap_blocks_add_up_every_step(steps):
+    # One distinct power of two per historical day, so the sum tells how many days were drawn
+    log_returns = np.array([[1.0], [1024.0]])
+    model = {'method': 'bootstrap', 'values': np.array([1.0]), 'log_returns': log_returns}
+    growth = montecarlo._log_growth(np.random.default_rng(0), model, 50, steps)[:, 0]
+    assert np.all(growth % 1024 + growth // 1024 == steps)
+
+
+def test_request_thread_runs_in_process_instead_of_forking(monkeypatch):
+    monkeypatch.setattr(montecarlo, '_pool', None)
+    model = montecarlo.build_model(np.random.default_rng(1).normal(0, 0.01, (300, 2)), np.array([100.0, 50.0]))
+    results = []
+    worker = threading.Thread(target=lambda: results.append(montecarlo.simulate(model, 5000, seed=7, workers=4, chunk_paths=100)))
+    worker.start()
+    worker.join()
+    assert montecarlo._pool is None
+    assert results == [montecarlo.simulate(model, 5000, seed=7, workers=1, chunk_paths=100)]
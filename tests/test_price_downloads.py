@@ -0,0 +1,58 @@
+"""Price downloads for the analytics never run under the ledger lock, so trades do not wait on them"""
+import threading
+
+import pandas as pd
+import pytest
+
+import portfolio_manager
+
+
+@pytest.mark.parametrize('compute', [
+    lambda manager: manager.compute_equity_history(),
+    lambda manager: manager.compute_analytics('1y'),
+    lambda manager: manager.compute_rolling(21),
+    lambda manager: manager.get_covariance(63),
+    lambda manager: manager.simulate_risk(100, (1,)),
+])
+def test_trades_go_through_while_prices_download(tmp_path, monkeypatch, compute):
+    monkeypatch.setattr(portfolio_manager.PortfolioManager, '_refresh_coin_ids', lambda self: None)
+    manager = portfolio_manager.PortfolioManager(data_dir=str(tmp_path))
+    manager.portfolio.verbose = False
+    index = pd.bdate_range('2024-01-01', periods=120)
+    for symbol, drift in (('AAPL', 0.5), ('MSFT', 0.3), (portfolio_manager.BENCHMARK_SYMBOL, 0.2)):
+        closes = [100.0 + drift * i + (i % 3) for i in range(len(index))]
+        manager.price_store.write(symbol, pd.DataFrame({column: closes for column in ('Open', 'High', 'Low', 'Close')},
+                                                       index=index))
+    manager.add_transaction('AAPL', 10, 100.0, '2024-01-02', 'APPLE INC', 'Equity', 'buy')
+    manager.add_transaction('MSFT', 5, 100.0, '2024-01-02', 'MICROSOFT CORP', 'Equity', 'buy')
+
+    downloading, release = threading.Event(), threading.Event()
+
+    def slow_download(symbol, period="5y"):
+        # The first call stands in for a slow yfinance download with retries
+        if not downloading.is_set():
+            downloading.set()
+            release.wait(5)
+
+    monkeypatch.setattr(manager, '_ensure_price_data', slow_download)
+    errors = []
+
+    def run():
+        try:
+            compute(manager)
+        except Exception as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=run)
+    worker.start()
+    assert downloading.wait(5)
+    trader = threading.Thread(target=manager.add_transaction,
+                              args=('AAPL', 1, 101.0, '2024-03-01', 'APPLE INC', 'Equity', 'buy'))
+    trader.start()
+    trader.join(2)
+    traded = not trader.is_alive()
+    release.set()
+    worker.join(10)
+    trader.join(5)
+    assert traded
+    assert not worker.is_alive() and not errors
@@ -0,0 +1,129 @@
+"""
+The delta contract static/index.js relies on: applying diff_reports(old, new) to old, the way
+applyPortfolioDelta does, gives back new, and a client whose version is unknown or too old gets
+the full report instead.
+"""
+import copy
+import json
+
+from report_delta import ReportHistory, diff_reports
+
+
+def lot(transaction_id, quantity, cost_basis=100.0):
+    return {'transactionId': transaction_id, 'quantity': quantity, 'cost_basis': cost_basis, 'date': '2024-01-02'}
+
+
+def position(symbol, price, lots):
+    return {'id': symbol, 'symbol': symbol, 'currentPrice': price,
+            'quantity': sum(lot['quantity'] for lot in lots), 'purchases': lots}
+
+
+def report(balance, positions):
+    return {'balance': balance, 'dayChange': balance / 100, 'portfolioHighlights': {'best': positions[0]['id']},
+            'timestamp': f'ts-{balance}', 'positions': positions}
+
+
+OLD = report(1000.0, [
+    position('AAPL', 150.0, [lot('a1', 10), lot('a2', 5)]),
+    position('MSFT', 400.0, [lot('m1', 2)]),
+    position('TSLA', 200.0, [lot('t1', 3)]),
+])
+NEW = report(1100.0, [
+    # Price moved, one lot partly sold, one closed and one bought
+    position('AAPL', 155.0, [lot('a1', 7), lot('a3', 4, 150.0)]),
+    # Unchanged
+    position('MSFT', 400.0, [lot('m1', 2)]),
+    # New symbol; TSLA was sold out
+    position('NVDA', 900.0, [lot('n1', 1)]),
+])
+
+
+def apply_delta(current: dict, delta: dict) -> dict:
+    """Python mirror of applyPortfolioDelta / applyLotPatch in static/index.js"""
+    if delta.get('full') is not None:
+        return copy.deepcopy(delta['full'])
+    assert delta['since'] == current['version'], "the client would resync here"
+    current = copy.deepcopy(current)
+    current.update(delta.get('totals', {}), version=delta['version'], timestamp=delta['timestamp'])
+    positions = delta.get('positions', {})
+    removed = set(positions.get('remove', []))
+    investments = [investment for investment in current['positions'] if investment['id'] not in removed]
+    for patch in positions.get('upsert', []):
+        investment = next((item for item in investments if item['id'] == patch['id']), None)
+        if investment is None:
+            investments.append(copy.deepcopy(patch))
+            continue
+        fields = {key: value for key, value in patch.items() if key != 'lots'}
+        investment.update(copy.deepcopy(fields))
+        lots = patch.get('lots')
+        if lots:
+            gone = set(lots.get('remove', []))
+            investment['purchases'] = [lot for lot in investment['purchases'] if lot['transactionId'] not in gone]
+            for new_lot in lots.get('upsert', []):
+                ids = [lot['transactionId'] for lot in investment['purchases']]
+                if new_lot['transactionId'] in ids:
+                    investment['purchases'][ids.index(new_lot['transactionId'])] = new_lot
+                else:
+                    investment['purchases'].append(new_lot)
+    current['positions'] = investments
+    return current
+
+
+def normalized(report: dict) -> dict:
+    """Order-free form: the page keys positions by id and lots by transactionId"""
+    report = copy.deepcopy(report)
+    report['positions'] = sorted(report['positions'], key=lambda item: item['id'])
+    for investment in report['positions']:
+        investment['purchases'] = sorted(investment['purchases'], key=lambda lot: lot['transactionId'])
+    return report
+
+
+def publish(history, report):
+    report = copy.deepcopy(report)
+    history.publish(report)
+    # What the client holds is the JSON it was sent
+    return json.loads(json.dumps(report))
+
+
+def test_delta_turns_the_old_report_into_the_new_one():
+    history = ReportHistory()
+    held = publish(history, OLD)
+    new = publish(history, NEW)
+    delta = json.loads(json.dumps(history.delta_since(held['version'])))
+    assert 'full' not in delta
+    assert delta['positions']['remove'] == ['TSLA']
+    # MSFT did not change, so it is not sent at all
+    assert 'MSFT' not in [patch['id'] for patch in delta['positions']['upsert']]
+    assert normalized(apply_delta(held, delta)) == normalized(new)
+
+
+def test_deltas_chain_across_versions():
+    history = ReportHistory()
+    held = publish(history, OLD)
+    middle = copy.deepcopy(NEW)
+    middle['positions'][0]['currentPrice'] = 152.0
+    for target in (middle, NEW, OLD):
+        expected = publish(history, target)
+        held = apply_delta(held, history.delta_since(held['version']))
+        assert normalized(held) == normalized(expected)
+
+
+def test_same_report_keeps_the_version_and_sends_nothing():
+    history = ReportHistory()
+    held = publish(history, OLD)
+    republished = copy.deepcopy(OLD)
+    republished['timestamp'] = 'later'
+    assert history.publish(republished) == held['version']
+    delta = history.delta_since(held['version'])
+    assert set(delta) == {'version', 'since', 'timestamp'}
+
+
+def test_unknown_or_evicted_versions_get_the_full_report():
+    history = ReportHistory(max_versions=2)
+    first = publish(history, OLD)
+    for balance in (1200.0, 1300.0, 1400.0):
+        latest = publish(history, report(balance, NEW['positions']))
+    for since in (first['version'], None, -1, latest['version'] + 10):
+        delta = history.delta_since(since)
+        assert delta['version'] == latest['version']
+        assert apply_delta(first, delta) == latest
@@ -0,0 +1,88 @@
+"""
+/api/transactions/batch is all or nothing: a batch with a refused or invalid row leaves the ledger
+and what is stored on disk exactly as they were (400 for invalid rows, 409 for refused ones), and a
+batch over MAX_BATCH_TRANSACTIONS is turned away with 413 before anything is looked at.
+"""
+import copy
+import sys
+
+import flask
+import pytest
+
+import portfolio_manager
+
+
+def buy(symbol, quantity=10, price=100.0):
+    return {'action': 'buy', 'symbol': symbol, 'quantity': quantity, 'cost_basis': price, 'date': '2024-01-02',
+            'company_name': f'{symbol} INC', 'type': 'Equity'}
+
+
+@pytest.fixture(params=['files', 'sqlite'])
+def manager(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(portfolio_manager.PortfolioManager, '_refresh_coin_ids', lambda self: None)
+    manager = portfolio_manager.PortfolioManager(data_dir=str(tmp_path), storage=request.param)
+    manager.portfolio.verbose = False
+    manager.add_transaction('AAPL', 10, 150.0, '2024-01-02', 'APPLE INC', 'Equity', 'buy')
+    manager.add_transaction('AAPL', 4, 170.0, '2024-01-03', action='sell')
+    return manager
+
+
+@pytest.fixture
+def client(manager, monkeypatch):
+    # portfolio_routes registers its routes on __main__.app and takes the shared manager when imported
+    if 'portfolio_routes' not in sys.modules:
+        monkeypatch.setattr(sys.modules['__main__'], 'app', flask.Flask('test'), raising=False)
+        monkeypatch.setattr(portfolio_manager, '_manager', manager)
+        import portfolio_routes  # noqa: F401
+    routes = sys.modules['portfolio_routes']
+    monkeypatch.setattr(routes, 'manager', manager)
+    return routes.app.test_client()
+
+
+def state(manager):
+    """The ledger in memory, the P/L and trade history, and the ledger as a restart would load it"""
+    manager.journal.sync()
+    positions, closed_lots = manager.journal.load()
+    return copy.deepcopy((manager.portfolio.get_positions().to_dict(), manager.portfolio.get_closed_lots(),
+                          manager.portfolio.realized_pnl, manager.portfolio.transaction_history,
+                          positions.to_dict(), closed_lots))
+
+
+def test_refused_row_rolls_back_the_whole_batch(manager, client):
+    before = state(manager)
+    response = client.post('/api/transactions/batch', json={'transactions': [
+        buy('MSFT'),
+        {'action': 'sell', 'symbol': 'AAPL', 'quantity': 2, 'cost_basis': 180.0, 'date': '2024-01-04'},
+        # Not held: the portfolio refuses it after the first two were applied in memory
+        {'action': 'sell', 'symbol': 'TSLA', 'quantity': 1, 'cost_basis': 200.0, 'date': '2024-01-04'},
+        buy('GOOG'),
+    ]})
+    assert response.status_code == 409
+    body = response.get_json()
+    assert body['applied'] is False
+    assert [result['status'] for result in body['results']] == ['rolled_back', 'rolled_back', 'refused', 'not_applied']
+    assert state(manager) == before
+
+
+def test_invalid_row_rejects_the_batch_before_applying_anything(manager, client):
+    before = state(manager)
+    response = client.post('/api/transactions/batch', json={'transactions': [buy('MSFT'), buy('GOOG', quantity=-1)]})
+    assert response.status_code == 400
+    assert [result['status'] for result in response.get_json()['results']] == ['not_applied', 'invalid']
+    assert state(manager) == before
+
+
+def test_oversize_batch_is_413(manager, client):
+    before = state(manager)
+    response = client.post('/api/transactions/batch',
+                           json={'transactions': [buy('MSFT', 1)] * (portfolio_manager.MAX_BATCH_TRANSACTIONS + 1)})
+    assert response.status_code == 413
+    assert state(manager) == before
+
+
+def test_accepted_batch_is_applied_and_stored(manager, client):
+    response = client.post('/api/transactions/batch', json={'transactions': [buy('MSFT'), buy('GOOG')]})
+    assert response.status_code == 200
+    assert [result['status'] for result in response.get_json()['results']] == ['applied', 'applied']
+    memory, stored = state(manager)[0], state(manager)[4]
+    assert set(memory) == {'AAPL', 'MSFT', 'GOOG'} and stored == memory
@@ -10,6 +10,7 @@ import websocket # Using websocket-client library
 import ssl
 import os
 from dotenv import load_dotenv
+from quote_cache import QuoteCache
 
 load_dotenv() # Load environment variables from .env file
 
@@ -24,6 +25,8 @@ client = finnhub.Client(api_key=FINNHUB_API_KEY)
 # This will store the latest prices received from Finnhub WebSocket
 # Structure: {'SYMBOL': {'c': close, 'h': high, 'l': low, 'o': open, 'pc': previous_close}}
 latest_finnhub_quotes = defaultdict(lambda: {'c': 0, 'pc': 0}) # Initialize with defaults to avoid errors
+# Shared across SSE clients so each symbol is quoted at most once per TTL, not once per client
+quote_cache = QuoteCache()
 
 # --- Finnhub WebSocket Management ---
 FINNHUB_WEBSOCKET_URL = f"wss://ws.finnhub.io?token={FINNHUB_API_KEY}"
@@ -108,8 +111,11 @@ class PortfolioManager:
             'previous_close_price': quote_data['pc']
         }
     def getrealtime(self, symbol):
+        return quote_cache.get(symbol, 'equity', lambda: self._fetch_quote(symbol))
+
+    def _fetch_quote(self, symbol):
         quote = client.quote(symbol=symbol)
-        
+
         return {
             'Close': quote.get("c"),
             'High': quote.get("h"),